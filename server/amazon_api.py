@@ -1,14 +1,15 @@
 import os
 import time
-import hmac
-import hashlib
-import base64
-import urllib.parse
+import asyncio
 import json
 import httpx
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
+from retailers import RetailerProvider, credential_fingerprint
+from http_pool import PooledHTTPClient, AsyncPooledHTTPClient
+from signing import SigV4Signer
 
 load_dotenv()
 
@@ -19,54 +20,83 @@ AWS_ASSOCIATE_TAG = os.getenv('AWS_ASSOCIATE_TAG')
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 AWS_SERVICE = 'ProductAdvertisingAPI'
 
-class AmazonProductAPI:
-    def __init__(self):
+# Shared by every AmazonProductAPI instance so per-user clients reuse the warm connections
+amazon_http = PooledHTTPClient('amazon', timeout=10.0)
+amazon_async_http = AsyncPooledHTTPClient('amazon_async', timeout=10.0)
+
+# PA-API GetItems accepts at most 10 ItemIds per request
+GET_ITEMS_MAX_IDS = 10
+get_items_executor = ThreadPoolExecutor(max_workers=int(os.getenv('AMAZON_GET_ITEMS_WORKERS', 4)), thread_name_prefix='amazon-getitems')
+
+class AmazonProductAPI(RetailerProvider):
+    name = 'amazon'
+    default_category = 'Outdoors'
+
+    def __init__(self, access_key=None, secret_key=None, associate_tag=None):
         self.host = f'webservices.amazon.{AWS_REGION if AWS_REGION != "us-east-1" else "com"}'
         self.endpoint = f'https://{self.host}/paapi5/searchitems'
+        self.signer = SigV4Signer(
+            access_key or AWS_ACCESS_KEY,
+            secret_key or AWS_SECRET_KEY,
+            AWS_REGION,
+            AWS_SERVICE,
+            static_headers={'content-encoding': 'amz-1.0', 'host': self.host}
+        )
+        self.associate_tag = associate_tag or AWS_ASSOCIATE_TAG
+        # Results (and their PartnerTag links) are only shared between requests made with the same account
+        if access_key or secret_key or associate_tag:
+            self.credential_scope = credential_fingerprint(self.signer.credentials.key_id, self.associate_tag)
         
-        if not AWS_ACCESS_KEY or not AWS_SECRET_KEY or not AWS_ASSOCIATE_TAG:
+        if not self.configured:
             print("WARNING: Amazon API credentials not configured. Amazon product search will not work.")
-        
-    def _create_signature(self, request_params, timestamp, method="GET"):
-        """Create signature for request"""
-        # Create canonical request
-        canonical_uri = '/paapi5/searchitems'
-        canonical_querystring = urllib.parse.urlencode(request_params)
-        canonical_headers = f'host:{self.host}\nx-amz-date:{timestamp}\n'
-        signed_headers = 'host;x-amz-date'
-        payload_hash = hashlib.sha256(''.encode('utf-8')).hexdigest()
-        canonical_request = f"{method}\n{canonical_uri}\n{canonical_querystring}\n{canonical_headers}\n{signed_headers}\n{payload_hash}"
-        
-        # Create string to sign
-        algorithm = 'AWS4-HMAC-SHA256'
-        credential_scope = f"{timestamp[:8]}/{AWS_REGION}/{AWS_SERVICE}/aws4_request"
-        string_to_sign = f"{algorithm}\n{timestamp}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
-        
-        # Calculate signature
-        k_date = hmac.new(f'AWS4{AWS_SECRET_KEY}'.encode('utf-8'), timestamp[:8].encode('utf-8'), hashlib.sha256).digest()
-        k_region = hmac.new(k_date, AWS_REGION.encode('utf-8'), hashlib.sha256).digest()
-        k_service = hmac.new(k_region, AWS_SERVICE.encode('utf-8'), hashlib.sha256).digest()
-        k_signing = hmac.new(k_service, 'aws4_request'.encode('utf-8'), hashlib.sha256).digest()
-        signature = hmac.new(k_signing, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
-        
-        # Create authorization header
-        authorization = f"{algorithm} Credential={AWS_ACCESS_KEY}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
-        
-        return authorization
-        
-    def search_products(self, keywords, category="Outdoors", max_results=10):
-        """Search for products by keywords"""
-        if not AWS_ACCESS_KEY or not AWS_SECRET_KEY or not AWS_ASSOCIATE_TAG:
-            return {
-                "success": False,
-                "error": "Amazon API credentials not configured",
-                "message": "Please add AWS credentials to .env file"
-            }
-            
-        # Create request parameters
+    
+    @property
+    def configured(self):
+        return self.signer.configured and bool(self.associate_tag)
+    
+    def _signed_headers(self, path, target, body):
+        """Headers, including the SigV4 Authorization, for one PA-API request"""
         timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
-        
-        # Build request payload
+        signed_headers = {
+            'x-amz-date': timestamp,
+            'x-amz-target': f'com.amazon.paapi5.v1.ProductAdvertisingAPIv1.{target}'
+        }
+        return {
+            'content-encoding': 'amz-1.0',
+            'content-type': 'application/json; charset=utf-8',
+            'host': self.host,
+            **signed_headers,
+            'Authorization': self.signer.sign('POST', path, timestamp, body, signed_headers)
+        }
+    
+    def _post(self, path, target, payload):
+        """Sign and POST a PA-API operation, retrying transport errors"""
+        body = json.dumps(payload).encode('utf-8')
+        for attempt in range(3):
+            try:
+                response = amazon_http.post(f"https://{self.host}{path}", content=body, headers=self._signed_headers(path, target, body))
+                response.raise_for_status()
+                return response
+            except httpx.RequestError:
+                if attempt == 2:
+                    raise
+                time.sleep(2 ** attempt)
+    
+    async def _async_post(self, path, target, payload):
+        """Async variant of _post for the ASGI serving mode"""
+        body = json.dumps(payload).encode('utf-8')
+        for attempt in range(3):
+            try:
+                response = await amazon_async_http.post(f"https://{self.host}{path}", content=body, headers=self._signed_headers(path, target, body))
+                response.raise_for_status()
+                return response
+            except httpx.RequestError:
+                if attempt == 2:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+    
+    def _search_payload(self, keywords, category, max_results):
+        """SearchItems request payload"""
         payload = {
             "Keywords": keywords,
             "Resources": [
@@ -78,95 +108,93 @@ class AmazonProductAPI:
                 "Offers.Listings.Price",
                 "Offers.Listings.DeliveryInfo.IsPrimeEligible"
             ],
-            "PartnerTag": AWS_ASSOCIATE_TAG,
+            "PartnerTag": self.associate_tag,
             "PartnerType": "Associates",
             "Marketplace": "www.amazon.com",
             "SearchIndex": category,
             "ItemCount": max_results
         }
+        return payload
+    
+    def _parse_search_response(self, response):
+        """Format a SearchItems response into our product list structure"""
+        data = response.json()
         
-        # Create headers
-        headers = {
-            'content-encoding': 'amz-1.0',
-            'content-type': 'application/json; charset=utf-8',
-            'host': self.host,
-            'x-amz-date': timestamp,
-            'x-amz-target': 'com.amazon.paapi5.v1.ProductAdvertisingAPIv1.SearchItems'
-        }
+        # Extract relevant product information
+        products = []
+        if 'SearchResult' in data and 'Items' in data['SearchResult']:
+            for item in data['SearchResult']['Items']:
+                product = {
+                    'id': item.get('ASIN'),
+                    'title': item.get('ItemInfo', {}).get('Title', {}).get('DisplayValue', ''),
+                    'brand': item.get('ItemInfo', {}).get('ByLineInfo', {}).get('Brand', {}).get('DisplayValue', ''),
+                    'url': item.get('DetailPageURL', ''),
+                    'image': item.get('Images', {}).get('Primary', {}).get('Medium', {}).get('URL', ''),
+                    'price': item.get('Offers', {}).get('Listings', [{}])[0].get('Price', {}).get('DisplayAmount', ''),
+                    'prime': item.get('Offers', {}).get('Listings', [{}])[0].get('DeliveryInfo', {}).get('IsPrimeEligible', False)
+                }
+                products.append(product)
         
-        # Get authorization header
-        auth_header = self._create_signature({}, timestamp, method="POST")
-        headers['Authorization'] = auth_header
+        return {
+            'success': True,
+            'products': products
+        }
+    
+    def search_products(self, keywords, category="Outdoors", max_results=10):
+        """Search for products by keywords"""
+        if not self.configured:
+            return {
+                "success": False,
+                "error": "Amazon API credentials not configured",
+                "message": "Please add AWS credentials to .env file"
+            }
         
         try:
-            # Make request with retries
-            with httpx.Client(timeout=10.0) as client:
-                for attempt in range(3):
-                    try:
-                        response = client.post(
-                            self.endpoint,
-                            json=payload,
-                            headers=headers
-                        )
-                        response.raise_for_status()
-                        break
-                    except httpx.RequestError as e:
-                        if attempt == 2:
-                            return {'success': False, 'error': str(e), 'message': 'HTTP request failed after retries'}
-                        time.sleep(2 ** attempt)
-            
-            # Parse response
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract relevant product information
-                products = []
-                if 'SearchResult' in data and 'Items' in data['SearchResult']:
-                    for item in data['SearchResult']['Items']:
-                        product = {
-                            'id': item.get('ASIN'),
-                            'title': item.get('ItemInfo', {}).get('Title', {}).get('DisplayValue', ''),
-                            'brand': item.get('ItemInfo', {}).get('ByLineInfo', {}).get('Brand', {}).get('DisplayValue', ''),
-                            'url': item.get('DetailPageURL', ''),
-                            'image': item.get('Images', {}).get('Primary', {}).get('Medium', {}).get('URL', ''),
-                            'price': item.get('Offers', {}).get('Listings', [{}])[0].get('Price', {}).get('DisplayAmount', ''),
-                            'prime': item.get('Offers', {}).get('Listings', [{}])[0].get('DeliveryInfo', {}).get('IsPrimeEligible', False)
-                        }
-                        products.append(product)
-                
-                return {
-                    'success': True,
-                    'products': products
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f"API request failed with status code {response.status_code}",
-                    'message': response.text
-                }
-        
+            response = self._post('/paapi5/searchitems', 'SearchItems', self._search_payload(keywords, category, max_results))
+            return self._parse_search_response(response)
+        except httpx.HTTPStatusError as e:
+            return {'success': False, 'error': f"API request failed with status code {e.response.status_code}", 'message': e.response.text}
+        except httpx.RequestError as e:
+            return {'success': False, 'error': str(e), 'message': 'HTTP request failed after retries'}
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
                 'message': 'Error searching Amazon products'
             }
-            
-    def get_product_details(self, asin):
-        """Get detailed information for a specific product by ASIN"""
-        if not AWS_ACCESS_KEY or not AWS_SECRET_KEY or not AWS_ASSOCIATE_TAG:
+    
+    async def async_search_products(self, keywords, category="Outdoors", max_results=10):
+        """Search for products by keywords without blocking the event loop"""
+        if not self.configured:
             return {
                 "success": False,
                 "error": "Amazon API credentials not configured",
                 "message": "Please add AWS credentials to .env file"
             }
-            
-        # Create request parameters
-        timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
         
+        try:
+            response = await self._async_post('/paapi5/searchitems', 'SearchItems', self._search_payload(keywords, category, max_results))
+            return self._parse_search_response(response)
+        except httpx.HTTPStatusError as e:
+            return {'success': False, 'error': f"API request failed with status code {e.response.status_code}", 'message': e.response.text}
+        except httpx.RequestError as e:
+            return {'success': False, 'error': str(e), 'message': 'HTTP request failed after retries'}
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'message': 'Error searching Amazon products'
+            }
+    
+    def _get_items(self, asins):
+        """Fetch up to GET_ITEMS_MAX_IDS ASINs with a single GetItems request.
+
+        Returns (items_by_asin, errors_by_asin, error) where error is set when the
+        whole request failed.
+        """
         # Build request payload
         payload = {
-            "ItemIds": [asin],
+            "ItemIds": list(asins),
             "Resources": [
                 "ItemInfo.Title",
                 "ItemInfo.Features",
@@ -181,115 +209,100 @@ class AmazonProductAPI:
                 "Offers.Listings.DeliveryInfo.IsPrimeEligible",
                 "Offers.Summaries.LowestPrice"
             ],
-            "PartnerTag": AWS_ASSOCIATE_TAG,
+            "PartnerTag": self.associate_tag,
             "PartnerType": "Associates",
             "Marketplace": "www.amazon.com"
         }
         
-        # Create headers
-        headers = {
-            'content-encoding': 'amz-1.0',
-            'content-type': 'application/json; charset=utf-8',
-            'host': self.host,
-            'x-amz-date': timestamp,
-            'x-amz-target': 'com.amazon.paapi5.v1.ProductAdvertisingAPIv1.GetItems'
-        }
+        # _post raises for error statuses, so a failed request surfaces here as an HTTPStatusError
+        try:
+            response = self._post('/paapi5/getitems', 'GetItems', payload)
+        except httpx.HTTPError as e:
+            return {}, {}, str(e)
         
-        # Get authorization header
-        auth_header = self._create_signature({}, timestamp, method="POST")
-        headers['Authorization'] = auth_header
+        data = response.json()
+        items = {item.get('ASIN'): item for item in data.get('ItemsResult', {}).get('Items', [])}
+        
+        # GetItems reports invalid or inaccessible ASINs individually, e.g. "The ItemId B00... is not accessible"
+        errors = {}
+        for error in data.get('Errors', []):
+            message = error.get('Message', '')
+            for asin in asins:
+                if asin not in items and asin in message:
+                    errors[asin] = error.get('Code', message)
+        
+        return items, errors, None
+    
+    def _parse_item_details(self, item):
+        """Format a GetItems item into our product details structure"""
+        # Get product weight if available
+        weight = None
+        weight_unit = None
+        if 'ItemInfo' in item and 'ProductInfo' in item['ItemInfo'] and 'ItemDimensions' in item['ItemInfo']['ProductInfo']:
+            dimensions = item['ItemInfo']['ProductInfo']['ItemDimensions']
+            if 'Weight' in dimensions:
+                weight = dimensions['Weight'].get('DisplayValue')
+                weight_unit = dimensions['Weight'].get('Unit')
+        
+        # Get features list
+        features = []
+        if 'ItemInfo' in item and 'Features' in item['ItemInfo'] and 'DisplayValues' in item['ItemInfo']['Features']:
+            features = item['ItemInfo']['Features']['DisplayValues']
+        
+        # Get current price
+        price = None
+        if 'Offers' in item and 'Listings' in item['Offers'] and len(item['Offers']['Listings']) > 0:
+            price = item['Offers']['Listings'][0].get('Price', {}).get('DisplayAmount')
+        
+        # Get images
+        images = []
+        if 'Images' in item:
+            if 'Primary' in item['Images'] and 'Large' in item['Images']['Primary']:
+                images.append(item['Images']['Primary']['Large']['URL'])
+            if 'Variants' in item['Images']:
+                for variant in item['Images']['Variants']:
+                    if 'Large' in variant:
+                        images.append(variant['Large']['URL'])
+        
+        return {
+            'id': item.get('ASIN'),
+            'title': item.get('ItemInfo', {}).get('Title', {}).get('DisplayValue', ''),
+            'brand': item.get('ItemInfo', {}).get('ByLineInfo', {}).get('Brand', {}).get('DisplayValue', ''),
+            'url': item.get('DetailPageURL', ''),
+            'images': images,
+            'price': price,
+            'features': features,
+            'weight': weight,
+            'weight_unit': weight_unit,
+            'prime': item.get('Offers', {}).get('Listings', [{}])[0].get('DeliveryInfo', {}).get('IsPrimeEligible', False)
+        }
+    
+    def get_product_details(self, asin):
+        """Get detailed information for a specific product by ASIN"""
+        if not self.configured:
+            return {
+                "success": False,
+                "error": "Amazon API credentials not configured",
+                "message": "Please add AWS credentials to .env file"
+            }
         
         try:
-            # Make request with retries
-            with httpx.Client(timeout=10.0) as client:
-                for attempt in range(3):
-                    try:
-                        response = client.post(
-                            f"https://{self.host}/paapi5/getitems",
-                            json=payload,
-                            headers=headers
-                        )
-                        response.raise_for_status()
-                        break
-                    except httpx.RequestError as e:
-                        if attempt == 2:
-                            return {'success': False, 'error': str(e), 'message': 'HTTP request failed after retries'}
-                        time.sleep(2 ** attempt)
+            items, _, error = self._get_items([asin])
+            if error:
+                return {'success': False, 'error': error, 'message': 'Error getting product details'}
             
-            # Parse response
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract relevant product information
-                if 'ItemsResult' in data and 'Items' in data['ItemsResult']:
-                    items = data['ItemsResult']['Items']
-                    # Find item matching the ASIN
-                    item = next((itm for itm in items if itm.get('ASIN') == asin), None)
-                    if not item:
-                        return {
-                            'success': False,
-                            'error': 'Product not found',
-                            'message': 'The requested product could not be found'
-                        }
-                    
-                    # Get product weight if available
-                    weight = None
-                    weight_unit = None
-                    if 'ItemInfo' in item and 'ProductInfo' in item['ItemInfo'] and 'ItemDimensions' in item['ItemInfo']['ProductInfo']:
-                        dimensions = item['ItemInfo']['ProductInfo']['ItemDimensions']
-                        if 'Weight' in dimensions:
-                            weight = dimensions['Weight'].get('DisplayValue')
-                            weight_unit = dimensions['Weight'].get('Unit')
-                    
-                    # Get features list
-                    features = []
-                    if 'ItemInfo' in item and 'Features' in item['ItemInfo'] and 'DisplayValues' in item['ItemInfo']['Features']:
-                        features = item['ItemInfo']['Features']['DisplayValues']
-                    
-                    # Get current price
-                    price = None
-                    if 'Offers' in item and 'Listings' in item['Offers'] and len(item['Offers']['Listings']) > 0:
-                        price = item['Offers']['Listings'][0].get('Price', {}).get('DisplayAmount')
-                    
-                    # Get images
-                    images = []
-                    if 'Images' in item:
-                        if 'Primary' in item['Images'] and 'Large' in item['Images']['Primary']:
-                            images.append(item['Images']['Primary']['Large']['URL'])
-                        if 'Variants' in item['Images']:
-                            for variant in item['Images']['Variants']:
-                                if 'Large' in variant:
-                                    images.append(variant['Large']['URL'])
-                    
-                    product = {
-                        'id': asin,
-                        'title': item.get('ItemInfo', {}).get('Title', {}).get('DisplayValue', ''),
-                        'brand': item.get('ItemInfo', {}).get('ByLineInfo', {}).get('Brand', {}).get('DisplayValue', ''),
-                        'url': item.get('DetailPageURL', ''),
-                        'images': images,
-                        'price': price,
-                        'features': features,
-                        'weight': weight,
-                        'weight_unit': weight_unit,
-                        'prime': item.get('Offers', {}).get('Listings', [{}])[0].get('DeliveryInfo', {}).get('IsPrimeEligible', False)
-                    }
-                    
-                    return {
-                        'success': True,
-                        'product': product
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': 'Product not found',
-                        'message': 'The requested product could not be found'
-                    }
-            else:
+            item = items.get(asin)
+            if not item:
                 return {
                     'success': False,
-                    'error': f"API request failed with status code {response.status_code}",
-                    'message': response.text
+                    'error': 'Product not found',
+                    'message': 'The requested product could not be found'
                 }
+            
+            return {
+                'success': True,
+                'product': self._parse_item_details(item)
+            }
         
         except Exception as e:
             return {
@@ -297,3 +310,37 @@ class AmazonProductAPI:
                 'error': str(e),
                 'message': 'Error getting product details'
             }
+    
+    def get_products_details(self, asins):
+        """Get details for many ASINs, issuing one GetItems request per chunk of 10 concurrently"""
+        if not self.configured:
+            return {
+                "success": False,
+                "error": "Amazon API credentials not configured",
+                "message": "Please add AWS credentials to .env file"
+            }
+        
+        # Preserve the requested order while dropping duplicates
+        asins = list(dict.fromkeys(asins))
+        chunks = [asins[i:i + GET_ITEMS_MAX_IDS] for i in range(0, len(asins), GET_ITEMS_MAX_IDS)]
+        
+        products = {}
+        missing = {}
+        for chunk, future in [(chunk, get_items_executor.submit(self._get_items, chunk)) for chunk in chunks]:
+            try:
+                items, errors, error = future.result()
+            except Exception as e:
+                items, errors, error = {}, {}, str(e)
+            
+            for asin in chunk:
+                if asin in items:
+                    products[asin] = self._parse_item_details(items[asin])
+                else:
+                    missing[asin] = error or errors.get(asin, 'Product not found')
+        
+        return {
+            'success': bool(products) or not asins,
+            'products': products,
+            'missing': missing,
+            'requests': len(chunks)
+        }
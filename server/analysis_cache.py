@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import OrderedDict
+
+HASH_BITS = 64
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class PerceptualHashCache:
+    """/analyze results keyed by a 64-bit perceptual hash plus a request variant
+
+    A lookup also matches stored hashes within `max_distance` bits, so resized
+    or re-encoded copies of a photo reuse the earlier analysis. Candidates are
+    found by multi-index hashing: the hash is split into max_distance + 1
+    chunks and, by the pigeonhole principle, any hash within max_distance bits
+    agrees exactly on at least one chunk, so only entries sharing a chunk are
+    compared. Entries expire after `ttl` seconds and the least recently used
+    are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_distance=6, max_entries=1000, ttl=86400):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl
+        chunks = min(max_distance + 1, HASH_BITS)
+        self._chunk_bounds = [(HASH_BITS * i // chunks, HASH_BITS * (i + 1) // chunks) for i in range(chunks)]
+        self._tables = [{} for _ in self._chunk_bounds]
+        self._entries = OrderedDict()  # (variant, hash) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _chunks(self, phash):
+        for low, high in self._chunk_bounds:
+            yield (phash >> low) & ((1 << (high - low)) - 1)
+
+    def get(self, phash, variant):
+        """Return (value, distance) for the closest live entry, or (None, None)"""
+        phash = int(phash, 16) if isinstance(phash, str) else phash
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for table, chunk in zip(self._tables, self._chunks(phash)):
+                candidates.update(table.get((variant, chunk), ()))
+
+            best_key, best_distance = None, None
+            for key in candidates:
+                if self._entries[key][0] < now:
+                    self._remove(key)
+                    continue
+                distance = hamming_distance(phash, key[1])
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self._stats['misses'] += 1
+                return None, None
+            self._stats['hits' if best_distance == 0 else 'near_hits'] += 1
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1], best_distance
+
+    def set(self, phash, variant, value):
+        phash = int(phash, 16) if isinstance(phash, str) else phash
+        key = (variant, phash)
+        with self._lock:
+            if key not in self._entries:
+                for table, chunk in zip(self._tables, self._chunks(phash)):
+                    table.setdefault((variant, chunk), set()).add(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        variant, phash = key
+        del self._entries[key]
+        for table, chunk in zip(self._tables, self._chunks(phash)):
+            bucket = table[(variant, chunk)]
+            bucket.discard(key)
+            if not bucket:
+                del table[(variant, chunk)]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for table in self._tables:
+                table.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), max_distance=self.max_distance)
+        lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['near_hits']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -1,15 +1,17 @@
 import os
 import base64
 import json
-import re
 import time
+import hashlib
+import uuid
 import logging
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, g
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import Flask, request, jsonify, g, Response, stream_with_context, has_request_context
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 from openai import OpenAI
-from marshmallow import Schema, fields, validate, ValidationError
+from marshmallow import Schema, fields, validate, ValidationError, EXCLUDE
 
 # AWS monitoring imports
 from aws_xray_sdk.core import xray_recorder, patch_all
@@ -19,10 +21,32 @@ import watchtower
 from dotenv import load_dotenv
 from amazon_api import AmazonProductAPI
 from walmart_api import WalmartAPI
+from cache import create_cache, search_cache_key
+from config import BaseConfig
+from retailers import RetailerRegistry, RetailerFanOut
+from matching import ProductMatcher, price_amount
+from http_pool import http_pool_stats
+from singleflight import SingleFlight, flight_key
+from image_pipeline import ImagePipeline, ImageProcessingError
+from analysis_cache import PerceptualHashCache
+from jobs import JobQueue
+from semantic_cache import SemanticCache
+from chat_sessions import ChatSessionStore, compact_session, session_history, make_turn
+from tokens import count_message_tokens
+from content_filter import ContentFilter
+from prompt_compaction import compact_inventory
+from recommendation_cache import RecommendationCache, content_hash, inventory_by_category, merge_recommendations
+from item_search import ItemSearchIndex
+from inventory_export import EXPORT_FORMATS, export_chunks, gzip_chunks
+from inventory_import import InventoryImport
+from storage import Storage
+from pack_weights import UNIT_GRAMS, UNIT_SYSTEMS, pack_columns, weight_breakdown
+from weather import StaticWeatherProvider, WeatherService, WeatherProviderError, create_weather_provider
 
 load_dotenv()
 
 app = Flask(__name__)
+app.config.from_object(BaseConfig)
 allowed_origins = os.getenv('CORS_ORIGINS', 'http://localhost:5173').split(',')
 CORS(app, resources={r"/*": {"origins": allowed_origins, "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}}, supports_credentials=True)
 
@@ -91,17 +115,124 @@ def log_request(response):
         
     return response
 
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB limit
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 amazon_api = AmazonProductAPI()
 walmart_api = WalmartAPI()
+search_cache = create_cache(app.config)
+retailers = RetailerRegistry()
+retailers.register(amazon_api)
+retailers.register(walmart_api)
+retailer_fan_out = RetailerFanOut(app.config['RETAILER_SEARCH_WORKERS'])
+flights = SingleFlight()
+image_pipeline = ImagePipeline()
+jobs = JobQueue(
+    app.config['JOBS_DB_PATH'],
+    workers=app.config['JOBS_WORKERS'],
+    ttl=app.config['JOBS_TTL'],
+    retention=app.config['JOBS_RESULT_RETENTION'],
+    run_timeout=app.config['JOBS_RUN_TIMEOUT']
+)
+semantic_cache = SemanticCache(
+    app.config['SEMANTIC_CACHE_THRESHOLD'],
+    app.config['SEMANTIC_CACHE_CAPACITY'],
+    app.config['SEMANTIC_CACHE_TTL']
+) if app.config['SEMANTIC_CACHE_ENABLED'] else None
+static_forecasts = StaticWeatherProvider()
+weather = WeatherService(
+    create_weather_provider(app.config, static_forecasts),
+    search_cache,
+    app.config['WEATHER_CACHE_TTL'],
+    fallback=static_forecasts
+)
+storage = Storage(app.config['STORAGE_DB_PATH'])
+recommendation_cache = RecommendationCache(
+    search_cache,
+    storage,
+    app.config['RECOMMENDATION_CACHE_TTL'],
+    app.config['RECOMMENDATION_CACHE_MAX_PARTIAL_CATEGORIES']
+)
+item_index = ItemSearchIndex.from_catalogue(app.config['ITEM_CATALOGUE_PATH'], app.config['ITEM_SEARCH_MERGE_THRESHOLD'])
+weather_executor = ThreadPoolExecutor(app.config['WEATHER_BATCH_CONCURRENCY'], thread_name_prefix='weather')
+content_filter = ContentFilter(app.config['CONTENT_FILTER_RULES'], app.config['CONTENT_FILTER_RELOAD_INTERVAL'])
+chat_sessions = ChatSessionStore(app.config['CHAT_SESSION_DB_PATH'], app.config['CHAT_SESSION_TTL'])
+analysis_executor = ThreadPoolExecutor(app.config['ANALYZE_WORKERS'], thread_name_prefix='analyze')
+analysis_cache = PerceptualHashCache(
+    app.config['ANALYSIS_CACHE_MAX_DISTANCE'],
+    app.config['ANALYSIS_CACHE_MAX_ENTRIES'],
+    app.config['ANALYSIS_CACHE_TTL']
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Settings that hold API keys -> the environment variable used when a user has not saved their own
+API_KEY_SETTINGS = {
+    'openai_api_key': 'OPENAI_API_KEY',
+    'amazon_access_key': 'AWS_ACCESS_KEY_ID',
+    'amazon_secret_key': 'AWS_SECRET_KEY',
+    'amazon_associate_tag': 'AWS_ASSOCIATE_TAG',
+    'walmart_client_id': 'WALMART_CLIENT_ID',
+    'walmart_client_secret': 'WALMART_CLIENT_SECRET'
+}
+
+# Clients built for saved credentials, reused by every request (and user) with the same ones
+CREDENTIAL_CLIENTS_MAX = 256
+_credential_clients = {}
+_credential_clients_lock = threading.Lock()
+
+def user_api_key(name, user_id=None):
+    """A user's saved API key, falling back to the server's environment variable for it"""
+    user = storage.get_user(user_id) if user_id is not None else None
+    return (user or {}).get(name) or os.getenv(API_KEY_SETTINGS[name]) or None
+
+def request_user_id():
+    """The signed-in user of the current Flask request, or None outside one (job workers, the ASGI handlers)"""
+    return current_user_id() if has_request_context() else None
+
+def credential_client(kind, credentials, factory):
+    with _credential_clients_lock:
+        client = _credential_clients.get((kind, credentials))
+        if client is None:
+            if len(_credential_clients) >= CREDENTIAL_CLIENTS_MAX:
+                _credential_clients.clear()
+            client = _credential_clients[(kind, credentials)] = factory()
+        return client
+
+def openai_client(user_id=None):
+    """OpenAI client for the user's key, or the server's when they have not saved one"""
+    api_key = user_api_key('openai_api_key', user_id)
+    return credential_client('openai', api_key, lambda: OpenAI(api_key=api_key))
+
+def retailer_apis(user_id=None):
+    """{provider name: client} for a user; users without saved retailer credentials share the server's clients
+
+    Saved credentials are completed from the environment, as the clients do
+    for missing constructor arguments.
+    """
+    user = (storage.get_user(user_id) if user_id is not None else None) or {}
+    amazon_keys = tuple(user.get(name) for name in ('amazon_access_key', 'amazon_secret_key', 'amazon_associate_tag'))
+    walmart_keys = tuple(user.get(name) for name in ('walmart_client_id', 'walmart_client_secret'))
+    return {
+        'amazon': credential_client('amazon', amazon_keys, lambda: AmazonProductAPI(*amazon_keys)) if any(amazon_keys) else amazon_api,
+        'walmart': credential_client('walmart', walmart_keys, lambda: WalmartAPI(*walmart_keys)) if any(walmart_keys) else walmart_api
+    }
+
+def user_retailers(user_id=None):
+    """The registered retailer providers, with the user's own Amazon and Walmart clients in place of the shared ones"""
+    apis = retailer_apis(user_id)
+    return [apis.get(provider.name, provider) for provider in retailers.providers()]
+
+def create_chat_completion(namespace, user_id=None, **kwargs):
+    """Call the OpenAI chat completions API, sharing one upstream call between identical concurrent requests
+
+    Uses `user_id`'s OpenAI key, defaulting to the signed-in user of the
+    current Flask request.
+    """
+    client = openai_client(request_user_id() if user_id is None else user_id)
+    # Only requests made with the same key share an upstream call
+    return flights.do(namespace, flight_key(client.api_key, kwargs), lambda: client.chat.completions.create(**kwargs))
+
 class RegisterSchema(Schema):
     username = fields.Str(required=True)
     email = fields.Email(required=True)
@@ -113,7 +244,9 @@ class LoginSchema(Schema):
 
 class ChatSchema(Schema):
     message = fields.Str(required=True)
-    history = fields.List(fields.Dict(), missing=[])
+    # A callable default: a shared [] would be mutated by history.append and leak between requests
+    history = fields.List(fields.Dict(), missing=list)
+    session_id = fields.Str(missing=None, allow_none=True)
 
 class AmazonSearchSchema(Schema):
     keywords = fields.Str(required=True)
@@ -123,8 +256,138 @@ class AmazonSearchSchema(Schema):
 class ASINSchema(Schema):
     asin = fields.Str(required=True)
 
+class ASINListSchema(Schema):
+    asins = fields.List(fields.Str(validate=validate.Length(min=1)), required=True, validate=validate.Length(min=1, max=100))
+
 class WeatherSchema(Schema):
     location = fields.Str(required=True)
+    season = fields.Str(missing=None)
+    date = fields.Date(missing=None)
+
+class WeatherBatchSchema(Schema):
+    location = fields.List(fields.Str(validate=validate.Length(min=1)), required=True, validate=validate.Length(min=1))
+    season = fields.Str(missing=None)
+    date = fields.List(fields.Date(), missing=list)
+
+class ItemSearchSchema(Schema):
+    query = fields.Str(missing='')
+    limit = fields.Int(missing=10, validate=validate.Range(min=1, max=50))
+
+class SortOrderSchema(Schema):
+    id = fields.Int(required=True)
+    sort_order = fields.Float(required=True, allow_nan=False)
+
+class PackBreakdownSchema(Schema):
+    class Meta:
+        # Accepts a whole pack (title, trip_id, ...) and uses only what the breakdown needs
+        unknown = EXCLUDE
+
+    # Raw rather than List(Dict()): validating thousands of items field by field would cost more than the breakdown
+    items = fields.Raw(missing=None)
+    columns = fields.Raw(missing=None)
+    unit_system = fields.Str(missing='METRIC', validate=validate.OneOf(list(UNIT_SYSTEMS)))
+    unit = fields.Str(missing=None, validate=validate.OneOf(list(UNIT_GRAMS)))
+
+def build_analysis_request(image_b64, batch_mode, detect_barcodes):
+    """OpenAI chat completion arguments for analyzing a base64-encoded gear photo"""
+    prompt_text = (
+        "This is an image of outdoor/backpacking gear. " +
+        ("Identify all distinct items visible in this image. " if batch_mode else "Analyze this specific item. ")
+    )
+    
+    if detect_barcodes:
+        prompt_text += (
+            "If there are any barcodes or QR codes visible in the image, detect and decode them. " +
+            "For each barcode/QR code detected, provide the decoded value. "
+        )
+    
+    prompt_text += (
+        "For each item, provide a detailed JSON object with these fields: " +
+        "name (string), description (string), weight (number in grams), " +
+        "price (number in USD, estimated if not visible), category (string), " +
+        "brand (string if visible, null if not), productUrl (string, empty if not visible), " +
+        "consumable (boolean, true if it's food/fuel/etc), " +
+        "barcodeValue (string, only if barcode is detected). " +
+        (
+            "Return a JSON array of objects, with each object representing a distinct item. " if batch_mode else 
+            "Return a single JSON object with the item details. "
+        ) +
+        "Format your response ONLY as valid JSON with no additional text before or after."
+    )
+    
+    return {
+        'model': "gpt-4-vision-preview",
+        'messages': [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt_text},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
+                ]
+            }
+        ],
+        'max_tokens': 1500
+    }
+
+def parse_analysis_response(response_content, batch_mode, detect_barcodes):
+    """Build the /analyze response body from the model's reply"""
+    # Try to parse the response as JSON and ensure it's correctly formatted
+    try:
+        json_response = json.loads(response_content)
+        return {
+            'success': True,
+            'analysis': json_response,
+            'batch_mode': batch_mode,
+            'detect_barcodes': detect_barcodes
+        }
+    except json.JSONDecodeError as json_err:
+        # If the response isn't valid JSON, return it as a string
+        return {
+            'success': False,
+            'analysis': response_content,
+            'error': f"Failed to parse AI response as JSON: {str(json_err)}",
+            'batch_mode': batch_mode,
+            'detect_barcodes': detect_barcodes
+        }
+
+def analyze_upload(data, batch_mode, detect_barcodes, user_id=None):
+    """Run one uploaded image through the pipeline, the analysis cache and the vision model; returns (body, status)"""
+    upload_id = uuid.uuid4().hex
+    try:
+        image_bytes, image_info = image_pipeline.process(data)
+    except ImageProcessingError as e:
+        app.logger.warning(f"Upload {upload_id} rejected: {str(e)}")
+        return {'error': 'Invalid image', 'upload_id': upload_id}, 400
+    app.logger.info(f"Upload {upload_id} prepared: {json.dumps(image_info)}")
+    return analyze_prepared(upload_id, base64.b64encode(image_bytes).decode(), image_info['dhash'], batch_mode, detect_barcodes, user_id)
+
+def analyze_prepared(upload_id, image_b64, dhash, batch_mode, detect_barcodes, user_id=None):
+    """Answer a prepared image from the analysis cache or the vision model; returns (body, status)"""
+    # Re-uploads and resized copies of an analyzed photo skip the vision model
+    cached, distance = analysis_cache.get(dhash, (batch_mode, detect_barcodes))
+    if cached is not None:
+        app.logger.info(f"Upload {upload_id} answered from analysis cache (distance {distance})")
+        return dict(cached, upload_id=upload_id, cached=True), 200
+    
+    try:
+        response = create_chat_completion(
+            'openai_analyze',
+            user_id,
+            **build_analysis_request(image_b64, batch_mode, detect_barcodes)
+        )
+        
+        result = parse_analysis_response(response.choices[0].message.content, batch_mode, detect_barcodes)
+        if result['success']:
+            analysis_cache.set(dhash, (batch_mode, detect_barcodes), result)
+        return dict(result, upload_id=upload_id, cached=False), 200
+        
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to analyze image',
+            'upload_id': upload_id
+        }, 500
 
 @app.route('/analyze', methods=['POST'])
 def analyze_image():
@@ -139,84 +402,100 @@ def analyze_image():
     detect_barcodes = request.form.get('detect_barcodes', 'false').lower() == 'true'
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
+        body, status = analyze_upload(file.read(), batch_mode, detect_barcodes, current_user_id())
+        return jsonify(body), status
+    
+    return jsonify({'error': 'Unsupported file type'}), 400
+
+def bounded_map(executor, fn, items, limit):
+    """Yield (index, fn(item)) in completion order, keeping at most `limit` calls in flight"""
+    pending = {}
+    items = iter(enumerate(items))
+    while True:
+        for index, item in items:
+            pending[executor.submit(fn, item)] = index
+            if len(pending) >= limit:
+                break
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+
+def batch_uploads():
+    """(filename, bytes or None) for every image in a multipart batch; None marks an unsupported file"""
+    files = request.files.getlist('images') + request.files.getlist('image')
+    return [(file.filename, file.read() if allowed_file(file.filename) else None) for file in files if file.filename]
+
+def batch_result_line(index, filename, body, status):
+    return json.dumps(dict(body, index=index, filename=filename, status=status)) + "\n"
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many images from one multipart request, streaming each result as an NDJSON line when it is ready"""
+    uploads = batch_uploads()
+    if not uploads:
+        return jsonify({'error': 'No images provided'}), 400
+    if len(uploads) > app.config['ANALYZE_BATCH_MAX_IMAGES']:
+        return jsonify({'error': f"Too many images, at most {app.config['ANALYZE_BATCH_MAX_IMAGES']} per batch"}), 400
+    
+    batch_mode = request.form.get('batch_mode', 'false').lower() == 'true'
+    detect_barcodes = request.form.get('detect_barcodes', 'false').lower() == 'true'
+    # The images are analyzed on worker threads, outside the request context
+    user_id = current_user_id()
+    started = time.time()
+    
+    def analyze(upload):
+        filename, data = upload
+        if data is None:
+            return {'success': False, 'error': 'Unsupported file type'}, 400
         try:
-            with open(filepath, "rb") as image_file:
-                prompt_text = (
-                    "This is an image of outdoor/backpacking gear. " +
-                    ("Identify all distinct items visible in this image. " if batch_mode else "Analyze this specific item. ")
-                )
-                
-                if detect_barcodes:
-                    prompt_text += (
-                        "If there are any barcodes or QR codes visible in the image, detect and decode them. " +
-                        "For each barcode/QR code detected, provide the decoded value. "
-                    )
-                
-                prompt_text += (
-                    "For each item, provide a detailed JSON object with these fields: " +
-                    "name (string), description (string), weight (number in grams), " +
-                    "price (number in USD, estimated if not visible), category (string), " +
-                    "brand (string if visible, null if not), productUrl (string, empty if not visible), " +
-                    "consumable (boolean, true if it's food/fuel/etc), " +
-                    "barcodeValue (string, only if barcode is detected). " +
-                    (
-                        "Return a JSON array of objects, with each object representing a distinct item. " if batch_mode else 
-                        "Return a single JSON object with the item details. "
-                    ) +
-                    "Format your response ONLY as valid JSON with no additional text before or after."
-                )
-                
-                response = client.chat.completions.create(
-                    model="gpt-4-vision-preview",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt_text},
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64.b64encode(image_file.read()).decode()}"}}
-                            ]
-                        }
-                    ],
-                    max_tokens=1500
-                )
-                
-            os.remove(filepath)  # Clean up the uploaded file
-            
-            response_content = response.choices[0].message.content
-            
-            # Try to parse the response as JSON and ensure it's correctly formatted
-            try:
-                json_response = json.loads(response_content)
-                return jsonify({
-                    'success': True,
-                    'analysis': json_response,
-                    'batch_mode': batch_mode,
-                    'detect_barcodes': detect_barcodes
-                })
-            except json.JSONDecodeError as json_err:
-                # If the response isn't valid JSON, return it as a string
-                return jsonify({
-                    'success': False,
-                    'analysis': response_content,
-                    'error': f"Failed to parse AI response as JSON: {str(json_err)}",
-                    'batch_mode': batch_mode,
-                    'detect_barcodes': detect_barcodes
-                })
-            
+            return analyze_upload(data, batch_mode, detect_barcodes, user_id)
         except Exception as e:
-            if os.path.exists(filepath):
-                os.remove(filepath)  # Ensure cleanup even on error
-            return jsonify({
-                'success': False,
-                'error': str(e),
-                'message': 'Failed to analyze image'
-            }), 500
+            return {'success': False, 'error': str(e), 'message': 'Failed to analyze image'}, 500
     
-    return jsonify({'error': 'Unsupported file type'}), 400
+    def results():
+        succeeded = 0
+        for index, (body, status) in bounded_map(analysis_executor, analyze, uploads, app.config['ANALYZE_BATCH_CONCURRENCY']):
+            succeeded += status == 200 and body.get('success', False)
+            yield batch_result_line(index, uploads[index][0], body, status)
+        yield json.dumps({
+            'done': True,
+            'count': len(uploads),
+            'succeeded': succeeded,
+            'duration_ms': round(time.time() - started, 3) * 1000
+        }) + "\n"
+    
+    return Response(results(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+# Define a system message with context about the application
+CHAT_SYSTEM_MESSAGE = """
+        You are a helpful assistant for outdoor and backpacking enthusiasts. You help users with:
+        1. Recommending gear based on trip parameters and weather conditions
+        2. Suggesting packing strategies to reduce weight
+        3. Providing information about outdoor skills and techniques
+        4. Answering questions about outdoor activities and gear
+        
+        Focus on being practical and precise. If you're unsure about something, 
+        acknowledge the uncertainty rather than providing potentially misleading information.
+        """
+
+CHAT_COMPLETION_OPTIONS = {'model': "gpt-3.5-turbo", 'max_tokens': 500, 'temperature': 0.7}
+
+def build_chat_messages(history, user_message):
+    """Assemble the system prompt, valid history entries and the new user message"""
+    messages = [{"role": "system", "content": CHAT_SYSTEM_MESSAGE}]
+    
+    # Add conversation history if available
+    for message in history or []:
+        if isinstance(message, dict) and 'role' in message and 'content' in message:
+            messages.append(message)
+        else:
+            app.logger.info(f"Invalid message format in history: {message}")
+    
+    # Add the user's new message
+    messages.append({"role": "user", "content": user_message})
+    return messages
 
 @app.route('/chat', methods=['POST'])
 def chat_with_assistant():
@@ -256,8 +535,8 @@ def chat_with_assistant():
         history = data.get('history', [])
         app.logger.info(f"Chat history length: {len(history)}")
         
-        # Check if OpenAI API key is available
-        api_key = os.getenv('OPENAI_API_KEY')
+        # Check if OpenAI API key is available (the user's own, or the server's)
+        api_key = user_api_key('openai_api_key', current_user_id())
         if not api_key:
             app.logger.info("OpenAI API key not configured")
             return jsonify({
@@ -268,45 +547,29 @@ def chat_with_assistant():
             
         app.logger.info(f"Using OpenAI API key: {api_key[:5]}...")
         
-        # Prepare the conversation for the API
-        messages = []
+        # Server-side sessions replace the client-supplied history
+        session_id = data.get('session_id')
+        session = None
+        if session_id:
+            session = load_chat_session(session_id)
+            if session is None:
+                return jsonify(CHAT_SESSION_NOT_FOUND), 404
+            history = session_history(session)
         
-        # Define a system message with context about the application
-        system_message = """
-        You are a helpful assistant for outdoor and backpacking enthusiasts. You help users with:
-        1. Recommending gear based on trip parameters and weather conditions
-        2. Suggesting packing strategies to reduce weight
-        3. Providing information about outdoor skills and techniques
-        4. Answering questions about outdoor activities and gear
-        
-        Focus on being practical and precise. If you're unsure about something, 
-        acknowledge the uncertainty rather than providing potentially misleading information.
-        """
+        cached_answer = cached_chat_answer(filtered_message, history)
+        if cached_answer is not None:
+            return jsonify(chat_reply(filtered_message, cached_answer, history, session_id, session, cached=True))
         
-        messages.append({"role": "system", "content": system_message})
-        
-        # Add conversation history if available
-        if history:
-            for message in history:
-                if isinstance(message, dict) and 'role' in message and 'content' in message:
-                    messages.append(message)
-                else:
-                    app.logger.info(f"Invalid message format in history: {message}")
-        
-        # Add the user's new message
-        messages.append({"role": "user", "content": filtered_message})
+        # Prepare the conversation for the API
+        messages = build_chat_messages(history, filtered_message)
         
         app.logger.info(f"Final messages to send to OpenAI: {len(messages)} messages")
         
         # Make a request to the OpenAI API
         try:
             app.logger.info("Sending request to OpenAI API")
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-            )
+            response = create_chat_completion('openai_chat', messages=messages, **CHAT_COMPLETION_OPTIONS)
+            log_chat_tokens(messages, session_id, session, response.usage)
             
             assistant_response = response.choices[0].message.content
             app.logger.info(f"Received response from OpenAI: {assistant_response[:50]}...")
@@ -321,14 +584,9 @@ def chat_with_assistant():
                     'message': 'The AI generated content that may be inappropriate. Please try a different query.'
                 }), 403
             
-            # Add assistant response to history
-            history.append({"role": "assistant", "content": filtered_response})
+            remember_chat_answer(filtered_message, history, filtered_response)
             
-            return jsonify({
-                'success': True,
-                'response': filtered_response,
-                'history': history
-            })
+            return jsonify(chat_reply(filtered_message, filtered_response, history, session_id, session))
         except Exception as e:
             app.logger.error(f"OpenAI API error: {str(e)}")
             return jsonify({
@@ -347,20 +605,296 @@ def chat_with_assistant():
 
 def filter_content(content):
     """Filter user prompts and AI responses for inappropriate content"""
-    
-    # Define patterns for inappropriate content
-    inappropriate_patterns = [
-        r'\b(hack|crack|steal|illegal|pornographic|obscene)\b',
-        r'\b(password|credit\s*card|ssn|social\s*security)\b'
-    ]
-    
-    # Check if any inappropriate patterns are found
-    for pattern in inappropriate_patterns:
-        if re.search(pattern, content, re.IGNORECASE):
-            return True, "Your request contains inappropriate or sensitive content that cannot be processed."
-    
+    if content_filter.check(content):
+        return True, "Your request contains inappropriate or sensitive content that cannot be processed."
     return False, content
 
+def cached_chat_answer(message, history):
+    """Semantic-cache answer for a first-turn question, or None when disabled or not cached"""
+    if semantic_cache is None or history:
+        return None
+    answer, similarity = semantic_cache.get(message)
+    if answer is not None:
+        app.logger.info(f"Chat answered from semantic cache (similarity {similarity:.3f})")
+    return answer
+
+def remember_chat_answer(message, history, answer):
+    """Store a filtered answer to a first-turn question in the semantic cache"""
+    if semantic_cache is not None and not history:
+        semantic_cache.set(message, answer)
+
+def cached_chat_events(body):
+    yield sse_event('token', {'content': body['response']})
+    yield sse_event('done', body)
+
+CHAT_SESSION_NOT_FOUND = {
+    'success': False,
+    'error': 'Session not found',
+    'message': 'This chat session has expired or does not exist. Please start a new session.'
+}
+
+CHAT_SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and an outdoor gear assistant so it can continue "
+    "without the full transcript. Keep trip details, gear mentioned, preferences and decisions. Be concise."
+)
+
+def summarize_chat_turns(previous_summary, turns, user_id=None):
+    """Running summary of chat turns folded out of a session; raises if the call fails so the turns are kept"""
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    content = (f"Summary so far:\n{previous_summary}\n\n" if previous_summary else "") + f"New messages:\n{transcript}"
+    try:
+        response = create_chat_completion(
+            'openai_chat_summary',
+            user_id,
+            model=CHAT_COMPLETION_OPTIONS['model'],
+            messages=[{"role": "system", "content": CHAT_SUMMARY_PROMPT}, {"role": "user", "content": content}],
+            max_tokens=app.config['CHAT_SUMMARY_MAX_TOKENS'],
+            temperature=0.2
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        app.logger.error(f"Chat summary error: {str(e)}")
+        raise
+
+def load_chat_session(session_id, user_id=None):
+    """A chat session with its older turns folded into the summary to fit the token budget, or None if unknown"""
+    session = chat_sessions.get(session_id)
+    if session is None:
+        return None
+    compacted = compact_session(
+        session, app.config['CHAT_HISTORY_TOKEN_BUDGET'], lambda summary, turns: summarize_chat_turns(summary, turns, user_id)
+    )
+    if compacted is not session:
+        chat_sessions.compact(session_id, session, compacted)
+    return compacted
+
+def chat_reply(message, answer, history, session_id=None, session=None, cached=False):
+    """Record an assistant answer and build the /chat response body
+
+    Stateless requests get the updated history back; session requests only
+    get the session ID since their history stays on the server.
+    """
+    if session is not None:
+        chat_sessions.add_turns(session_id, [make_turn('user', message), make_turn('assistant', answer)])
+        body = {'success': True, 'response': answer, 'session_id': session_id}
+    else:
+        history.append({"role": "assistant", "content": answer})
+        body = {'success': True, 'response': answer, 'history': history}
+    if cached:
+        body['cached'] = True
+    return body
+
+def log_chat_tokens(messages, session_id=None, session=None, usage=None):
+    """Log the prompt size of a chat request so growth over a conversation is visible"""
+    log_data = {
+        "event": "chat_tokens",
+        "session_id": session_id,
+        "messages": len(messages),
+        "prompt_tokens": count_message_tokens(messages, CHAT_COMPLETION_OPTIONS['model'])
+    }
+    if session is not None:
+        log_data.update(
+            verbatim_turns=len(session['turns']),
+            summarized_turns=session['summarized_turns'],
+            summary_tokens=session['summary_tokens']
+        )
+    if usage is not None:
+        log_data.update(upstream_prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    app.logger.info(json.dumps(log_data))
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class ChatStream:
+    """Turns a streamed chat completion into SSE events for /chat/stream
+
+    Emits `token` events as filtered text becomes available, then either a
+    `done` event carrying the /chat response body or an `error` event. Time-to-first-token is logged with the request duration once the
+    stream ends.
+    """
+
+    def __init__(self, question, history, request_id, path, started, session_id=None, session=None):
+        self.question = question
+        self.history = history
+        self.session_id = session_id
+        self.session = session
+        self.request_id = request_id
+        self.path = path
+        self.started = started
+        self.first_token_at = None
+        self.content_filter = content_filter.scanner()
+
+    @property
+    def closed(self):
+        return self.content_filter.flagged
+
+    def feed(self, chunk):
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if not text:
+            return []
+        return self._token_events(self.content_filter.feed(text))
+
+    def _token_events(self, released):
+        if self.content_filter.flagged:
+            return [sse_event('error', {
+                'success': False,
+                'error': 'Response filtered',
+                'message': 'The AI generated content that may be inappropriate. Please try a different query.'
+            })]
+        if not released:
+            return []
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        return [sse_event('token', {'content': released})]
+
+    def finish(self):
+        if self.closed:
+            self._log('filtered')
+            return []
+        events = self._token_events(self.content_filter.finish())
+        if self.closed:
+            self._log('filtered')
+            return events
+        response = self.content_filter.text
+        remember_chat_answer(self.question, self.history, response)
+        events.append(sse_event('done', chat_reply(self.question, response, self.history, self.session_id, self.session)))
+        self._log('ok')
+        return events
+
+    def fail(self, error):
+        app.logger.error(f"OpenAI API error: {error}")
+        self._log('error')
+        return [sse_event('error', {
+            'success': False,
+            'error': 'OpenAI API error',
+            'message': f'Error communicating with OpenAI: {error}'
+        })]
+
+    def _log(self, outcome):
+        log_data = {
+            "request_id": self.request_id,
+            "method": "POST",
+            "path": self.path,
+            "stream_outcome": outcome,
+            "duration_ms": round(time.time() - self.started, 3) * 1000,
+            "ttft_ms": round(self.first_token_at - self.started, 3) * 1000 if self.first_token_at else None,
+            "timestamp": datetime.now().isoformat()
+        }
+        if outcome == 'error':
+            app.logger.error(json.dumps(log_data))
+        else:
+            app.logger.info(json.dumps(log_data))
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming variant of /chat that forwards completion tokens as Server-Sent Events"""
+    json_data = request.get_json(force=True)
+    try:
+        data = ChatSchema().load(json_data)
+    except ValidationError as err:
+        return jsonify({'errors': err.messages, 'success': False}), 400
+
+    # Apply content filtering to user message
+    is_inappropriate, filtered_message = filter_content(data.get('message', ''))
+    if is_inappropriate:
+        return jsonify({
+            'success': False,
+            'error': 'Content filtered',
+            'message': 'Your message contains content that may be inappropriate. Please revise and try again.'
+        }), 403
+
+    history = data.get('history', [])
+
+    user_id = current_user_id()
+    if not user_api_key('openai_api_key', user_id):
+        return jsonify({
+            'success': False,
+            'error': 'API key not configured',
+            'message': 'Please add your OpenAI API key in the Settings page to use the chat feature.'
+        }), 400
+
+    session_id = data.get('session_id')
+    session = None
+    if session_id:
+        session = load_chat_session(session_id)
+        if session is None:
+            return jsonify(CHAT_SESSION_NOT_FOUND), 404
+        history = session_history(session)
+
+    cached_answer = cached_chat_answer(filtered_message, history)
+    if cached_answer is not None:
+        body = chat_reply(filtered_message, cached_answer, history, session_id, session, cached=True)
+        return Response(cached_chat_events(body), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+    messages = build_chat_messages(history, filtered_message)
+    log_chat_tokens(messages, session_id, session)
+    try:
+        stream = openai_client(user_id).chat.completions.create(messages=messages, stream=True, **CHAT_COMPLETION_OPTIONS)
+    except Exception as e:
+        app.logger.error(f"OpenAI API error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'OpenAI API error',
+            'message': f'Error communicating with OpenAI: {str(e)}'
+        }), 500
+
+    chat = ChatStream(filtered_message, history, g.request_id, request.path, g.start, session_id, session)
+
+    def events():
+        try:
+            for chunk in stream:
+                yield from chat.feed(chunk)
+                if chat.closed:
+                    break
+        except Exception as e:
+            yield from chat.fail(str(e))
+            return
+        finally:
+            # Stops generation upstream when the stream is abandoned early
+            stream.response.close()
+        yield from chat.finish()
+
+    return Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/chat/sessions', methods=['POST'])
+def create_chat_session():
+    """Start a server-side chat session; later /chat calls send only the new message and the session_id"""
+    return jsonify({'success': True, 'session_id': chat_sessions.create()}), 201
+
+@app.route('/chat/sessions/<session_id>', methods=['GET'])
+def get_chat_session(session_id):
+    session = chat_sessions.get(session_id)
+    if session is None:
+        return jsonify(CHAT_SESSION_NOT_FOUND), 404
+    return jsonify({
+        'success': True,
+        'session_id': session_id,
+        'summary': session['summary'],
+        'summarized_turns': session['summarized_turns'],
+        'history': [{"role": turn['role'], "content": turn['content']} for turn in session['turns']]
+    })
+
+@app.route('/chat/sessions/<session_id>', methods=['DELETE'])
+def delete_chat_session(session_id):
+    chat_sessions.delete(session_id)
+    return jsonify({'success': True})
+
+def cached_search(provider, keywords, category, max_results):
+    """Search a retailer provider, answering repeated searches from the response cache"""
+    return search_cache.cached(
+        f"{provider.name}_search",
+        search_cache_key(provider.name, keywords, category, max_results, provider.credential_scope),
+        lambda: flights.do(
+            f"{provider.name}_search",
+            flight_key(provider.credential_scope, keywords, category, max_results),
+            lambda: provider.search_products(keywords, category, max_results)
+        ),
+        timeout=app.config.get(f"{provider.name.upper()}_SEARCH_CACHE_TTL"),
+        cache_if=lambda results: results.get('success', False)
+    )
+
 @app.route('/walmart/search', methods=['GET'])
 def walmart_search():
     """Search for products on Walmart by keywords"""
@@ -372,7 +906,7 @@ def walmart_search():
         return jsonify({'error': 'No search keywords provided'}), 400
     
     try:
-        results = walmart_api.search_products(keywords, category, max_results)
+        results = cached_search(retailer_apis(current_user_id())['walmart'], keywords, category, max_results)
         return jsonify(results)
     except Exception as e:
         return jsonify({
@@ -388,7 +922,8 @@ def walmart_product_details(item_id):
         return jsonify({'error': 'No product item ID provided'}), 400
     
     try:
-        result = walmart_api.get_product_details(item_id)
+        walmart = retailer_apis(current_user_id())['walmart']
+        result = flights.do('walmart_product', (walmart.credential_scope, item_id), lambda: walmart.get_product_details(item_id))
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -408,7 +943,12 @@ def walmart_store_availability(item_id):
         return jsonify({'error': 'No zip code provided'}), 400
     
     try:
-        result = walmart_api.check_store_availability(item_id, zip_code)
+        walmart = retailer_apis(current_user_id())['walmart']
+        result = flights.do(
+            'walmart_store_availability',
+            (walmart.credential_scope, item_id, zip_code),
+            lambda: walmart.check_store_availability(item_id, zip_code)
+        )
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -417,6 +957,38 @@ def walmart_store_availability(item_id):
             'message': 'Error checking store availability'
         }), 500
 
+def build_price_comparison(results, provider_status):
+    """Combine per-retailer search results and pair up matching Amazon and Walmart products"""
+    # Combine and format the results
+    combined_results = {
+        'success': True,
+        **results,
+        'providers': provider_status,
+        'comparison': []
+    }
+    
+    # Create a simplified comparison of similar products
+    amazon_products = results.get('amazon', [])
+    walmart_products = results.get('walmart', [])
+    
+    # Pair each Amazon product with its most similar Walmart product
+    matcher = ProductMatcher(walmart_products, threshold=app.config['PRODUCT_MATCH_THRESHOLD'])
+    for amazon_product, walmart_product, score in matcher.match(amazon_products):
+        amazon_price = price_amount(amazon_product)
+        walmart_price = price_amount(walmart_product)
+        combined_results['comparison'].append({
+            'title': amazon_product.get('title'),
+            'amazon_price': amazon_price,
+            'amazon_url': amazon_product.get('url'),
+            'walmart_title': walmart_product.get('title'),
+            'walmart_price': walmart_price,
+            'walmart_url': walmart_product.get('url'),
+            'match_score': round(score, 3),
+            'price_difference': abs(amazon_price - walmart_price) if amazon_price is not None and walmart_price is not None else None
+        })
+    
+    return combined_results
+
 @app.route('/compare-prices', methods=['GET'])
 def compare_prices():
     """Compare prices for a product across multiple retailers"""
@@ -426,37 +998,14 @@ def compare_prices():
         return jsonify({'error': 'No search keywords provided'}), 400
     
     try:
-        # Search both Amazon and Walmart
-        amazon_results = amazon_api.search_products(keywords, 'Outdoors', 5)
-        walmart_results = walmart_api.search_products(keywords, None, 5)
-        
-        # Combine and format the results
-        combined_results = {
-            'success': True,
-            'amazon': amazon_results.get('products', []) if amazon_results.get('success', False) else [],
-            'walmart': walmart_results.get('products', []) if walmart_results.get('success', False) else [],
-            'comparison': []
-        }
-        
-        # Create a simplified comparison of similar products
-        amazon_products = amazon_results.get('products', []) if amazon_results.get('success', False) else []
-        walmart_products = walmart_results.get('products', []) if walmart_results.get('success', False) else []
-        
-        for amazon_product in amazon_products:
-            for walmart_product in walmart_products:
-                # Simple title similarity check - could be enhanced with better matching algorithm
-                if any(word in walmart_product.get('title', '').lower() for word in amazon_product.get('title', '').lower().split()):
-                    combined_results['comparison'].append({
-                        'title': amazon_product.get('title'),
-                        'amazon_price': amazon_product.get('price', {}).get('amount'),
-                        'amazon_url': amazon_product.get('url'),
-                        'walmart_price': walmart_product.get('price', {}).get('amount'),
-                        'walmart_url': walmart_product.get('url'),
-                        'price_difference': abs(float(amazon_product.get('price', {}).get('amount', 0)) - 
-                                              float(walmart_product.get('price', {}).get('amount', 0)))
-                    })
+        # Search every registered retailer concurrently, returning whatever arrives before the deadline
+        results, provider_status = retailer_fan_out.search(
+            user_retailers(current_user_id()),
+            lambda provider: cached_search(provider, keywords, provider.default_category, 5),
+            app.config['RETAILER_SEARCH_DEADLINE']
+        )
         
-        return jsonify(combined_results)
+        return jsonify(build_price_comparison(results, provider_status))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -464,31 +1013,16 @@ def compare_prices():
             'message': 'Error comparing prices'
         }), 500
 
-@app.route('/user-recommendations', methods=['POST'])
-def user_recommendations():
-    """Get personalized gear recommendations based on user profile and inventory"""
-    try:
-        # Parse request data
-        data = request.get_json(force=True)
-        user_profile = data.get('user_profile', {})
-        trip_parameters = data.get('trip_parameters', {})
-        inventory = data.get('inventory', [])
-        
-        # Get weather forecast for the trip location and season
-        location = trip_parameters.get('location', 'mountains')
-        season = trip_parameters.get('season', 'summer')
-        
-        # Make internal request to our weather forecast endpoint
-        weather_data = None
-        try:
-            weather_response = get_weather_forecast()
-            if weather_response[1] == 200:  # Check if status code is 200
-                weather_data = weather_response[0].json
-        except Exception as e:
-            app.logger.error(f"Error fetching weather data: {str(e)}")
-        
-        # Construct prompt with user profile, trip parameters, inventory, and weather data
-        prompt = f"""
+RECOMMENDATION_MODEL = "gpt-4-turbo"
+RECOMMENDATION_SYSTEM_MESSAGE = "You are a personalized gear recommendation system for Packstack. Your recommendations should be highly targeted to the individual user based on their profile, preferences, existing inventory, and weather conditions for their planned trip."
+
+def build_recommendation_request(user_profile, trip_parameters, inventory_summary, weather_data, location, season, focus_categories=None):
+    """OpenAI chat completion arguments for personalized gear recommendations, optionally limited to some inventory categories
+
+    inventory_summary is the compacted inventory text from compact_inventory().
+    """
+    # Construct prompt with user profile, trip parameters, inventory, and weather data
+    prompt = f"""
         I need personalized gear recommendations for an outdoor enthusiast.
         
         User profile:
@@ -498,12 +1032,12 @@ def user_recommendations():
         {json.dumps(trip_parameters) if trip_parameters else "No specific trip planned"}
         
         Current inventory:
-        {json.dumps(inventory) if inventory else "No existing inventory provided"}
+        {inventory_summary}
         """
-        
-        # Add weather data if available
-        if weather_data:
-            prompt += f"""
+    
+    # Add weather data if available
+    if weather_data:
+        prompt += f"""
             
             Weather forecast for {location} during {season}:
             Temperature: {weather_data['forecast']['avg_temp']}
@@ -513,8 +1047,8 @@ def user_recommendations():
             
             Please provide weather-specific gear recommendations based on these conditions.
             """
-        
-        prompt += """
+    
+    prompt += """
         
         Please provide:
         1. Personalized gear recommendations based on their experience level, preferences, existing inventory, and weather conditions
@@ -524,59 +1058,155 @@ def user_recommendations():
         5. Safety equipment needed based on weather alerts and conditions
         
         Format your response as structured JSON with categories and item recommendations.
+        Where an item fits one of the inventory's categories, use that category name.
         """
+    
+    if focus_categories:
+        prompt += f"""
+            Only these inventory categories changed since the previous recommendations: {', '.join(focus_categories)}.
+            Limit this response to gear in those categories, and set each item's category to one of them.
+            """
+    
+    return {
+        'model': RECOMMENDATION_MODEL,
+        'messages': [
+            {"role": "system", "content": RECOMMENDATION_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 2000,
+        'temperature': 0.5,
+        'response_format': {"type": "json_object"}  # Request JSON formatted response
+    }
+
+def parse_recommendation_response(recommendation):
+    """Filter and parse the model's recommendations, returning (body, status_code)"""
+    # Apply content filtering to AI response
+    is_inappropriate, filtered_response = filter_content(recommendation)
+    if is_inappropriate:
+        return {
+            'success': False,
+            'error': 'Content filtering',
+            'message': "The generated response contained inappropriate content and was blocked."
+        }, 403
+    
+    # Parse the JSON to validate it and ensure proper structure
+    try:
+        json_response = json.loads(filtered_response)
+        return {
+            'success': True,
+            'recommendations': json_response
+        }, 200
+    except json.JSONDecodeError:
+        # If not valid JSON, return the raw response
+        return {
+            'success': False,
+            'recommendations': filtered_response,
+            'error': 'Failed to generate structured recommendations'
+        }, 200
+
+class RecommendationRequest:
+    """A /user-recommendations request body, answered from the recommendation cache where possible
+
+    On a full hit `cached_body` is set and no completion is needed. Otherwise
+    call the chat completion with `completion_args` and pass its text to
+    complete(): after a partial hit the request covers only the inventory
+    categories that changed and the result is merged into the previous
+    recommendations. `refresh: true` in the body bypasses the cache.
+    """
+
+    def __init__(self, data):
+        user_profile = data.get('user_profile', {})
+        trip_parameters = data.get('trip_parameters', {})
+        inventory = data.get('inventory', [])
         
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a personalized gear recommendation system for Packstack. Your recommendations should be highly targeted to the individual user based on their profile, preferences, existing inventory, and weather conditions for their planned trip."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            max_tokens=2000,
-            temperature=0.5,
-            response_format={"type": "json_object"}  # Request JSON formatted response
+        # Get weather forecast for the trip location and season
+        location = trip_parameters.get('location', 'mountains')
+        season = trip_parameters.get('season', 'summer')
+        
+        weather_data = None
+        try:
+            weather_data = lookup_forecast(location, season)
+        except Exception as e:
+            app.logger.error(f"Error fetching weather data: {str(e)}")
+        
+        groups = inventory_by_category(inventory)
+        self.context_hash = content_hash([user_profile, trip_parameters, weather_data])
+        self.fingerprints = {category: content_hash(items) for category, items in groups.items()}
+        self.previous, self.changed = (None, None) if data.get('refresh') else recommendation_cache.lookup(self.context_hash, self.fingerprints)
+        
+        self.cached_body = None
+        self.completion_args = None
+        self.compaction = None
+        if self.previous is not None and not self.changed:
+            self.cached_body = {'success': True, 'recommendations': self.previous, 'cached': True}
+            return
+        
+        if self.changed:
+            inventory = [item for category in sorted(self.changed) for item in groups.get(category, [])]
+        inventory_summary, self.compaction = compact_inventory(
+            inventory, app.config['RECOMMENDATION_INVENTORY_TOKEN_BUDGET'], RECOMMENDATION_MODEL
+        )
+        app.logger.info(json.dumps(dict(self.compaction, event="inventory_compaction")))
+        self.completion_args = build_recommendation_request(
+            user_profile, trip_parameters, inventory_summary, weather_data, location, season,
+            focus_categories=sorted(self.changed) if self.changed else None
         )
+
+    def complete(self, content):
+        """Parse the model's response, merge and cache it; returns (body, status)"""
+        body, status = parse_recommendation_response(content)
+        if status != 200 or not body['success'] or not isinstance(body['recommendations'], dict):
+            return dict(body, cached=False, inventory_compaction=self.compaction), status
         
-        # Extract the assistant's response
-        recommendation = response.choices[0].message.content
+        recommendations = body['recommendations']
+        if self.changed:
+            recommendations = merge_recommendations(self.previous, recommendations, self.changed)
+        recommendation_cache.store(self.context_hash, self.fingerprints, recommendations)
+        body = {'success': True, 'recommendations': recommendations, 'cached': False, 'inventory_compaction': self.compaction}
+        if self.changed:
+            body['requeried_categories'] = sorted(self.changed)
+        return body, 200
+
+def generate_recommendations(data, user_id=None):
+    """Personalized gear recommendations for a /user-recommendations request body; returns (body, status)"""
+    try:
+        recommendation = RecommendationRequest(data)
+        if recommendation.cached_body is not None:
+            return recommendation.cached_body, 200
         
-        # Apply content filtering to AI response
-        is_inappropriate, filtered_response = filter_content(recommendation)
-        if is_inappropriate:
-            return jsonify({
-                'success': False,
-                'error': 'Content filtering',
-                'message': "The generated response contained inappropriate content and was blocked."
-            }), 403
+        # Call OpenAI API
+        response = create_chat_completion('openai_recommendations', user_id, **recommendation.completion_args)
         
-        # Parse the JSON to validate it and ensure proper structure
-        try:
-            json_response = json.loads(filtered_response)
-            return jsonify({
-                'success': True,
-                'recommendations': json_response
-            })
-        except json.JSONDecodeError:
-            # If not valid JSON, return the raw response
-            return jsonify({
-                'success': False,
-                'recommendations': filtered_response,
-                'error': 'Failed to generate structured recommendations'
-            })
+        # Extract the assistant's response
+        return recommendation.complete(response.choices[0].message.content)
         
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'message': 'An error occurred while generating recommendations'
+        }, 500
+
+@app.route('/user-recommendations', methods=['POST'])
+def user_recommendations():
+    """Get personalized gear recommendations based on user profile and inventory"""
+    try:
+        data = request.get_json(force=True)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e),
             'message': 'An error occurred while generating recommendations'
         }), 500
+    
+    body, status = generate_recommendations(data)
+    return jsonify(body), status
+
+@app.route('/user-recommendations/cache', methods=['DELETE'])
+def invalidate_recommendations():
+    """Drop every cached /user-recommendations result"""
+    recommendation_cache.invalidate()
+    return jsonify({'success': True})
 
 @app.route('/amazon/search', methods=['GET'])
 def amazon_search():
@@ -587,7 +1217,7 @@ def amazon_search():
     except ValidationError as err:
         return jsonify({'errors': err.messages}), 400
     try:
-        results = amazon_api.search_products(params['keywords'], params['category'], params['max_results'])
+        results = cached_search(retailer_apis(current_user_id())['amazon'], params['keywords'], params['category'], params['max_results'])
         return jsonify(results)
     except Exception as e:
         return jsonify({
@@ -603,9 +1233,39 @@ def amazon_product_details(asin):
         data = ASINSchema().load({'asin': asin})
     except ValidationError as err:
         return jsonify({'errors': err.messages}), 400
-    result = amazon_api.get_product_details(data['asin'])
+    amazon = retailer_apis(current_user_id())['amazon']
+    result = flights.do('amazon_product', (amazon.credential_scope, data['asin']), lambda: amazon.get_product_details(data['asin']))
     return jsonify(result)
 
+@app.route('/amazon/products', methods=['GET'])
+def amazon_products_details():
+    """Get detailed information for several Amazon products at once (?asins=ASIN1,ASIN2,...)"""
+    asins = [asin.strip() for asin in request.args.get('asins', '').split(',') if asin.strip()]
+    try:
+        data = ASINListSchema().load({'asins': asins})
+    except ValidationError as err:
+        return jsonify({'errors': err.messages}), 400
+    amazon = retailer_apis(current_user_id())['amazon']
+    result = flights.do('amazon_products', (amazon.credential_scope, tuple(data['asins'])), lambda: amazon.get_products_details(data['asins']))
+    return jsonify(result)
+
+def lookup_forecast(location, season, date=None):
+    """Forecast for a location and season (or date), defaulting to mountains in summer"""
+    return weather.forecast(location, season, date)
+
+def conditional_json(body, max_age):
+    """JSON response with an ETag and Cache-Control max-age, or an empty 304 when the client's copy is current"""
+    payload = json.dumps(body, sort_keys=True)
+    etag = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
 @app.route('/weather-forecast', methods=['GET'])
 def get_weather_forecast():
     """Get weather forecast for a location"""
@@ -614,131 +1274,163 @@ def get_weather_forecast():
         params = WeatherSchema().load(args)
     except ValidationError as err:
         return jsonify({'errors': err.messages}), 400
-    location = params['location']
-    
-    # Mock weather forecasting data - in a real application, this would call a weather API
-    mock_forecasts = {
-        'mountains': {
-            'spring': {
-                'avg_temp': '45-65°F (7-18°C)',
-                'precipitation': 'Moderate rain showers',
-                'conditions': ['Rain', 'Wind', 'Variable temperatures'],
-                'alerts': ['Possibility of late snow']
-            },
-            'summer': {
-                'avg_temp': '65-85°F (18-29°C)',
-                'precipitation': 'Occasional thunderstorms',
-                'conditions': ['Sunny days', 'Cool nights', 'Afternoon thunderstorms'],
-                'alerts': ['Lightning risk', 'Flash flood potential in valleys']
-            },
-            'fall': {
-                'avg_temp': '40-60°F (4-15°C)',
-                'precipitation': 'Light rain, possible early snow',
-                'conditions': ['Variable weather', 'Dropping temperatures', 'Early frost possible'],
-                'alerts': ['Early snowfall possible at higher elevations']
-            },
-            'winter': {
-                'avg_temp': '10-30°F (-12 to -1°C)',
-                'precipitation': 'Snow, occasional freezing rain',
-                'conditions': ['Snow', 'Ice', 'Strong winds'],
-                'alerts': ['Blizzard conditions possible', 'Avalanche risk in steep terrain']
-            }
-        },
-        'desert': {
-            'spring': {
-                'avg_temp': '60-80°F (15-27°C)',
-                'precipitation': 'Very little',
-                'conditions': ['Large temperature swings', 'Windy', 'Dry'],
-                'alerts': ['Dust storms possible']
-            },
-            'summer': {
-                'avg_temp': '90-110°F (32-43°C)',
-                'precipitation': 'Rare thunderstorms',
-                'conditions': ['Extreme heat', 'Very dry', 'Intense sun'],
-                'alerts': ['Extreme heat warnings', 'Flash flood risk during storms']
-            },
-            'fall': {
-                'avg_temp': '65-85°F (18-29°C)',
-                'precipitation': 'Very little',
-                'conditions': ['Cooling temperatures', 'Dry', 'Pleasant'],
-                'alerts': ['Cold nights possible']
-            },
-            'winter': {
-                'avg_temp': '40-60°F (4-15°C)',
-                'precipitation': 'Occasional rain',
-                'conditions': ['Cool days', 'Cold nights', 'Clear skies'],
-                'alerts': ['Freezing temperatures at night']
-            }
-        },
-        'coast': {
-            'spring': {
-                'avg_temp': '50-65°F (10-18°C)',
-                'precipitation': 'Frequent rain showers',
-                'conditions': ['Foggy mornings', 'Windy', 'Mild'],
-                'alerts': ['High surf advisories possible']
-            },
-            'summer': {
-                'avg_temp': '65-75°F (18-24°C)',
-                'precipitation': 'Fog and occasional drizzle',
-                'conditions': ['Morning fog', 'Mild temperatures', 'Ocean breeze'],
-                'alerts': ['Rip currents', 'Dense fog advisories']
-            },
-            'fall': {
-                'avg_temp': '55-70°F (13-21°C)',
-                'precipitation': 'Increasing rain chances',
-                'conditions': ['Variable clouds', 'Moderate temperatures', 'Windy'],
-                'alerts': ['High surf', 'Early season storms possible']
-            },
-            'winter': {
-                'avg_temp': '45-60°F (7-15°C)',
-                'precipitation': 'Heavy rain periods',
-                'conditions': ['Stormy', 'Wet', 'Windy'],
-                'alerts': ['Coastal flooding', 'High wind warnings']
-            }
-        },
-        'forest': {
-            'spring': {
-                'avg_temp': '45-65°F (7-18°C)',
-                'precipitation': 'Frequent rain',
-                'conditions': ['Damp', 'Cool mornings', 'Mild afternoons'],
-                'alerts': ['Flooding in low areas']
-            },
-            'summer': {
-                'avg_temp': '65-85°F (18-29°C)',
-                'precipitation': 'Occasional rain',
-                'conditions': ['Warm days', 'Cooler under canopy', 'Humidity'],
-                'alerts': ['Wildfire risk in dry periods', 'Tick activity high']
-            },
-            'fall': {
-                'avg_temp': '40-65°F (4-18°C)',
-                'precipitation': 'Moderate rain',
-                'conditions': ['Cool', 'Damp mornings', 'Falling leaves increase trail slipperiness'],
-                'alerts': ['Early frost possible', 'Falling branches during storms']
-            },
-            'winter': {
-                'avg_temp': '20-40°F (-7 to 4°C)',
-                'precipitation': 'Snow and freezing rain',
-                'conditions': ['Snow-covered trails', 'Ice', 'Limited daylight'],
-                'alerts': ['Hypothermia risk', 'Tree fall hazards during storms']
-            }
-        }
-    }
     
-    # Default to mountains if location not found
-    location_key = location.lower() if location.lower() in mock_forecasts else 'mountains'
+    try:
+        forecast = lookup_forecast(params['location'], params['season'], params['date'])
+    except WeatherProviderError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Weather forecast unavailable'
+        }), 502
+    return conditional_json(forecast, app.config['WEATHER_MAX_AGE'])
+
+@app.route('/weather-forecast/batch', methods=['GET'])
+def get_weather_forecasts():
+    """Forecasts for every waypoint of a trip in one call
+
+    Waypoints are repeated `location` parameters. Either one `date` per
+    location, or a single `season` (or date) for all of them.
+    """
+    try:
+        params = WeatherBatchSchema().load({
+            'location': request.args.getlist('location'),
+            'date': request.args.getlist('date'),
+            **({'season': request.args['season']} if 'season' in request.args else {})
+        })
+    except ValidationError as err:
+        return jsonify({'errors': err.messages}), 400
     
-    # Get the appropriate season data (default to summer)
-    season = request.args.get('season', 'summer').lower()
-    if season not in ['spring', 'summer', 'fall', 'winter']:
-        season = 'summer'
+    locations, dates = params['location'], params['date']
+    if len(locations) > app.config['WEATHER_BATCH_MAX_WAYPOINTS']:
+        return jsonify({'error': f"At most {app.config['WEATHER_BATCH_MAX_WAYPOINTS']} waypoints per request"}), 400
+    if len(dates) > 1 and len(dates) != len(locations):
+        return jsonify({'error': 'Provide one date per location, or a single date for all of them'}), 400
+    waypoints = [(location, dates[0] if len(dates) == 1 else dates[i] if dates else None) for i, location in enumerate(locations)]
     
-    forecast = mock_forecasts[location_key][season]
+    def fetch(waypoint):
+        location, date = waypoint
+        try:
+            return lookup_forecast(location, params['season'], date)
+        except WeatherProviderError as e:
+            return {'location': location, 'error': str(e)}
+        except Exception as e:
+            # A bad waypoint (malformed location, unknown season) fails only its own entry, not the batch
+            app.logger.error(f"Weather forecast error for {location!r}: {e!r}")
+            return {'location': location, 'error': 'Weather forecast unavailable', 'message': str(e)}
     
+    # Waypoints often repeat (out-and-back trips), so each distinct one is fetched once
+    unique = list(dict.fromkeys(waypoints))
+    forecasts = dict(zip(unique, weather_executor.map(fetch, unique)))
+    return conditional_json({'forecasts': [forecasts[waypoint] for waypoint in waypoints]}, app.config['WEATHER_MAX_AGE'])
+
+def run_analysis_job(payload):
+    return analyze_prepared(
+        payload['upload_id'], payload['image_b64'], payload['dhash'], payload['batch_mode'], payload['detect_barcodes'], payload.get('user_id')
+    )
+
+jobs.register('analyze', run_analysis_job)
+def run_recommendations_job(payload):
+    return generate_recommendations(payload['request'], payload['user_id'])
+
+jobs.register('user_recommendations', run_recommendations_job)
+
+def job_accepted(job_id):
     return jsonify({
-        'location': location,
-        'season': season,
-        'forecast': forecast
-    })
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f"/jobs/{job_id}",
+        'events_url': f"/jobs/{job_id}/events"
+    }), 202
+
+@app.route('/jobs/analyze', methods=['POST'])
+def submit_analysis_job():
+    """Queue an /analyze request and return a job ID immediately"""
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image provided'}), 400
+    
+    file = request.files['image']
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Unsupported file type'}), 400
+    
+    # Prepare the image now so invalid uploads fail fast and the job stores the compact JPEG
+    upload_id = uuid.uuid4().hex
+    try:
+        image_bytes, image_info = image_pipeline.process(file.read())
+    except ImageProcessingError as e:
+        app.logger.warning(f"Upload {upload_id} rejected: {str(e)}")
+        return jsonify({'error': 'Invalid image', 'upload_id': upload_id}), 400
+    
+    return job_accepted(jobs.submit('analyze', {
+        'upload_id': upload_id,
+        'image_b64': base64.b64encode(image_bytes).decode(),
+        'dhash': image_info['dhash'],
+        'batch_mode': request.form.get('batch_mode', 'false').lower() == 'true',
+        'detect_barcodes': request.form.get('detect_barcodes', 'false').lower() == 'true',
+        'user_id': current_user_id()
+    }))
+
+@app.route('/jobs/user-recommendations', methods=['POST'])
+def submit_recommendations_job():
+    """Queue a /user-recommendations request and return a job ID immediately"""
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid JSON body', 'success': False}), 400
+    return job_accepted(jobs.submit('user_recommendations', {'request': data, 'user_id': current_user_id()}))
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Current state of a job, including its result once finished"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(dict(job, success=True))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of a job's status changes, ending with its result
+
+    A stream stays open for at most JOBS_EVENTS_MAX_DURATION seconds so a
+    waiting client never holds a sync worker for the life of the job; it
+    then ends with a `reconnect` event and EventSource reconnects after the
+    `retry` delay (or the client polls GET /jobs/<id>).
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    poll_interval = app.config['JOBS_EVENTS_POLL_INTERVAL']
+    deadline = time.monotonic() + app.config['JOBS_EVENTS_MAX_DURATION']
+    
+    def events(job):
+        yield f"retry: {int(poll_interval * 1000)}\n\n"
+        last_status = None
+        last_sent = time.monotonic()
+        while True:
+            if job['status'] in ('succeeded', 'failed', 'expired'):
+                yield sse_event('result', job)
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                last_sent = time.monotonic()
+                yield sse_event('status', {'job_id': job_id, 'status': last_status})
+            elif time.monotonic() - last_sent > 15:
+                # Comment line keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            if time.monotonic() > deadline:
+                yield sse_event('reconnect', {'job_id': job_id, 'status': last_status})
+                return
+            time.sleep(poll_interval)
+            job = jobs.get(job_id)
+            if job is None:
+                yield sse_event('error', {'job_id': job_id, 'error': 'Job not found'})
+                return
+    
+    return Response(events(job), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 @app.route('/health_check', methods=['GET'])
 def health_check():
@@ -751,8 +1443,7 @@ def health_check():
         'subsystems': {
             'openai_api': test_openai_connection_status(),
             'amazon_api': test_amazon_api_status(),
-            'walmart_api': test_walmart_api_status(),
-            'file_storage': os.path.exists(UPLOAD_FOLDER)
+            'walmart_api': test_walmart_api_status()
         }
     }
     
@@ -762,10 +1453,30 @@ def health_check():
     
     return jsonify(health_status)
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose in-process performance counters"""
+    return jsonify(collect_metrics())
+
+def collect_metrics():
+    return {
+        'cache': search_cache.stats(),
+        'http_pools': http_pool_stats(),
+        'single_flight': flights.stats(),
+        'image_pipeline': image_pipeline.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'jobs': jobs.stats(),
+        'semantic_cache': semantic_cache.stats() if semantic_cache is not None else None,
+        'content_filter': content_filter.stats(),
+        'recommendation_cache': recommendation_cache.stats(),
+        'item_search': item_index.stats(),
+        'storage': storage.stats()
+    }
+
 def test_openai_connection_status():
     """Test if OpenAI API is accessible"""
     try:
-        api_key = os.getenv('OPENAI_API_KEY')
+        api_key = user_api_key('openai_api_key', request_user_id())
         if not api_key:
             return False
         
@@ -788,51 +1499,58 @@ def test_walmart_api_status():
     except Exception:
         return False
 
+# Name and symbol of the currencies offered on the Settings page; other codes are shown as the code itself
+CURRENCIES = {
+    'USD': ('United States Dollar', '$'),
+    'EUR': ('Euro', '€'),
+    'GBP': ('British Pound', '£'),
+    'CAD': ('Canadian Dollar', '$'),
+    'AUD': ('Australian Dollar', '$'),
+    'JPY': ('Japanese Yen', '¥')
+}
+
+def isoformat(timestamp):
+    return datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def user_response(user, include_keys=False):
+    """A stored user in the shape of UserInfo (src/types/user.ts), with API keys only when asked for"""
+    name, symbol = CURRENCIES.get(user['currency'], (user['currency'], user['currency']))
+    body = {
+        'id': user['id'],
+        'username': user['username'],
+        'email': user['email'],
+        'created_at': isoformat(user['created_at']),
+        'updated_at': isoformat(user['updated_at']),
+        'currency': {'code': user['currency'], 'name': name, 'symbol': symbol},
+        'unit_weight': user['unit_weight'],
+        'unit_distance': user['unit_distance'],
+        'trips': storage.list_trips(user['id'])
+    }
+    if include_keys:
+        body.update((key, user.get(key, '')) for key in API_KEY_SETTINGS)
+    return body
+
 @app.route('/user', methods=['OPTIONS', 'POST'])
 def register_user():
-    """Mock endpoint for user registration"""
+    """Register a user and sign them in"""
     # Handle OPTIONS request for CORS preflight
     if request.method == 'OPTIONS':
         return '', 204
-        
-    # Handle POST request for registration
+
     try:
-        json_data = request.get_json(force=True)
-        app.logger.info(f"Registration request received: {json_data}")
-        
-        # Validate with more detailed error handling
-        try:
-            data = RegisterSchema().load(json_data)
-        except ValidationError as err:
-            # Provide more detailed error messages
-            app.logger.warning(f"Registration validation error: {err.messages}")
-            return jsonify({
-                'success': False,
-                'detail': 'Invalid registration data',
-                'errors': err.messages
-            }), 400
-            
-        app.logger.info(f"User registration validated: {data}")
-        
-        # Mock successful registration response
+        data = RegisterSchema().load(request.get_json(force=True))
+    except ValidationError as err:
+        app.logger.warning(f"Registration validation error: {err.messages}")
         return jsonify({
-            'token': 'mock_token_for_testing',
-            'user': {
-                'id': 1,
-                'username': data.get('username', ''),
-                'email': data.get('email', ''),
-                'created_at': '2025-04-14T09:00:00Z',
-                'updated_at': '2025-04-14T09:00:00Z',
-                'currency': {
-                    'code': 'USD',
-                    'name': 'United States Dollar',
-                    'symbol': '$'
-                },
-                'unit_weight': 'METRIC',
-                'unit_distance': 'KILOMETERS',
-                'trips': []
-            }
-        }), 201
+            'success': False,
+            'detail': 'Invalid registration data',
+            'errors': err.messages
+        }), 400
+
+    try:
+        user = storage.create_user(data['username'].strip(), data['email'].strip(), data['password'])
+    except ValueError as e:
+        return jsonify({'success': False, 'detail': str(e)}), 409
     except Exception as e:
         app.logger.error(f"Unexpected error in registration: {str(e)}")
         return jsonify({
@@ -840,57 +1558,31 @@ def register_user():
             'detail': 'Server error processing registration',
             'message': str(e)
         }), 500
+    app.logger.info(f"User {user['id']} registered")
+    return jsonify({'token': storage.create_token(user['id']), 'user': user_response(user)}), 201
 
 @app.route('/user/login', methods=['OPTIONS', 'POST'])
 def login_user():
-    """Mock endpoint for user login"""
+    """Sign in with a username or email and password"""
     # Handle OPTIONS request for CORS preflight
     if request.method == 'OPTIONS':
         return '', 204
-        
-    # Handle POST request for login
+
     try:
-        json_data = request.get_json(force=True)
-        app.logger.info(f"Login request received: {json_data}")
-        
-        # Validate with more detailed error handling
-        try:
-            data = LoginSchema().load(json_data)
-        except ValidationError as err:
-            # Provide more detailed error messages
-            app.logger.warning(f"Login validation error: {err.messages}")
-            return jsonify({
-                'success': False,
-                'detail': 'Invalid login credentials',
-                'errors': err.messages
-            }), 400
-        
-        app.logger.info(f"User login validated: {data}")
-        
-        # Extract the username from emailOrUsername
-        username = data.get('emailOrUsername', '')
-        if '@' in username:
-            username = username.split('@')[0]
-        
-        # Mock successful login response
+        data = LoginSchema().load(request.get_json(force=True))
+    except ValidationError as err:
+        app.logger.warning(f"Login validation error: {err.messages}")
         return jsonify({
-            'token': 'mock_token_for_testing',
-            'user': {
-                'id': 1,
-                'username': username,
-                'email': data.get('emailOrUsername', ''),
-                'created_at': '2025-04-14T09:00:00Z',
-                'updated_at': '2025-04-14T09:00:00Z',
-                'currency': {
-                    'code': 'USD',
-                    'name': 'United States Dollar',
-                    'symbol': '$'
-                },
-                'unit_weight': 'METRIC',
-                'unit_distance': 'KILOMETERS',
-                'trips': []
-            }
-        }), 200
+            'success': False,
+            'detail': 'Invalid login credentials',
+            'errors': err.messages
+        }), 400
+
+    try:
+        user = storage.authenticate(data['emailOrUsername'].strip(), data['password'])
+        if user is None:
+            return jsonify({'success': False, 'detail': 'Invalid login credentials'}), 401
+        return jsonify({'token': storage.create_token(user['id']), 'user': user_response(user)}), 200
     except Exception as e:
         app.logger.error(f"Unexpected error in login: {str(e)}")
         return jsonify({
@@ -901,155 +1593,225 @@ def login_user():
 
 @app.route('/user', methods=['GET'])
 def get_user():
-    """Mock endpoint to get the current user's data"""
-    try:
-        # Check for auth token
-        auth_header = request.headers.get('Authorization', '')
-        app.logger.info(f"Get user request received with auth: {auth_header[:10]}...")
-        
-        if not auth_header.startswith('Bearer '):
-            app.logger.warning("Unauthorized access attempt - missing or invalid Bearer token")
-            return jsonify({
-                'success': False,
-                'detail': 'Authentication required. Please login.'
-            }), 401
-        
-        # In a real implementation, you would validate the token here
-        # For mock purposes, we'll just return the data
-        
-        # Mock user data
-        return jsonify({
-            'id': 1,
-            'username': 'testuser',
-            'email': 'test@example.com',
-            'created_at': '2025-04-14T09:00:00Z',
-            'updated_at': '2025-04-14T09:00:00Z',
-            'currency': {
-                'code': 'USD',
-                'name': 'United States Dollar',
-                'symbol': '$'
-            },
-            'unit_weight': 'METRIC',
-            'unit_distance': 'KILOMETERS',
-            'openai_api_key': os.getenv('OPENAI_API_KEY', ''),
-            'amazon_access_key': os.getenv('AWS_ACCESS_KEY_ID', ''),
-            'amazon_secret_key': os.getenv('AWS_SECRET_KEY', ''),
-            'amazon_associate_tag': os.getenv('AWS_ASSOCIATE_TAG', ''),
-            'walmart_client_id': os.getenv('WALMART_CLIENT_ID', ''),
-            'walmart_client_secret': os.getenv('WALMART_CLIENT_SECRET', ''),
-            'trips': []
-        }), 200
-    except Exception as e:
-        app.logger.error(f"Unexpected error in get_user: {str(e)}")
+    """The signed-in user's profile and settings"""
+    user_id = current_user_id()
+    user = storage.get_user(user_id) if user_id is not None else None
+    if user is None:
         return jsonify({
             'success': False,
-            'detail': 'Server error retrieving user data',
-            'message': str(e)
-        }), 500
+            'detail': 'Authentication required. Please login.'
+        }), 401
+    return jsonify(user_response(user, include_keys=True)), 200
 
 @app.route('/user', methods=['PUT'])
 def update_user():
-    """Endpoint to update user settings and API keys"""
-    # Check for auth token
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('Bearer '):
+    """Update the signed-in user's settings and API keys"""
+    user_id = current_user_id()
+    if user_id is None:
         return jsonify({'error': 'Unauthorized'}), 401
-    
+
     try:
         data = request.get_json()
-        app.logger.info(f"Received user update: {data}")
-        
-        # Update environment variables with API keys if provided
-        if 'openai_api_key' in data and data['openai_api_key']:
-            os.environ['OPENAI_API_KEY'] = data['openai_api_key']
-            # Update the OpenAI client with the new API key
-            global client
-            client = OpenAI(api_key=data['openai_api_key'])
-        
-        # Update Amazon API keys
-        if 'amazon_access_key' in data and data['amazon_access_key']:
-            os.environ['AWS_ACCESS_KEY_ID'] = data['amazon_access_key']
-        if 'amazon_secret_key' in data and data['amazon_secret_key']:
-            os.environ['AWS_SECRET_KEY'] = data['amazon_secret_key']
-        if 'amazon_associate_tag' in data and data['amazon_associate_tag']:
-            os.environ['AWS_ASSOCIATE_TAG'] = data['amazon_associate_tag']
-            
-        # Reinitialize the Amazon API client
-        if any(['amazon_access_key' in data, 'amazon_secret_key' in data, 'amazon_associate_tag' in data]):
-            global amazon_api
-            amazon_api = AmazonProductAPI()
-        
-        # Update Walmart API keys
-        if 'walmart_client_id' in data and data['walmart_client_id']:
-            os.environ['WALMART_CLIENT_ID'] = data['walmart_client_id']
-        if 'walmart_client_secret' in data and data['walmart_client_secret']:
-            os.environ['WALMART_CLIENT_SECRET'] = data['walmart_client_secret']
-            
-        # Reinitialize the Walmart API client
-        if any(['walmart_client_id' in data, 'walmart_client_secret' in data]):
-            global walmart_api
-            walmart_api = WalmartAPI()
-        
-        # Return updated user data
-        return jsonify({
-            'id': 1,
-            'username': 'testuser',
-            'email': data.get('email', 'test@example.com'),
-            'created_at': '2025-04-14T09:00:00Z',
-            'updated_at': '2025-04-14T09:00:00Z',
-            'currency': {
-                'code': data.get('currency', 'USD'),
-                'name': 'Updated Currency',
-                'symbol': '$'
-            },
-            'unit_weight': data.get('unit_weight', 'METRIC'),
-            'unit_distance': data.get('unit_distance', 'KILOMETERS'),
-            'openai_api_key': data.get('openai_api_key', ''),
-            'amazon_access_key': data.get('amazon_access_key', ''),
-            'amazon_secret_key': data.get('amazon_secret_key', ''),
-            'amazon_associate_tag': data.get('amazon_associate_tag', ''),
-            'walmart_client_id': data.get('walmart_client_id', ''),
-            'walmart_client_secret': data.get('walmart_client_secret', ''),
-            'trips': []
-        }), 200
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Bad request', 'message': 'Expected a JSON object'}), 400
+        # Empty API key fields leave the stored key as it is
+        user = storage.update_settings(user_id, {
+            key: value for key, value in data.items() if key not in API_KEY_SETTINGS or value
+        })
+        if user is None:
+            return jsonify({'error': 'Unauthorized'}), 401
+        # Saved keys apply to this user's requests from now on (see user_api_key and retailer_apis)
+        return jsonify(user_response(user, include_keys=True)), 200
     except Exception as e:
         app.logger.error(f"Error updating user: {e}")
         return jsonify({'error': 'Bad request', 'message': str(e)}), 400
 
+@app.route('/packs/breakdown', methods=['POST'])
+def pack_breakdown():
+    """Base, worn, consumable and total weight of a pack with per-category subtotals and percentages
+
+    The pack is either `items` (pack items or inventory items) or `columns`:
+    one list per field (weight, unit, quantity, worn, consumable, category),
+    which skips reading items one by one. Weights are in `unit`, or the
+    unit system's display unit (kg for METRIC, lb for IMPERIAL).
+    """
+    try:
+        data = PackBreakdownSchema().load(request.get_json(silent=True) or {})
+    except ValidationError as err:
+        return jsonify({'errors': err.messages}), 400
+    items, columns = data['items'], data['columns']
+    if (items is None) == (columns is None):
+        return jsonify({'error': 'Provide either items or columns'}), 400
+    if not isinstance(items if columns is None else columns, list if columns is None else dict):
+        return jsonify({'error': 'items must be a list, columns an object of lists'}), 400
+    try:
+        breakdown = weight_breakdown(pack_columns(items) if columns is None else columns, data['unit'] or UNIT_SYSTEMS[data['unit_system']])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(breakdown)
+
+def bearer_user_id(authorization):
+    """ID of the user an `Authorization: Bearer <token>` header's token was issued to, or None"""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme != 'Bearer' or not token.strip():
+        return None
+    return storage.user_id_for_token(token.strip())
+
+def current_user_id():
+    """ID of the user the request's Bearer token was issued to, or None"""
+    return bearer_user_id(request.headers.get('Authorization'))
+
+def import_inventory(format):
+    """Stream an uploaded CSV into the user's inventory
+
+    The file is a multipart `file` field or the raw request body (text/csv).
+    Responds with the import summary as JSON, or as Server-Sent Events when
+    the client accepts text/event-stream: a `progress` event after each
+    committed batch, then `done` with the summary.
+    """
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'success': False, 'detail': 'Authentication required. Please login.'}), 401
+    upload = request.files.get('file')
+    if upload is None and request.mimetype not in ('text/csv', 'application/octet-stream'):
+        return jsonify({'success': False, 'error': 'No file provided', 'errors': [], 'count': 0}), 400
+
+    importer = InventoryImport(storage, user_id, format, app.config['IMPORT_BATCH_SIZE'], app.config['IMPORT_MAX_ERRORS'])
+    progress = importer.run(upload.stream if upload is not None else request.stream)
+
+    def log_import():
+        app.logger.info(json.dumps({"event": "inventory_import", "format": format, "user_id": user_id,
+                                    **{key: value for key, value in importer.summary.items() if key != 'errors'}}))
+
+    if request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream':
+        def events():
+            try:
+                for summary in progress:
+                    yield sse_event('progress', {key: value for key, value in summary.items() if key != 'errors'})
+            except ValueError as e:
+                yield sse_event('error', {'success': False, 'error': str(e)})
+                return
+            log_import()
+            yield sse_event('done', importer.summary)
+
+        return Response(stream_with_context(events()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+    try:
+        for _ in progress:
+            pass
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': [], 'count': 0}), 400
+    log_import()
+    return jsonify(importer.summary)
+
+@app.route('/items', methods=['GET'])
+def list_items():
+    """The signed-in user's inventory items, by category and sort order"""
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'success': False, 'detail': 'Authentication required. Please login.'}), 401
+    items = storage.list_items(user_id, request.args.get('category_id', type=int))
+    for item in items:
+        item['consumable'] = bool(item['consumable'])
+        item['created_at'] = isoformat(item['created_at'])
+        item['updated_at'] = isoformat(item['updated_at'])
+    return jsonify(items)
+
+def reorder(reorder_rows):
+    """Apply a drag-and-drop ordering ([{id, sort_order}], full or partial) and respond with only the rows that changed
+
+    Listed rows are put in the order of their sort_order values. Rows
+    already in that order keep their keys and the rest get keys between
+    their neighbours, so moving one row writes one row.
+    """
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'success': False, 'detail': 'Authentication required. Please login.'}), 401
+    try:
+        entries = SortOrderSchema(many=True).load(request.get_json(silent=True) or [])
+    except ValidationError as err:
+        return jsonify({'errors': err.messages}), 400
+    try:
+        changed = reorder_rows(user_id, [entry['id'] for entry in sorted(entries, key=lambda entry: entry['sort_order'])])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(changed)
+
+@app.route('/item/sort', methods=['PUT'])
+def sort_items():
+    """Reorder inventory items"""
+    return reorder(storage.reorder_items)
+
+@app.route('/item/category/sort', methods=['PUT'])
+def sort_categories():
+    """Reorder inventory categories"""
+    return reorder(storage.reorder_categories)
+
+@app.route('/item/import/csv', methods=['POST'])
+@app.route('/import/csv', methods=['POST'])
+def import_csv():
+    """Import inventory items from the inventory CSV template or export"""
+    return import_inventory('csv')
+
+@app.route('/item/import/lighterpack', methods=['POST'])
+@app.route('/import/lighterpack', methods=['POST'])
+def import_lighterpack():
+    """Import inventory items from a LighterPack list CSV export"""
+    return import_inventory('lighterpack')
+
+def export_response(user_id, filename, pack_id=None):
+    """Streamed export of the user's inventory or a pack, gzip-compressed on the fly when the client accepts it
+
+    ?format=csv (the inventory CSV template), lighterpack or ndjson. Rows are
+    read from the store in batches while the response is sent, so memory
+    stays flat however large the inventory is.
+    """
+    format = request.args.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Unknown export format '{format}'", 'formats': list(EXPORT_FORMATS)}), 400
+    mimetype, extension = EXPORT_FORMATS[format]
+    chunks = export_chunks(storage.iter_export(user_id, pack_id, app.config['EXPORT_BATCH_SIZE']), format, app.config['EXPORT_BATCH_SIZE'])
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.{extension}"', 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.accept_encodings:
+        headers['Content-Encoding'] = 'gzip'
+        body = gzip_chunks(chunks)
+    else:
+        body = (chunk.encode('utf-8') for chunk in chunks)
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/item/export', methods=['GET'])
+def export_inventory():
+    """Download the user's whole inventory"""
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'success': False, 'detail': 'Authentication required. Please login.'}), 401
+    return export_response(user_id, 'inventory')
+
+@app.route('/pack/<int:pack_id>/export', methods=['GET'])
+def export_pack(pack_id):
+    """Download one pack's items with their quantities and worn flags"""
+    user_id = current_user_id()
+    if user_id is None:
+        return jsonify({'success': False, 'detail': 'Authentication required. Please login.'}), 401
+    if not storage.pack_exists(user_id, pack_id):
+        return jsonify({'success': False, 'error': 'Pack not found'}), 404
+    return export_response(user_id, f"pack-{pack_id}", pack_id)
+
 @app.route('/item/search', methods=['GET'])
 def search_items():
-    """Mock endpoint to search items by name or brand"""
-    query = request.args.get('query', '')
-    if not query or len(query) < 2:
+    """Search the item catalogue by name or brand, best matches first (?query=...&limit=10)"""
+    try:
+        params = ItemSearchSchema().load(request.args.to_dict())
+    except ValidationError as err:
+        return jsonify({'errors': err.messages}), 400
+    if len(params['query'].strip()) < 2:
         return jsonify([])
-    
-    # Mock item search results
-    mock_items = [
-        {"id": 1, "name": "Tent", "brand": "Big Agnes"},
-        {"id": 2, "name": "Sleeping Bag", "brand": "REI"},
-        {"id": 3, "name": "Backpack", "brand": "Osprey"},
-        {"id": 4, "name": "Hiking Boots", "brand": "Salomon"},
-        {"id": 5, "name": "Water Filter", "brand": "Sawyer"},
-        {"id": 6, "name": "Trekking Poles", "brand": "Black Diamond"},
-        {"id": 7, "name": "Rain Jacket", "brand": "Patagonia"},
-        {"id": 8, "name": "Cookset", "brand": "MSR"},
-        {"id": 9, "name": "Headlamp", "brand": "Petzl"},
-        {"id": 10, "name": "Sleeping Pad", "brand": "Therm-a-Rest"}
-    ]
-    
-    # Filter results based on query (case insensitive)
-    query = query.lower()
-    results = [
-        item for item in mock_items 
-        if query in item["name"].lower() or query in item["brand"].lower()
-    ]
-    
-    return jsonify(results)
+    return jsonify(item_index.search(params['query'], params['limit']))
 
 @app.route('/test-openai', methods=['GET'])
 def test_openai_connection():
     """Test endpoint to verify OpenAI API connection"""
-    api_key = os.getenv('OPENAI_API_KEY')
+    api_key = user_api_key('openai_api_key', current_user_id())
     if not api_key:
         return jsonify({
             'success': False,
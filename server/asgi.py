@@ -0,0 +1,523 @@
+"""ASGI entry point for the async serving mode.
+
+The routes that spend their time waiting on upstream services (/chat,
+/chat/stream, /analyze, /analyze/batch, /user-recommendations and the
+retailer searches) are served by native async handlers using AsyncOpenAI and
+httpx.AsyncClient, so a single process can hold hundreds of concurrent
+upstream waits without pinning a worker per request. Every other route is delegated to the Flask app.
+
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --chdir server
+
+The sync mode (gunicorn app:app) is unchanged.
+"""
+import json
+import time
+import uuid
+import asyncio
+import base64
+import contextlib
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from openai import AsyncOpenAI
+from marshmallow import ValidationError
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import app as sync_app
+from amazon_api import amazon_async_http
+from walmart_api import walmart_async_http
+from cache import search_cache_key
+from image_pipeline import ImageProcessingError
+from singleflight import AsyncSingleFlight, flight_key
+
+logger = sync_app.app.logger
+flights = AsyncSingleFlight()
+_openai_clients = {}
+
+
+def openai_client(api_key):
+    """AsyncOpenAI client for an API key, kept per key so its connection pool is reused"""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        if len(_openai_clients) >= sync_app.CREDENTIAL_CLIENTS_MAX:
+            _openai_clients.clear()
+        client = _openai_clients[api_key] = AsyncOpenAI(api_key=api_key)
+    return client
+
+
+def request_credentials(authorization):
+    """(user ID, OpenAI key) for a request: the signed-in user's saved key, or the server's"""
+    user_id = sync_app.bearer_user_id(authorization)
+    return user_id, sync_app.user_api_key('openai_api_key', user_id)
+
+
+async def create_chat_completion(namespace, api_key, **kwargs):
+    """Async counterpart of app.create_chat_completion, using the given OpenAI key"""
+    return await flights.do(namespace, flight_key(api_key, kwargs), lambda: openai_client(api_key).chat.completions.create(**kwargs))
+
+
+async def for_request_user(request, lookup):
+    """lookup(user ID) for the request's signed-in user (or None), run off the event loop"""
+    return await run_in_threadpool(lambda: lookup(sync_app.bearer_user_id(request.headers.get('Authorization'))))
+
+
+async def cached_search(provider, keywords, category, max_results):
+    """Async counterpart of app.cached_search, sharing the same response cache"""
+    return await sync_app.search_cache.async_cached(
+        f"{provider.name}_search",
+        search_cache_key(provider.name, keywords, category, max_results, provider.credential_scope),
+        lambda: flights.do(
+            f"{provider.name}_search",
+            flight_key(provider.credential_scope, keywords, category, max_results),
+            lambda: provider.async_search_products(keywords, category, max_results)
+        ),
+        timeout=sync_app.app.config.get(f"{provider.name.upper()}_SEARCH_CACHE_TTL"),
+        cache_if=lambda results: results.get('success', False)
+    )
+
+
+def json_response(request, body, status_code=200):
+    """JSONResponse plus the same structured request log line the Flask app writes"""
+    response = JSONResponse(body, status_code=status_code)
+    log_data = {
+        "request_id": request.headers.get('X-Request-ID', f"req-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"),
+        "method": request.method,
+        "path": request.url.path,
+        "status": status_code,
+        "duration_ms": round(time.time() - request.state.start, 3) * 1000,
+        "content_length": int(response.headers.get('content-length', 0)),
+        "timestamp": datetime.now().isoformat(),
+        "user_agent": request.headers.get('User-Agent'),
+        "mode": "async"
+    }
+    if status_code >= 500:
+        logger.error(json.dumps(log_data))
+    elif status_code >= 400:
+        logger.warning(json.dumps(log_data))
+    else:
+        logger.info(json.dumps(log_data))
+    return response
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def chat_with_assistant(request):
+    """Async variant of app.chat_with_assistant"""
+    request.state.start = time.time()
+    try:
+        data = sync_app.ChatSchema().load(await read_json(request))
+    except ValidationError as err:
+        return json_response(request, {'errors': err.messages, 'success': False}, 400)
+
+    try:
+        # Apply content filtering to user message
+        is_inappropriate, filtered_message = sync_app.filter_content(data.get('message', ''))
+        if is_inappropriate:
+            return json_response(request, {
+                'success': False,
+                'error': 'Content filtered',
+                'message': 'Your message contains content that may be inappropriate. Please revise and try again.'
+            }, 403)
+
+        history = data.get('history', [])
+
+        user_id, api_key = await run_in_threadpool(request_credentials, request.headers.get('Authorization'))
+        if not api_key:
+            return json_response(request, {
+                'success': False,
+                'error': 'API key not configured',
+                'message': 'Please add your OpenAI API key in the Settings page to use the chat feature.'
+            }, 400)
+
+        # Server-side sessions replace the client-supplied history; compaction may call the model
+        session_id = data.get('session_id')
+        session = None
+        if session_id:
+            session = await run_in_threadpool(sync_app.load_chat_session, session_id, user_id)
+            if session is None:
+                return json_response(request, sync_app.CHAT_SESSION_NOT_FOUND, 404)
+            history = sync_app.session_history(session)
+
+        cached_answer = await run_in_threadpool(sync_app.cached_chat_answer, filtered_message, history)
+        if cached_answer is not None:
+            return json_response(request, await run_in_threadpool(
+                sync_app.chat_reply, filtered_message, cached_answer, history, session_id, session, cached=True
+            ))
+
+        messages = sync_app.build_chat_messages(history, filtered_message)
+
+        try:
+            response = await create_chat_completion('openai_chat', api_key, messages=messages, **sync_app.CHAT_COMPLETION_OPTIONS)
+            sync_app.log_chat_tokens(messages, session_id, session, response.usage)
+
+            # Apply content filtering to assistant response
+            is_inappropriate, filtered_response = sync_app.filter_content(response.choices[0].message.content)
+            if is_inappropriate:
+                return json_response(request, {
+                    'success': False,
+                    'error': 'Response filtered',
+                    'message': 'The AI generated content that may be inappropriate. Please try a different query.'
+                }, 403)
+
+            await run_in_threadpool(sync_app.remember_chat_answer, filtered_message, history, filtered_response)
+            return json_response(request, await run_in_threadpool(
+                sync_app.chat_reply, filtered_message, filtered_response, history, session_id, session
+            ))
+        except Exception as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            return json_response(request, {
+                'success': False,
+                'error': 'OpenAI API error',
+                'message': f'Error communicating with OpenAI: {str(e)}'
+            }, 500)
+
+    except Exception as e:
+        logger.error(f"Chat endpoint error: {str(e)}")
+        return json_response(request, {
+            'success': False,
+            'error': str(e),
+            'message': 'An error occurred while processing your request'
+        }, 500)
+
+
+async def chat_stream(request):
+    """Async variant of app.chat_stream"""
+    request.state.start = time.time()
+    try:
+        data = sync_app.ChatSchema().load(await read_json(request))
+    except ValidationError as err:
+        return json_response(request, {'errors': err.messages, 'success': False}, 400)
+
+    # Apply content filtering to user message
+    is_inappropriate, filtered_message = sync_app.filter_content(data.get('message', ''))
+    if is_inappropriate:
+        return json_response(request, {
+            'success': False,
+            'error': 'Content filtered',
+            'message': 'Your message contains content that may be inappropriate. Please revise and try again.'
+        }, 403)
+
+    history = data.get('history', [])
+
+    user_id, api_key = await run_in_threadpool(request_credentials, request.headers.get('Authorization'))
+    if not api_key:
+        return json_response(request, {
+            'success': False,
+            'error': 'API key not configured',
+            'message': 'Please add your OpenAI API key in the Settings page to use the chat feature.'
+        }, 400)
+
+    session_id = data.get('session_id')
+    session = None
+    if session_id:
+        session = await run_in_threadpool(sync_app.load_chat_session, session_id, user_id)
+        if session is None:
+            return json_response(request, sync_app.CHAT_SESSION_NOT_FOUND, 404)
+        history = sync_app.session_history(session)
+
+    cached_answer = await run_in_threadpool(sync_app.cached_chat_answer, filtered_message, history)
+    if cached_answer is not None:
+        body = await run_in_threadpool(sync_app.chat_reply, filtered_message, cached_answer, history, session_id, session, cached=True)
+        return StreamingResponse(sync_app.cached_chat_events(body), media_type='text/event-stream', headers=sync_app.SSE_HEADERS)
+
+    messages = sync_app.build_chat_messages(history, filtered_message)
+    sync_app.log_chat_tokens(messages, session_id, session)
+    try:
+        stream = await openai_client(api_key).chat.completions.create(
+            messages=messages,
+            stream=True,
+            **sync_app.CHAT_COMPLETION_OPTIONS
+        )
+    except Exception as e:
+        logger.error(f"OpenAI API error: {str(e)}")
+        return json_response(request, {
+            'success': False,
+            'error': 'OpenAI API error',
+            'message': f'Error communicating with OpenAI: {str(e)}'
+        }, 500)
+
+    request_id = request.headers.get('X-Request-ID', f"req-{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
+    chat = sync_app.ChatStream(filtered_message, history, request_id, request.url.path, request.state.start, session_id, session)
+
+    async def events():
+        try:
+            async for chunk in stream:
+                for event in chat.feed(chunk):
+                    yield event
+                if chat.closed:
+                    break
+        except Exception as e:
+            for event in chat.fail(str(e)):
+                yield event
+            return
+        finally:
+            # Stops generation upstream when the stream is abandoned early
+            await stream.response.aclose()
+        # finish() stores the answer in the semantic cache and the chat session
+        for event in await run_in_threadpool(chat.finish):
+            yield event
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers=sync_app.SSE_HEADERS)
+
+
+async def analyze_image(request):
+    """Async variant of app.analyze_image"""
+    request.state.start = time.time()
+    if int(request.headers.get('content-length', 0)) > sync_app.app.config['MAX_CONTENT_LENGTH']:
+        return json_response(request, {'error': 'File too large'}, 413)
+
+    form = await request.form()
+    file = form.get('image')
+    if file is None or not hasattr(file, 'filename'):
+        return json_response(request, {'error': 'No image provided'}, 400)
+    if file.filename == '':
+        return json_response(request, {'error': 'No selected file'}, 400)
+    if not sync_app.allowed_file(file.filename):
+        return json_response(request, {'error': 'Unsupported file type'}, 400)
+
+    batch_mode = form.get('batch_mode', 'false').lower() == 'true'
+    detect_barcodes = form.get('detect_barcodes', 'false').lower() == 'true'
+
+    _, api_key = await run_in_threadpool(request_credentials, request.headers.get('Authorization'))
+    body, status = await analyze_upload(await file.read(), batch_mode, detect_barcodes, api_key)
+    return json_response(request, body, status)
+
+
+async def analyze_upload(data, batch_mode, detect_barcodes, api_key):
+    """Async variant of app.analyze_upload"""
+    upload_id = uuid.uuid4().hex
+    try:
+        image_bytes, image_info = await sync_app.image_pipeline.async_process(data)
+    except ImageProcessingError as e:
+        logger.warning(f"Upload {upload_id} rejected: {str(e)}")
+        return {'error': 'Invalid image', 'upload_id': upload_id}, 400
+    logger.info(f"Upload {upload_id} prepared: {json.dumps(image_info)}")
+
+    cached, distance = sync_app.analysis_cache.get(image_info['dhash'], (batch_mode, detect_barcodes))
+    if cached is not None:
+        logger.info(f"Upload {upload_id} answered from analysis cache (distance {distance})")
+        return dict(cached, upload_id=upload_id, cached=True), 200
+
+    try:
+        image_b64 = base64.b64encode(image_bytes).decode()
+        response = await create_chat_completion(
+            'openai_analyze',
+            api_key,
+            **sync_app.build_analysis_request(image_b64, batch_mode, detect_barcodes)
+        )
+        result = sync_app.parse_analysis_response(response.choices[0].message.content, batch_mode, detect_barcodes)
+        if result['success']:
+            sync_app.analysis_cache.set(image_info['dhash'], (batch_mode, detect_barcodes), result)
+        return dict(result, upload_id=upload_id, cached=False), 200
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to analyze image',
+            'upload_id': upload_id
+        }, 500
+
+
+async def analyze_batch(request):
+    """Async variant of app.analyze_batch"""
+    request.state.start = time.time()
+    if int(request.headers.get('content-length', 0)) > sync_app.app.config['MAX_CONTENT_LENGTH']:
+        return json_response(request, {'error': 'File too large'}, 413)
+
+    form = await request.form()
+    uploads = []
+    for file in form.getlist('images') + form.getlist('image'):
+        if hasattr(file, 'filename') and file.filename:
+            uploads.append((file.filename, await file.read() if sync_app.allowed_file(file.filename) else None))
+    if not uploads:
+        return json_response(request, {'error': 'No images provided'}, 400)
+    if len(uploads) > sync_app.app.config['ANALYZE_BATCH_MAX_IMAGES']:
+        return json_response(request, {'error': f"Too many images, at most {sync_app.app.config['ANALYZE_BATCH_MAX_IMAGES']} per batch"}, 400)
+
+    batch_mode = form.get('batch_mode', 'false').lower() == 'true'
+    detect_barcodes = form.get('detect_barcodes', 'false').lower() == 'true'
+    semaphore = asyncio.Semaphore(sync_app.app.config['ANALYZE_BATCH_CONCURRENCY'])
+    _, api_key = await run_in_threadpool(request_credentials, request.headers.get('Authorization'))
+
+    async def analyze(index, upload):
+        filename, data = upload
+        if data is None:
+            return index, ({'success': False, 'error': 'Unsupported file type'}, 400)
+        async with semaphore:
+            try:
+                return index, await analyze_upload(data, batch_mode, detect_barcodes, api_key)
+            except Exception as e:
+                return index, ({'success': False, 'error': str(e), 'message': 'Failed to analyze image'}, 500)
+
+    async def results():
+        succeeded = 0
+        for next_result in asyncio.as_completed([analyze(index, upload) for index, upload in enumerate(uploads)]):
+            index, (body, status) = await next_result
+            succeeded += status == 200 and body.get('success', False)
+            yield sync_app.batch_result_line(index, uploads[index][0], body, status)
+        yield json.dumps({
+            'done': True,
+            'count': len(uploads),
+            'succeeded': succeeded,
+            'duration_ms': round(time.time() - request.state.start, 3) * 1000
+        }) + "\n"
+
+    return StreamingResponse(results(), media_type='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+
+async def user_recommendations(request):
+    """Async variant of app.user_recommendations"""
+    request.state.start = time.time()
+    try:
+        data = await read_json(request) or {}
+        # The weather lookup, cache reads and inventory compaction all block, so they run off the event loop
+        recommendation = await run_in_threadpool(sync_app.RecommendationRequest, data)
+        if recommendation.cached_body is not None:
+            return json_response(request, recommendation.cached_body)
+
+        _, api_key = await run_in_threadpool(request_credentials, request.headers.get('Authorization'))
+        response = await create_chat_completion('openai_recommendations', api_key, **recommendation.completion_args)
+
+        body, status = await run_in_threadpool(recommendation.complete, response.choices[0].message.content)
+        return json_response(request, body, status)
+
+    except Exception as e:
+        return json_response(request, {
+            'success': False,
+            'error': str(e),
+            'message': 'An error occurred while generating recommendations'
+        }, 500)
+
+
+async def amazon_search(request):
+    """Async variant of app.amazon_search"""
+    request.state.start = time.time()
+    try:
+        params = sync_app.AmazonSearchSchema().load(dict(request.query_params))
+    except ValidationError as err:
+        return json_response(request, {'errors': err.messages}, 400)
+    try:
+        amazon = (await for_request_user(request, sync_app.retailer_apis))['amazon']
+        results = await cached_search(amazon, params['keywords'], params['category'], params['max_results'])
+        return json_response(request, results)
+    except Exception as e:
+        return json_response(request, {
+            'success': False,
+            'error': str(e),
+            'message': 'Error searching Amazon products'
+        }, 500)
+
+
+async def walmart_search(request):
+    """Async variant of app.walmart_search"""
+    request.state.start = time.time()
+    keywords = request.query_params.get('keywords', '')
+    category = request.query_params.get('category', '')
+    max_results = int(request.query_params.get('max_results', 10))
+
+    if not keywords:
+        return json_response(request, {'error': 'No search keywords provided'}, 400)
+
+    try:
+        walmart = (await for_request_user(request, sync_app.retailer_apis))['walmart']
+        results = await cached_search(walmart, keywords, category, max_results)
+        return json_response(request, results)
+    except Exception as e:
+        return json_response(request, {
+            'success': False,
+            'error': str(e),
+            'message': 'Error searching Walmart products'
+        }, 500)
+
+
+async def compare_prices(request):
+    """Async variant of app.compare_prices"""
+    request.state.start = time.time()
+    keywords = request.query_params.get('keywords', '')
+
+    if not keywords:
+        return json_response(request, {'error': 'No search keywords provided'}, 400)
+
+    try:
+        results, provider_status = await sync_app.retailer_fan_out.async_search(
+            await for_request_user(request, sync_app.user_retailers),
+            lambda provider: cached_search(provider, keywords, provider.default_category, 5),
+            sync_app.app.config['RETAILER_SEARCH_DEADLINE']
+        )
+        return json_response(request, sync_app.build_price_comparison(results, provider_status))
+    except Exception as e:
+        return json_response(request, {
+            'success': False,
+            'error': str(e),
+            'message': 'Error comparing prices'
+        }, 500)
+
+
+async def metrics(request):
+    request.state.start = time.time()
+    return json_response(request, dict(sync_app.collect_metrics(), single_flight_async=flights.stats()))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_):
+    yield
+    await amazon_async_http.aclose()
+    await walmart_async_http.aclose()
+    sync_app.image_pipeline.shutdown()
+
+
+async_routes = [
+    Route('/chat', chat_with_assistant, methods=['POST']),
+    Route('/chat/stream', chat_stream, methods=['POST']),
+    Route('/analyze', analyze_image, methods=['POST']),
+    Route('/analyze/batch', analyze_batch, methods=['POST']),
+    Route('/user-recommendations', user_recommendations, methods=['POST']),
+    Route('/amazon/search', amazon_search, methods=['GET']),
+    Route('/walmart/search', walmart_search, methods=['GET']),
+    Route('/compare-prices', compare_prices, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+]
+
+async_app = Starlette(
+    routes=async_routes,
+    middleware=[Middleware(
+        CORSMiddleware,
+        allow_origins=sync_app.allowed_origins,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+        allow_credentials=True
+    )],
+    lifespan=lifespan
+)
+
+
+class AsyncRouteDispatcher:
+    """Sends requests for the async routes to the Starlette app and everything else to Flask
+
+    Flask keeps applying its own CORS handling, so the two apps never add
+    duplicate CORS headers to the same response.
+    """
+
+    def __init__(self, async_app, fallback_app, paths):
+        self.async_app = async_app
+        self.fallback_app = fallback_app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan' or (scope['type'] == 'http' and scope['path'] in self.paths):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.fallback_app(scope, receive, send)
+
+
+app = AsyncRouteDispatcher(async_app, WsgiToAsgi(sync_app.app), [route.path for route in async_routes])
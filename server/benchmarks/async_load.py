@@ -0,0 +1,144 @@
+"""Concurrent load test comparing the sync (app:app) and async (asgi:app) serving modes.
+
+Starts a fake OpenAI-compatible upstream that answers chat completions after a
+fixed delay, then fires concurrent /chat requests at a running server while
+probing /health_check, and reports throughput and latency. Run from the server
+directory:
+
+    python -m benchmarks.async_load upstream --delay 1.0
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8900/v1 gunicorn app:app -w 2 --threads 4 -b :8000
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8900/v1 gunicorn asgi:app -w 2 -k uvicorn.workers.UvicornWorker -b :8001
+    python -m benchmarks.async_load load --target http://127.0.0.1:8000 --concurrency 200
+    python -m benchmarks.async_load load --target http://127.0.0.1:8001 --concurrency 200
+
+Each /chat message is unique so single-flight coalescing does not flatter
+either mode.
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+
+async def handle_upstream(reader, writer, delay):
+    """Minimal HTTP/1.1 keep-alive handler for POST /v1/chat/completions"""
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.decode('latin-1').split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value.strip())
+            if length:
+                await reader.readexactly(length)
+
+            await asyncio.sleep(delay)
+            body = json.dumps({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "gpt-3.5-turbo",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "Pack a lightweight tent and a water filter."},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+            }).encode('utf-8')
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_upstream(host, port, delay):
+    server = await asyncio.start_server(lambda r, w: handle_upstream(r, w, delay), host, port, backlog=4096)
+    print(f"Fake OpenAI upstream on http://{host}:{port}/v1 (delay {delay}s)")
+    async with server:
+        await server.serve_forever()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+async def run_load(target, concurrency, total, timeout):
+    limits = httpx.Limits(max_connections=concurrency + 10, max_keepalive_connections=concurrency + 10)
+    latencies = []
+    health_latencies = []
+    errors = 0
+    counter = iter(range(total))
+    finished = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await client.post('/chat', json={'message': f"What should I pack for a hike? #{i}"})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        async def health_probe():
+            while not finished.is_set():
+                started = time.perf_counter()
+                try:
+                    await client.get('/health_check')
+                    health_latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        probe = asyncio.ensure_future(health_probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        finished.set()
+        await probe
+
+    print(f"Target {target}: {total} /chat requests, concurrency {concurrency}")
+    print(f"  throughput       {len(latencies) / elapsed:8.1f} req/s ({errors} errors, {elapsed:.1f}s)")
+    if latencies:
+        print(f"  /chat latency    p50 {statistics.median(latencies) * 1000:7.0f} ms   p99 {percentile(latencies, 99) * 1000:7.0f} ms")
+    if health_latencies:
+        print(f"  /health_check    p50 {statistics.median(health_latencies) * 1000:7.0f} ms   p99 {percentile(health_latencies, 99) * 1000:7.0f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    upstream = subcommands.add_parser('upstream', help='run the fake OpenAI upstream')
+    upstream.add_argument('--host', default='127.0.0.1')
+    upstream.add_argument('--port', type=int, default=8900)
+    upstream.add_argument('--delay', type=float, default=1.0, help='seconds before each completion is returned')
+
+    load = subcommands.add_parser('load', help='generate /chat load against a running server')
+    load.add_argument('--target', default='http://127.0.0.1:8000')
+    load.add_argument('--concurrency', type=int, default=200)
+    load.add_argument('--requests', type=int, default=1000)
+    load.add_argument('--timeout', type=float, default=60.0)
+
+    args = parser.parse_args()
+    if args.command == 'upstream':
+        asyncio.run(run_upstream(args.host, args.port, args.delay))
+    else:
+        asyncio.run(run_load(args.target, args.concurrency, args.requests, args.timeout))
@@ -0,0 +1,90 @@
+"""Benchmark and corpus check for the content filter.
+
+Compares the previous filter_content (one re.search per pattern on every
+call) with ContentFilter's single precompiled regex on large inputs, measures
+StreamScanner over chunked text, and reports accuracy on
+content_filter_corpus.json, including both filters' false positives. Run from
+the server directory:
+
+    python -m benchmarks.content_filter
+"""
+import os
+import re
+import json
+import random
+import timeit
+
+from content_filter import ContentFilter
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content_filter_corpus.json')
+
+WORDS = (
+    "tent stove quilt trail ridge water filter ounce pack liner trekking pole summit switchback camp "
+    "hackberry cracker stealth password-protected creek bear canister headlamp rain shell fleece"
+).split()
+
+
+def filter_content_before(content):
+    """The original filter_content"""
+    inappropriate_patterns = [
+        r'\b(hack|crack|steal|illegal|pornographic|obscene)\b',
+        r'\b(password|credit\s*card|ssn|social\s*security)\b'
+    ]
+    for pattern in inappropriate_patterns:
+        if re.search(pattern, content, re.IGNORECASE):
+            return True
+    return False
+
+
+def clean_text(size, seed=7):
+    random.seed(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = random.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def corpus_report(content_filter):
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    for label, check in (("before", filter_content_before), ("ContentFilter", content_filter.check)):
+        wrong = [case['text'] for case in corpus if check(case['text']) != case['flagged']]
+        print(f"  {label:<14} {len(corpus) - len(wrong)}/{len(corpus)} correct")
+        for text in wrong:
+            print(f"    misjudged: {text}")
+
+
+def stream(content_filter, text, chunk_size):
+    scanner = content_filter.scanner()
+    for start in range(0, len(text), chunk_size):
+        scanner.feed(text[start:start + chunk_size])
+    scanner.finish()
+    return scanner
+
+
+if __name__ == '__main__':
+    content_filter = ContentFilter(reload_interval=3600)
+
+    print("Corpus")
+    corpus_report(content_filter)
+
+    # A word split across chunk boundaries must not change the verdict
+    for text in ("grove of hackberry trees", "my pass" "word is", "credit   card"):
+        for chunk_size in (1, 2, 3, 5):
+            assert stream(content_filter, text, chunk_size).flagged == content_filter.check(text), (text, chunk_size)
+
+    for size in (10_000, 1_000_000):
+        text = clean_text(size)
+        # Worst case for the old filter: nothing matches, so every pattern scans the whole text
+        number = max(1, 2_000_000 // size)
+        before = min(timeit.repeat(lambda: filter_content_before(text), number=number, repeat=3)) / number
+        after = min(timeit.repeat(lambda: content_filter.check(text), number=number, repeat=3)) / number
+        print(f"{size:>9,} chars  before {before * 1000:8.2f} ms   ContentFilter {after * 1000:8.2f} ms   x{before / after:.2f}")
+
+    text = clean_text(1_000_000)
+    for chunk_size in (4, 64):
+        elapsed = min(timeit.repeat(lambda: stream(content_filter, text, chunk_size), number=1, repeat=3))
+        print(f"StreamScanner, 1,000,000 chars in {chunk_size}-char chunks: {elapsed * 1000:8.1f} ms ({len(text) / elapsed / 1e6:.1f} M chars/s)")
@@ -0,0 +1,116 @@
+"""Latency benchmark for the /item/search index.
+
+Builds a synthetic catalogue of brands and products with skewed popularity,
+then replays autocomplete traffic: every prefix of words as they are typed,
+multi-word queries, typos and misses. Reports build time, memory and
+per-query latency percentiles. Run from the server directory:
+
+    python -m benchmarks.item_search [entries]
+"""
+import sys
+import time
+import random
+import resource
+
+from item_search import ItemSearchIndex
+
+SYLLABLES = "ka lo mi ra tu sen vor pex zan qui bel dor fin gar hal jun kel lum nor pri sta tre ul vis wen".split()
+GEAR = (
+    "tent tarp bivy quilt bag pad pillow pack backpack stove pot mug spork filter bottle bladder headlamp "
+    "lantern jacket fleece hoodie vest pants shorts shirt socks gloves beanie boots shoes sandals gaiters "
+    "poles stakes guylines compass gps watch battery charger knife saw trowel towel sunglasses rainfly"
+).split()
+SERIES = "ultralight pro elite trail summit alpine classic carbon titanium merino hybrid storm flash".split()
+
+
+def synthetic_word(random, syllables):
+    return ''.join(random.choice(SYLLABLES) for _ in range(syllables))
+
+
+def catalogue(size, seed=3):
+    random.seed(seed)
+    brands = sorted({synthetic_word(random, random.randint(2, 3)).title() for _ in range(4000)})
+    lines = [synthetic_word(random, random.randint(2, 4)).title() for _ in range(20000)]
+    entries = []
+    for index in range(size):
+        brand = random.choice(brands)
+        name = f"{random.choice(lines)} {random.choice(SERIES).title()} {random.choice(GEAR).title()} {random.choice('ABCDEFGHX')}{random.randint(1, 900)}"
+        entries.append({'id': index, 'name': name, 'brand': brand, 'popularity': int(random.paretovariate(1.2) * 10)})
+    return entries
+
+
+def typo(random, word):
+    if len(word) < 4:
+        return word
+    i = random.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def queries(entries, count, seed=5):
+    random.seed(seed)
+    found = []
+    while len(found) < count:
+        entry = random.choice(entries)
+        words = f"{entry['brand']} {entry['name']}".lower().split()
+        kind = random.random()
+        if kind < 0.6:
+            # Keystrokes of one word
+            word = random.choice(words)
+            found.extend(word[:length] for length in range(2, len(word) + 1))
+        elif kind < 0.8:
+            start = random.randrange(len(words) - 1)
+            phrase = ' '.join(words[start:start + 2])
+            found.extend(phrase[:length] for length in range(len(words[start]) + 2, len(phrase) + 1))
+        elif kind < 0.95:
+            found.append(typo(random, max(words, key=len)))
+        else:
+            found.append(synthetic_word(random, 4) + 'zq')
+    return found[:count]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    entries = catalogue(size)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index = ItemSearchIndex(entries)
+    build = time.perf_counter() - started
+    # ru_maxrss is in KB on Linux; the growth approximates the index's memory
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1000
+    print(f"{size:,} entries  build {build:.1f} s  +{memory:.0f} MB peak RSS  {index.stats()}")
+
+    workload = queries(entries, 20_000)
+    for query in workload[:500]:
+        index.search(query)
+    latencies = []
+    empty = 0
+    for query in workload:
+        started = time.perf_counter()
+        results = index.search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        empty += not results
+    latencies.sort()
+    print(
+        f"{len(workload):,} queries  p50 {percentile(latencies, 0.5):.3f} ms  p95 {percentile(latencies, 0.95):.3f} ms"
+        f"  p99 {percentile(latencies, 0.99):.3f} ms  max {latencies[-1]:.1f} ms  empty {empty}"
+    )
+
+    for query in ("te", "tent", entries[0]['brand'].lower()[:5], typo(random, entries[1]['name'].split()[0].lower())):
+        print(f"  {query!r}: {[result['name'] for result in index.search(query, 3)]}")
+
+    started = time.perf_counter()
+    for entry in catalogue(1000, seed=9):
+        index.insert(dict(entry, id=f"new-{entry['id']}"))
+    inserts = (time.perf_counter() - started) * 1000
+    latencies = []
+    for query in workload[:5000]:
+        started = time.perf_counter()
+        index.search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"1,000 inserts {inserts:.1f} ms; search with them pending: p50 {percentile(latencies, 0.5):.3f} ms  p99 {percentile(latencies, 0.99):.3f} ms")
@@ -0,0 +1,83 @@
+"""Vectorized pack weight breakdown against the per-item loop the frontend runs.
+
+Builds packs of pack items wrapping the synthetic inventory from the prompt
+compaction benchmark and checks that every path gives the same weights. It
+reports the time from pack items (pack_columns() then weight_breakdown()),
+from a columnar payload, for the NumPy aggregation alone and for the naive
+loop. Run from the server directory:
+
+    python -m benchmarks.pack_weights
+"""
+import random
+import time
+
+import numpy as np
+
+from benchmarks.prompt_compaction import inventory
+from pack_weights import UNIT_GRAMS, category_label, column_arrays, pack_columns, weight_breakdown
+
+
+def pack(size, seed=13):
+    random.seed(seed)
+    return [
+        {'item': item, 'quantity': random.choice([1, 1, 1, 2, 4]), 'worn': random.random() < 0.1}
+        for item in inventory(size)
+    ]
+
+
+def naive_breakdown(entries, unit='kg'):
+    """convertWeight and the WeightBreakdown reduce, one item at a time"""
+    totals = {'worn': 0, 'consumable': 0, 'total': 0}
+    categories = {}
+    for entry in entries:
+        item = entry['item']
+        weight = (item.get('weight') or 0) * UNIT_GRAMS[item['unit']] / UNIT_GRAMS[unit]
+        quantity_weight = weight * entry['quantity']
+        if entry['worn']:
+            totals['worn'] += weight
+        if item['consumable']:
+            totals['consumable'] += quantity_weight
+        totals['total'] += quantity_weight
+        category = category_label(item['category'])
+        categories[category] = categories.get(category, 0) + quantity_weight
+    totals['base'] = totals['total'] - totals['worn'] - totals['consumable']
+    return totals, categories
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+
+def aggregate(arrays):
+    grams, quantity, worn, consumable, categories, names = arrays
+    line_grams = grams * quantity
+    return line_grams.sum(), grams[worn].sum(), line_grams[consumable].sum(), np.bincount(categories, weights=line_grams, minlength=len(names))
+
+
+if __name__ == '__main__':
+    for size in (50, 500, 5000, 50000):
+        entries = pack(size)
+        columns = {column: list(values) for column, values in pack_columns(entries).items()}
+        columns['category'] = [category_label(category) for category in columns['category']]
+        totals, categories = naive_breakdown(entries)
+        for result in (weight_breakdown(pack_columns(entries)), weight_breakdown(columns)):
+            for key in ('base', 'worn', 'consumable', 'total'):
+                assert abs(result[key] - totals[key]) < 0.01, (key, result[key], totals[key])
+            for category in result['categories']:
+                assert abs(category['weight'] - categories[category['category']]) < 0.01
+
+        repeat = max(5, 20000 // size)
+        rows = best_of(lambda: weight_breakdown(pack_columns(entries)), repeat)
+        columnar = best_of(lambda: weight_breakdown(columns), repeat)
+        arrays = column_arrays(columns)
+        aggregation = best_of(lambda: aggregate(arrays), repeat)
+        naive = best_of(lambda: naive_breakdown(entries), repeat)
+        print(
+            f"{size:>6} items  from items {rows:8.3f} ms  from columns {columnar:7.3f} ms  (aggregation {aggregation:.3f} ms)"
+            f"  per-item loop {naive:8.3f} ms  x{naive / columnar:.1f}"
+        )
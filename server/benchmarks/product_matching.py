@@ -0,0 +1,120 @@
+"""Scored benchmark for the /compare-prices product matcher.
+
+Run from the server directory:
+
+    python -m benchmarks.product_matching
+"""
+import random
+import time
+
+from matching import ProductMatcher
+
+# (Amazon title, Amazon brand, matching Walmart title or None)
+TITLE_PAIRS = [
+    ("Big Agnes Copper Spur HV UL2 Backpacking Tent", "Big Agnes", "Big Agnes Copper Spur HV UL2 2-Person Tent, Olive"),
+    ("Sawyer Products SP129 Squeeze Water Filtration System", "Sawyer", "Sawyer SP129 Squeeze Water Filter System"),
+    ("MSR PocketRocket 2 Ultralight Camping Stove", "MSR", "MSR PocketRocket 2 Backpacking Stove"),
+    ("Therm-a-Rest NeoAir XLite NXT Sleeping Pad, Regular", "Therm-a-Rest", "Thermarest NeoAir XLite NXT Regular Sleeping Pad"),
+    ("Black Diamond Spot 400 Headlamp", "Black Diamond", "Black Diamond Spot 400 Lumen Headlamp, Black"),
+    ("Petzl ACTIK CORE Rechargeable Headlamp 600 Lumens", "Petzl", "Petzl Actik Core 600 Lumen Rechargeable Headlamp"),
+    ("Osprey Exos 58 Men's Backpacking Backpack", "Osprey", "Osprey Exos 58L Backpack"),
+    ("Jetboil Flash Cooking System", "Jetboil", "Jetboil Flash Camping Stove Cooking System"),
+    ("Katadyn BeFree 1.0L Water Filter", "Katadyn", "Katadyn BeFree Water Filtration System 1.0L"),
+    ("Nemo Hornet Elite Osmo 2P Tent", "Nemo", "NEMO Hornet Elite OSMO 2 Person Ultralight Tent"),
+    ("Sea to Summit Aeros Ultralight Pillow", "Sea to Summit", "Sea To Summit Aeros Ultralight Inflatable Pillow"),
+    ("Garmin inReach Mini 2 Satellite Communicator", "Garmin", "Garmin inReach Mini 2, Orange"),
+    ("Leki Micro Vario Carbon Trekking Poles", "Leki", "LEKI Micro Vario Carbon Pole Pair"),
+    ("Smartwool Merino 150 Base Layer Crew", "Smartwool", "Smartwool Men's Merino 150 Baselayer Short Sleeve"),
+    ("BearVault BV500 Bear Resistant Food Canister", "BearVault", "BearVault BV500 Journey Food Container"),
+    ("Nemo Dagger 2P Backpacking Tent", "Nemo", None),
+    ("Sawyer Mini Water Filter", "Sawyer", None),
+    ("Gregory Baltoro 65 Backpack", "Gregory", None),
+    ("Toaks Titanium 750ml Pot", "Toaks", None),
+    ("Zpacks Duplex Tent", "Zpacks", None),
+]
+
+# Walmart listings that share words with the Amazon titles but are different products
+DISTRACTORS = [
+    "Ozark Trail 2-Person Backpacking Tent",
+    "Coleman Classic Propane Camping Stove",
+    "Ozark Trail Water Filter Bottle",
+    "Ozark Trail Sleeping Pad, Blue",
+    "Energizer Vision HD Headlamp",
+    "Ozark Trail 50L Hiking Backpack",
+    "Stanley Adventure Camp Cook Set",
+    "Coleman Inflatable Camp Pillow",
+    "Ozark Trail Aluminum Trekking Poles",
+    "Hanes Men's Thermal Base Layer Crew",
+    "Rubbermaid Food Storage Container Set",
+]
+
+
+def old_loop_pairs(amazon_products, walmart_products):
+    """The previous word-overlap matcher, kept here for comparison"""
+    pairs = []
+    for amazon_product in amazon_products:
+        for walmart_product in walmart_products:
+            if any(word in walmart_product['title'].lower() for word in amazon_product['title'].lower().split()):
+                pairs.append((amazon_product['title'], walmart_product['title']))
+    return pairs
+
+
+def score(predicted, expected):
+    true_positives = len(predicted & expected)
+    precision = true_positives / len(predicted) if predicted else 0.0
+    recall = true_positives / len(expected) if expected else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def run_accuracy():
+    amazon_products = [{'title': title, 'brand': brand} for title, brand, _ in TITLE_PAIRS]
+    walmart_products = [{'title': title} for _, _, title in TITLE_PAIRS if title] + [{'title': title} for title in DISTRACTORS]
+    expected = {(title, match) for title, _, match in TITLE_PAIRS if match}
+
+    matcher = ProductMatcher(walmart_products)
+    predicted = {(a['title'], w['title']) for a, w, _ in matcher.match(amazon_products)}
+    old_predicted = set(old_loop_pairs(amazon_products, walmart_products))
+
+    print("Accuracy on %d Amazon titles vs %d Walmart titles" % (len(amazon_products), len(walmart_products)))
+    print("  word overlap  precision=%.2f recall=%.2f f1=%.2f (%d pairs)" % (*score(old_predicted, expected), len(old_predicted)))
+    print("  tf-idf index  precision=%.2f recall=%.2f f1=%.2f (%d pairs)" % (*score(predicted, expected), len(predicted)))
+    for pair in sorted(predicted - expected):
+        print("  false match:", pair)
+    for pair in sorted(expected - predicted):
+        print("  missed match:", pair)
+
+
+def synthetic_titles(count, rng):
+    brands = ['Nemo', 'MSR', 'Osprey', 'Sawyer', 'Petzl', 'Garmin', 'Leki', 'Jetboil', 'Katadyn', 'Gregory']
+    nouns = ['Tent', 'Stove', 'Backpack', 'Filter', 'Headlamp', 'Pad', 'Pillow', 'Poles', 'Quilt', 'Jacket']
+    adjectives = ['Ultralight', 'Compact', 'Rechargeable', 'Insulated', 'Waterproof', 'Packable', 'Trail', 'Alpine']
+    return [
+        {'title': "%s %s %s %s%d for the Outdoors" % (rng.choice(brands), rng.choice(adjectives), rng.choice(nouns),
+                                                       rng.choice('XZRT'), rng.randint(1, 999))}
+        for _ in range(count)
+    ]
+
+
+def run_speed(sizes=(50, 200, 500)):
+    rng = random.Random(42)
+    print("Speed")
+    for size in sizes:
+        amazon_products = synthetic_titles(size, rng)
+        walmart_products = synthetic_titles(size, rng)
+
+        started = time.perf_counter()
+        old_pairs = old_loop_pairs(amazon_products, walmart_products)
+        old_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matches = list(ProductMatcher(walmart_products).match(amazon_products))
+        new_elapsed = time.perf_counter() - started
+
+        print("  %4d x %-4d word overlap %8.1f ms, %7d pairs | tf-idf index %7.1f ms, %4d pairs" % (
+            size, size, old_elapsed * 1000, len(old_pairs), new_elapsed * 1000, len(matches)))
+
+
+if __name__ == '__main__':
+    run_accuracy()
+    run_speed()
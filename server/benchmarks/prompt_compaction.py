@@ -0,0 +1,74 @@
+"""Token and time cost of compacting a large inventory for /user-recommendations prompts.
+
+Builds synthetic inventories shaped like the frontend's Item records (notes,
+product URLs, nutrition info, timestamps) and reports prompt tokens for the
+raw json.dumps(inventory) against compact_inventory() at a few budgets. Token
+counts are exact when tiktoken is installed, estimated otherwise. Run from
+the server directory:
+
+    python -m benchmarks.prompt_compaction
+"""
+import random
+import time
+
+from prompt_compaction import compact_inventory
+from tokens import tiktoken
+
+CATEGORIES = [
+    "Shelter", "Sleep System", "Backpack", "Cooking", "Water", "Clothing", "Worn Clothing", "Electronics",
+    "Navigation", "First Aid", "Toiletries", "Food", "Repair Kit", "Lighting", "Camp Shoes", "Rain Gear"
+]
+BRANDS = ["Big Agnes", "Nemo", "Zpacks", "MSR", "Sawyer", "Patagonia", "Arc'teryx", "Black Diamond", "Garmin", "Osprey"]
+NAMES = ["Ultralight", "Pro", "Elite", "Trail", "Summit", "Alpine", "Classic", "Carbon", "Titanium", "Merino"]
+
+
+def inventory(size, seed=11):
+    random.seed(seed)
+    items = []
+    for index in range(size):
+        category = random.choice(CATEGORIES)
+        is_food = category == "Food"
+        item = {
+            'id': index + 1,
+            'user_id': 42,
+            'name': f"{random.choice(BRANDS)} {random.choice(NAMES)} {category.split()[0]} {index}",
+            'brand': {'id': 1, 'name': random.choice(BRANDS)},
+            'category': {'id': 7, 'user_id': 42, 'category_id': 7, 'sort_order': 3, 'category': {'id': 7, 'name': category}},
+            'weight': round(random.uniform(0.5, 40), 1),
+            'unit': random.choice(['g', 'oz']),
+            'price': round(random.uniform(5, 600), 2),
+            'consumable': is_food,
+            'notes': "Bought at the REI garage sale; seam sealed the flysheet, works well down to about 30F in wind.",
+            'product_url': f"https://www.example.com/products/{category.lower().replace(' ', '-')}/{index}?ref=packstack",
+            'removed': False,
+            'sort_order': index,
+            'created_at': "2024-03-02T18:22:11.000Z",
+            'updated_at': "2024-06-14T09:01:45.000Z"
+        }
+        if is_food:
+            item.update(
+                is_food=True,
+                food_type='dinner',
+                calories_per_serving=550,
+                nutrition_info={'calories': 550, 'protein': 22, 'carbs': 70, 'fat': 18, 'servingSize': 140, 'servingUnit': 'g'},
+                dietary_tags=['vegetarian']
+            )
+        items.append(item)
+    return items
+
+
+if __name__ == '__main__':
+    print(f"Token counts: {'tiktoken' if tiktoken is not None else 'estimated (~4 chars/token)'}")
+    for size in (25, 200, 800):
+        items = inventory(size)
+        for budget in (750, 1500, 3000):
+            started = time.perf_counter()
+            text, stats = compact_inventory(items, budget, 'gpt-4-turbo')
+            elapsed = (time.perf_counter() - started) * 1000
+            listed = 'all' if stats['items_per_category'] is None else stats['items_per_category']
+            print(
+                f"{size:>4} items  budget {budget:>5}  tokens {stats['tokens_before']:>7,} -> {stats['tokens_after']:>5,}"
+                f"  items/category {listed:>3}  omitted categories {stats['omitted_categories']}  {elapsed:7.1f} ms"
+            )
+            assert stats['tokens_after'] <= budget
+            assert compact_inventory(items, budget, 'gpt-4-turbo')[0] == text
@@ -0,0 +1,75 @@
+"""Microbenchmark for per-request signing cost.
+
+Compares deriving the SigV4 signing key on every request (the previous
+AmazonProductAPI._create_signature behaviour) with SigV4Signer's cached
+derived keys, and the previous Walmart HMAC against HmacSigner's one-shot digest.
+Run from the server directory:
+
+    python -m benchmarks.request_signing
+"""
+import hmac
+import json
+import base64
+import hashlib
+import timeit
+
+from signing import SigV4Signer, HmacSigner
+
+ACCESS_KEY = 'AKIAEXAMPLEEXAMPLE'
+SECRET_KEY = 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY'
+REGION = 'us-east-1'
+SERVICE = 'ProductAdvertisingAPI'
+HOST = 'webservices.amazon.com'
+TIMESTAMP = '20261017T120000Z'
+BODY = json.dumps({"Keywords": "water filter", "SearchIndex": "Outdoors", "ItemCount": 10}).encode('utf-8')
+SIGNED_HEADERS = {
+    'x-amz-date': TIMESTAMP,
+    'x-amz-target': 'com.amazon.paapi5.v1.ProductAdvertisingAPIv1.SearchItems'
+}
+
+
+def sign_uncached():
+    """Full SigV4 signature with the key derivation chain re-run every time"""
+    headers = {'content-encoding': 'amz-1.0', 'host': HOST, **SIGNED_HEADERS}
+    names = sorted(headers)
+    canonical_headers = ''.join(f"{name}:{headers[name]}\n" for name in names)
+    signed_headers = ';'.join(names)
+    canonical_request = f"POST\n/paapi5/searchitems\n\n{canonical_headers}\n{signed_headers}\n{hashlib.sha256(BODY).hexdigest()}"
+    credential_scope = f"{TIMESTAMP[:8]}/{REGION}/{SERVICE}/aws4_request"
+    string_to_sign = f"AWS4-HMAC-SHA256\n{TIMESTAMP}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+    k_date = hmac.new(f'AWS4{SECRET_KEY}'.encode('utf-8'), TIMESTAMP[:8].encode('utf-8'), hashlib.sha256).digest()
+    k_region = hmac.new(k_date, REGION.encode('utf-8'), hashlib.sha256).digest()
+    k_service = hmac.new(k_region, SERVICE.encode('utf-8'), hashlib.sha256).digest()
+    k_signing = hmac.new(k_service, b'aws4_request', hashlib.sha256).digest()
+    signature = hmac.new(k_signing, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"AWS4-HMAC-SHA256 Credential={ACCESS_KEY}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
+
+
+def walmart_uncached(timestamp='1792238400000'):
+    digest = hmac.new(SECRET_KEY.encode('utf-8'), f"{ACCESS_KEY}\n{timestamp}\n".encode('utf-8'), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+def report(label, fn, number=50000):
+    per_call = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<34} {per_call * 1e6:7.2f} us/request")
+    return per_call
+
+
+if __name__ == '__main__':
+    signer = SigV4Signer(ACCESS_KEY, SECRET_KEY, REGION, SERVICE, static_headers={'content-encoding': 'amz-1.0', 'host': HOST})
+    signed = lambda: signer.sign('POST', '/paapi5/searchitems', TIMESTAMP, BODY, SIGNED_HEADERS)
+    assert signed() == sign_uncached(), "cached signer must produce identical signatures"
+
+    walmart_signer = HmacSigner(ACCESS_KEY, SECRET_KEY)
+    assert walmart_signer.sign('1792238400000')[1] == walmart_uncached()
+
+    print("Amazon SigV4")
+    before = report("derive signing key per request", sign_uncached)
+    after = report("SigV4Signer (cached derived key)", signed)
+    print(f"  speedup x{before / after:.2f}")
+
+    print("Walmart HMAC")
+    before = report("new HMAC key per request", walmart_uncached)
+    after = report("HmacSigner (one-shot digest)", lambda: walmart_signer.sign('1792238400000'))
+    print(f"  speedup x{before / after:.2f}")
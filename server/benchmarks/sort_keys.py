@@ -0,0 +1,53 @@
+"""Rows written and time taken to reorder a 2,000-item category.
+
+Each drag and drop sends the category's full new order. Storage.reorder_items
+keeps the keys of rows already in order and gives the rest fractional keys,
+compared here with rewriting every row's position the way the payload
+reads (sort_order = index). Run from the server directory:
+
+    python -m benchmarks.sort_keys
+"""
+import os
+import random
+import tempfile
+import time
+
+from storage import Storage
+
+ITEMS = 2000
+MOVES = 500
+
+
+def rewrite_all(storage, ids):
+    """Every row set to its index in the new order, in one transaction"""
+    with storage.transaction() as db:
+        db.executemany('UPDATE items SET sort_order = ?, updated_at = ? WHERE id = ?', [(i, time.time(), id) for i, id in enumerate(ids)])
+
+
+def run(label, storage, user_id, apply, moves):
+    rng = random.Random(3)
+    order = [item['id'] for item in storage.list_items(user_id)]
+    writes, elapsed = 0, 0
+    for _ in range(moves):
+        order.insert(rng.randrange(ITEMS), order.pop(rng.randrange(ITEMS)))
+        before = storage.db.total_changes
+        started = time.perf_counter()
+        apply(storage, order)
+        elapsed += time.perf_counter() - started
+        writes += storage.db.total_changes - before
+    assert [item['id'] for item in storage.list_items(user_id)] == order
+    print(f"{label:<28} {moves} moves  {writes / moves:8.2f} rows written per move  {elapsed / moves * 1000:6.2f} ms per move")
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    for label, apply in (('rewrite every position', rewrite_all), ('minimal fractional keys', lambda s, ids: s.reorder_items(user_id, ids))):
+        storage = Storage(os.path.join(directory, f"{label.split()[0]}.db"), password_iterations=1000)
+        user_id = storage.create_user('hiker', 'hiker@example.com', 'password')['id']
+        category_id = storage.category_ids(user_id, ['Kitchen'])['kitchen']
+        storage.create_items(user_id, [{'name': f"Item {n}", 'category_id': category_id} for n in range(ITEMS)])
+        run(label, storage, user_id, apply, MOVES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Read and write throughput of the SQLite storage layer.
+
+Loads 1,000 users with 100 items each (100,000 items) through the bulk
+paths, compares that with inserting the same items one autocommitted row
+at a time, then measures the reads behind each request (token lookup,
+user settings, one item, a whole inventory) from one thread and from
+several threads at once. Run from the server directory:
+
+    python -m benchmarks.storage
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+from storage import INSERT_ITEM, ITEM_FIELDS, Storage
+
+USERS = 1000
+ITEMS_PER_USER = 100
+CATEGORIES = ('Shelter', 'Sleep System', 'Kitchen', 'Water', 'Clothing', 'Electronics', 'First Aid', 'Navigation')
+THREADS = (1, 2, 4, 8)
+
+
+def items(rng, user_id, count, category_ids):
+    return [
+        {
+            'category_id': category_ids[rng.choice(CATEGORIES).lower()],
+            'name': f"Item {user_id}-{i}",
+            'brand': rng.choice(('Zpacks', 'Nemo', 'Big Agnes', 'MSR', 'Sawyer', None)),
+            'weight': round(rng.uniform(5, 1500), 1),
+            'unit': rng.choice(('g', 'oz')),
+            'price': round(rng.uniform(5, 600), 2),
+            'consumable': rng.random() < 0.1
+        }
+        for i in range(count)
+    ]
+
+
+def timed(label, count, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<44} {count:>8} ops {elapsed * 1000:9.1f} ms  {count / elapsed:>10,.0f} ops/s")
+    return result
+
+
+def threaded(label, threads, per_thread, fn):
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(per_thread):
+            fn(rng)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<44} {threads * per_thread:>8} ops {elapsed * 1000:9.1f} ms  {threads * per_thread / elapsed:>10,.0f} ops/s")
+
+
+def main():
+    rng = random.Random(7)
+    directory = tempfile.mkdtemp()
+    # Few PBKDF2 iterations: password hashing is deliberately slow and not what this measures
+    storage = Storage(os.path.join(directory, 'bench.db'), password_iterations=1000)
+
+    users = timed('create users', USERS, lambda: [
+        storage.create_user(f"user{n}", f"user{n}@example.com", 'password')['id'] for n in range(USERS)
+    ])
+    tokens = {user_id: storage.create_token(user_id) for user_id in users}
+    categories = {user_id: storage.category_ids(user_id, CATEGORIES) for user_id in users}
+    payloads = {user_id: items(rng, user_id, ITEMS_PER_USER, categories[user_id]) for user_id in users}
+
+    ids = timed(f"bulk insert ({ITEMS_PER_USER} items per transaction)", USERS * ITEMS_PER_USER, lambda: {
+        user_id: storage.create_items(user_id, payloads[user_id]) for user_id in users
+    })
+
+    # A tenth of the same rows one autocommitted INSERT at a time, into a fresh database without the categories
+    single = Storage(os.path.join(directory, 'single.db')).db
+    sample = users[:USERS // 10]
+    now = time.time()
+    timed('row-at-a-time insert (autocommit)', len(sample) * ITEMS_PER_USER, lambda: [
+        single.execute(INSERT_ITEM, (user_id, None, *(item.get(field) for field in ITEM_FIELDS[1:]), n, None, None, now, now))
+        for user_id in sample for n, item in enumerate(payloads[user_id])
+    ])
+
+    timed(f"bulk update ({ITEMS_PER_USER} items per transaction)", USERS * ITEMS_PER_USER, lambda: [
+        storage.update_items(user_id, [{'id': item_id, 'price': round(rng.uniform(5, 600), 2)} for item_id in ids[user_id]])
+        for user_id in users
+    ])
+    timed('settings update', USERS, lambda: [storage.update_settings(user_id, {'unit_weight': 'IMPERIAL'}) for user_id in users])
+
+    reads = 20000
+    timed('token lookup', reads, lambda: [storage.user_id_for_token(tokens[rng.choice(users)]) for _ in range(reads)])
+    timed('get user', reads, lambda: [storage.get_user(rng.choice(users)) for _ in range(reads)])
+    timed('get item', reads, lambda: [storage.get_item(user_id, rng.choice(ids[user_id])) for user_id in rng.choices(users, k=reads)])
+    listed = timed(f"list inventory ({ITEMS_PER_USER} items)", 2000, lambda: [storage.list_items(rng.choice(users)) for _ in range(2000)])
+    assert all(len(inventory) == ITEMS_PER_USER for inventory in listed)
+
+    for threads in THREADS:
+        threaded(f"list inventory, {threads} thread(s)", threads, 4000 // threads, lambda r: storage.list_items(r.choice(users)))
+
+    def mixed(r):
+        user_id = r.choice(users)
+        if r.random() < 0.9:
+            storage.get_item(user_id, r.choice(ids[user_id]))
+        else:
+            storage.update_items(user_id, [{'id': r.choice(ids[user_id]), 'notes': 'checked'}])
+
+    for threads in THREADS:
+        threaded(f"get item, 1 in 10 an update, {threads} thread(s)", threads, 20000 // threads, mixed)
+    print(f"connections opened: {storage.stats()['connections_opened']}")
+
+
+if __name__ == '__main__':
+    main()
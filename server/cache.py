@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class BaseCache:
+    """Common interface for the response cache backends selected by CACHE_TYPE"""
+
+    def __init__(self, default_timeout=300):
+        self.default_timeout = default_timeout
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, timeout=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _record(self, namespace, hit):
+        with self._stats_lock:
+            counters = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counters['hits' if hit else 'misses'] += 1
+
+    def cached(self, namespace, key, fn, timeout=None, cache_if=None):
+        """Return the cached value for key, calling fn() and storing its result on a miss.
+
+        Cached values are shared between callers and must be treated as read-only.
+        """
+        value = self.get(key)
+        if value is not None:
+            self._record(namespace, True)
+            return value
+
+        self._record(namespace, False)
+        value = fn()
+        if value is not None and (cache_if is None or cache_if(value)):
+            self.set(key, value, timeout)
+        return value
+
+    async def async_cached(self, namespace, key, coro_fn, timeout=None, cache_if=None):
+        """Like cached(), but coro_fn() returns an awaitable"""
+        value = self.get(key)
+        if value is not None:
+            self._record(namespace, True)
+            return value
+
+        self._record(namespace, False)
+        value = await coro_fn()
+        if value is not None and (cache_if is None or cache_if(value)):
+            self.set(key, value, timeout)
+        return value
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {}
+            for namespace, counters in self._stats.items():
+                total = counters['hits'] + counters['misses']
+                stats[namespace] = dict(counters, hit_rate=round(counters['hits'] / total, 3) if total else 0.0)
+            return {'backend': type(self).__name__, 'namespaces': stats}
+
+
+class NullCache(BaseCache):
+    """Cache backend that never stores anything"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SimpleCache(BaseCache):
+    """In-process LRU cache with per-entry TTL, bounded to `threshold` entries"""
+
+    def __init__(self, threshold=500, default_timeout=300):
+        super().__init__(default_timeout)
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires_at = time.monotonic() + timeout if timeout else 0
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.threshold:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(BaseCache):
+    """Cache backend storing JSON-serialized entries as files in a local directory"""
+
+    def __init__(self, cache_dir, threshold=500, default_timeout=300):
+        super().__init__(default_timeout)
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires_at'] and entry['expires_at'] < time.time():
+            self.delete(key)
+            return None
+        return entry['value']
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        entry = {'expires_at': time.time() + timeout if timeout else 0, 'value': value}
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        self._prune()
+
+    def _prune(self):
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if not name.endswith('.tmp')]
+        except OSError:
+            return
+        if len(names) <= self.threshold:
+            return
+        # Drop the least recently written entries
+        paths = sorted((os.path.join(self.cache_dir, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.threshold]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+
+class RedisCache(BaseCache):
+    """Cache backend for Redis or any Redis-compatible server (Valkey, KeyDB, ...)"""
+
+    def __init__(self, url, key_prefix='packstack:', default_timeout=300):
+        super().__init__(default_timeout)
+        import redis
+        self.key_prefix = key_prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        try:
+            raw = self._client.get(self.key_prefix + key)
+        except Exception:
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        try:
+            if timeout:
+                self._client.setex(self.key_prefix + key, timeout, json.dumps(value))
+            else:
+                self._client.set(self.key_prefix + key, json.dumps(value))
+        except Exception:
+            pass
+
+    def delete(self, key):
+        try:
+            self._client.delete(self.key_prefix + key)
+        except Exception:
+            pass
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(f"{self.key_prefix}*"):
+                self._client.delete(key)
+        except Exception:
+            pass
+
+
+def create_cache(config):
+    """Build the cache backend named by config['CACHE_TYPE']"""
+    cache_type = config.get('CACHE_TYPE', 'SimpleCache')
+    default_timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    threshold = config.get('CACHE_THRESHOLD', 500)
+
+    if cache_type == 'NullCache':
+        return NullCache(default_timeout)
+    if cache_type == 'FileSystemCache':
+        return FileSystemCache(config.get('CACHE_DIR', 'cache'), threshold, default_timeout)
+    if cache_type == 'RedisCache':
+        try:
+            return RedisCache(config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'), default_timeout=default_timeout)
+        except ImportError:
+            print("WARNING: redis package not installed. Falling back to SimpleCache.")
+    elif cache_type != 'SimpleCache':
+        print(f"WARNING: Unknown CACHE_TYPE '{cache_type}'. Falling back to SimpleCache.")
+    return SimpleCache(threshold, default_timeout)
+
+
+def normalize_keywords(keywords):
+    """Lowercase and collapse whitespace so equivalent searches share a cache entry"""
+    return ' '.join((keywords or '').lower().split())
+
+
+def search_cache_key(provider, keywords, category, max_results, credential_scope=None):
+    """Cache key for a retailer search; searches made with a user's own credentials get their own entries"""
+    key = f"search:{provider}:{normalize_keywords(keywords)}:{(category or '').lower()}:{max_results}"
+    return f"{key}:{credential_scope}" if credential_scope else key
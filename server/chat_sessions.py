@@ -0,0 +1,179 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+
+from tokens import count_tokens
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    summary_tokens INTEGER NOT NULL DEFAULT 0,
+    summarized_turns INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_turns (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_updated ON chat_sessions (updated_at);
+CREATE INDEX IF NOT EXISTS chat_turns_session ON chat_turns (session_id, id);
+"""
+
+
+class ChatSessionStore:
+    """Server-side /chat history in SQLite, keyed by session ID
+
+    A session holds the recent turns verbatim plus a running summary of the
+    turns that no longer fit the token budget. Sessions expire `ttl` seconds
+    after their last update. Turns are rows of their own, so add_turns()
+    appends a whole exchange in one insert and concurrent requests on the
+    same session never overwrite each other's turns. The database is shared
+    by every worker process and survives restarts, unlike the response
+    cache, whose backends may drop or evict entries at any time.
+    """
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        # Expired sessions are cleared out as new ones start
+        self.db.execute('DELETE FROM chat_sessions WHERE updated_at < ?', (now - self.ttl,))
+        self.db.execute('INSERT INTO chat_sessions (id, created_at, updated_at) VALUES (?, ?, ?)', (session_id, now, now))
+        return session_id
+
+    def get(self, session_id):
+        """The session with its verbatim turns in order, or None when unknown or expired"""
+        row = self.db.execute(
+            'SELECT * FROM chat_sessions WHERE id = ? AND updated_at >= ?', (session_id, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        turns = self.db.execute('SELECT id, role, content, tokens FROM chat_turns WHERE session_id = ? ORDER BY id', (session_id,))
+        return {
+            'summary': row['summary'],
+            'summary_tokens': row['summary_tokens'],
+            'summarized_turns': row['summarized_turns'],
+            'updated_at': row['updated_at'],
+            'turns': [dict(turn) for turn in turns]
+        }
+
+    def add_turns(self, session_id, turns):
+        """Append turns to a session atomically; False when the session no longer exists"""
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if db.execute('UPDATE chat_sessions SET updated_at = ? WHERE id = ?', (time.time(), session_id)).rowcount == 0:
+                db.execute('ROLLBACK')
+                return False
+            db.executemany(
+                'INSERT INTO chat_turns (session_id, role, content, tokens) VALUES (?, ?, ?, ?)',
+                [(session_id, turn['role'], turn['content'], turn['tokens']) for turn in turns]
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return True
+
+    def compact(self, session_id, session, compacted):
+        """Store the result of compact_session(session): the new summary, with the folded turns removed
+
+        Turns added since `session` was read are kept. If another request
+        compacted the session first, this one is dropped.
+        """
+        folded = compacted['summarized_turns'] - session['summarized_turns']
+        if folded <= 0:
+            return
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            updated = db.execute(
+                'UPDATE chat_sessions SET summary = ?, summary_tokens = ?, summarized_turns = ?, updated_at = ? '
+                'WHERE id = ? AND summarized_turns = ?',
+                (compacted['summary'], compacted['summary_tokens'], compacted['summarized_turns'], time.time(),
+                 session_id, session['summarized_turns'])
+            ).rowcount
+            if updated:
+                db.execute('DELETE FROM chat_turns WHERE session_id = ? AND id <= ?', (session_id, session['turns'][folded - 1]['id']))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def delete(self, session_id):
+        self.db.execute('DELETE FROM chat_sessions WHERE id = ?', (session_id,))
+
+
+def make_turn(role, content, model='gpt-3.5-turbo'):
+    return {'role': role, 'content': content, 'tokens': count_tokens(content, model)}
+
+
+def compact_session(session, budget, summarize):
+    """Fold the oldest turns into the running summary once the verbatim turns exceed `budget` tokens
+
+    Turns are folded until the remainder fits in half the budget, so the
+    summary is refreshed in batches rather than on every request.
+    summarize(previous_summary, turns) returns the new summary text, or
+    raises when it cannot; the session is then returned unchanged, so no
+    turns are dropped and they are folded on a later request instead.
+    Returns the (possibly new) session dict.
+    """
+    turns = session['turns']
+    remaining = sum(turn['tokens'] for turn in turns)
+    if remaining <= budget:
+        return session
+
+    fold = 0
+    # Always keep the latest exchange verbatim
+    while fold < len(turns) - 2 and remaining > budget // 2:
+        remaining -= turns[fold]['tokens']
+        fold += 1
+    if fold == 0:
+        return session
+
+    try:
+        summary = summarize(session['summary'], turns[:fold])
+    except Exception:
+        return session
+    return dict(
+        session,
+        summary=summary,
+        summary_tokens=count_tokens(summary),
+        summarized_turns=session['summarized_turns'] + fold,
+        turns=turns[fold:]
+    )
+
+
+def session_history(session):
+    """The session as chat messages: the running summary (if any) followed by the verbatim turns"""
+    messages = []
+    if session['summary']:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {session['summary']}"})
+    messages.extend({"role": turn['role'], "content": turn['content']} for turn in session['turns'])
+    return messages
@@ -5,7 +5,55 @@ class BaseConfig:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:5173').split(',')
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-    CACHE_TYPE = os.getenv('CACHE_TYPE', 'SimpleCache')
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'SimpleCache')  # SimpleCache, FileSystemCache, RedisCache or NullCache
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 300))
+    CACHE_THRESHOLD = int(os.getenv('CACHE_THRESHOLD', 500))
+    CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    AMAZON_SEARCH_CACHE_TTL = int(os.getenv('AMAZON_SEARCH_CACHE_TTL', 3600))
+    WALMART_SEARCH_CACHE_TTL = int(os.getenv('WALMART_SEARCH_CACHE_TTL', 1800))
+    RETAILER_SEARCH_DEADLINE = float(os.getenv('RETAILER_SEARCH_DEADLINE', 5.0))  # seconds
+    RETAILER_SEARCH_WORKERS = int(os.getenv('RETAILER_SEARCH_WORKERS', 8))
+    PRODUCT_MATCH_THRESHOLD = float(os.getenv('PRODUCT_MATCH_THRESHOLD', 0.35))
+    ANALYSIS_CACHE_MAX_DISTANCE = int(os.getenv('ANALYSIS_CACHE_MAX_DISTANCE', 6))  # Hamming distance in bits of a 64-bit dHash
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 1000))
+    ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', 86400))
+    ANALYZE_BATCH_MAX_IMAGES = int(os.getenv('ANALYZE_BATCH_MAX_IMAGES', 50))
+    ANALYZE_BATCH_CONCURRENCY = int(os.getenv('ANALYZE_BATCH_CONCURRENCY', 4))  # images in flight per batch
+    ANALYZE_WORKERS = int(os.getenv('ANALYZE_WORKERS', 8))  # shared by all batches in a process
+    JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', 'jobs.db')
+    JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 4))
+    JOBS_TTL = int(os.getenv('JOBS_TTL', 600))  # seconds a job may wait in the queue before it expires
+    JOBS_RESULT_RETENTION = int(os.getenv('JOBS_RESULT_RETENTION', 3600))
+    JOBS_RUN_TIMEOUT = int(os.getenv('JOBS_RUN_TIMEOUT', 300))  # after this a running job is assumed lost and retried
+    JOBS_EVENTS_POLL_INTERVAL = float(os.getenv('JOBS_EVENTS_POLL_INTERVAL', 0.5))
+    JOBS_EVENTS_MAX_DURATION = float(os.getenv('JOBS_EVENTS_MAX_DURATION', 25))  # seconds an event stream stays open before the client reconnects
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.85))  # cosine similarity
+    SEMANTIC_CACHE_CAPACITY = int(os.getenv('SEMANTIC_CACHE_CAPACITY', 1000))
+    SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', 86400))
+    CHAT_SESSION_DB_PATH = os.getenv('CHAT_SESSION_DB_PATH', 'chat_sessions.db')
+    CHAT_SESSION_TTL = int(os.getenv('CHAT_SESSION_TTL', 86400))
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', 1500))  # verbatim turns per prompt
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', 300))
+    CONTENT_FILTER_RULES = os.getenv('CONTENT_FILTER_RULES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content_filter_rules.txt'))
+    CONTENT_FILTER_RELOAD_INTERVAL = float(os.getenv('CONTENT_FILTER_RELOAD_INTERVAL', 5.0))  # seconds between rule file checks
+    WEATHER_PROVIDER = os.getenv('WEATHER_PROVIDER', 'static')  # static or http
+    WEATHER_API_URL = os.getenv('WEATHER_API_URL')
+    WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
+    WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 3600))
+    WEATHER_MAX_AGE = int(os.getenv('WEATHER_MAX_AGE', 600))  # Cache-Control max-age, matches the frontend's staleTime
+    WEATHER_BATCH_MAX_WAYPOINTS = int(os.getenv('WEATHER_BATCH_MAX_WAYPOINTS', 25))
+    WEATHER_BATCH_CONCURRENCY = int(os.getenv('WEATHER_BATCH_CONCURRENCY', 4))
+    RECOMMENDATION_CACHE_TTL = int(os.getenv('RECOMMENDATION_CACHE_TTL', 86400))
+    RECOMMENDATION_CACHE_MAX_PARTIAL_CATEGORIES = int(os.getenv('RECOMMENDATION_CACHE_MAX_PARTIAL_CATEGORIES', 3))  # more changed inventory categories than this re-query everything
+    RECOMMENDATION_INVENTORY_TOKEN_BUDGET = int(os.getenv('RECOMMENDATION_INVENTORY_TOKEN_BUDGET', 1500))  # compacted inventory in the prompt
+    ITEM_CATALOGUE_PATH = os.getenv('ITEM_CATALOGUE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'item_catalogue.jsonl'))
+    ITEM_SEARCH_MERGE_THRESHOLD = int(os.getenv('ITEM_SEARCH_MERGE_THRESHOLD', 2000))  # inserts held unindexed before a background rebuild
+    STORAGE_DB_PATH = os.getenv('STORAGE_DB_PATH', 'packstack.db')  # users, trips, items and packs (SQLite, WAL mode)
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 500))  # rows per import transaction
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 100))  # row errors listed in an import summary
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))  # rows read and flushed to the client at a time
 
 class DevConfig(BaseConfig):
     DEBUG = True
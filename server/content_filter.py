@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import threading
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content_filter_rules.txt')
+
+# Up to this many whitespace characters may separate the words of a phrase rule ("credit  card", "creditcard")
+PHRASE_GAP = 3
+
+# A rule only matches as a whole word: not inside "hackberry" and not as part of "password-protected"
+WORD_START = r'(?<![\w-])'
+WORD_END = r'(?![\w-])'
+
+# Run of word characters at the start of the (reversed) pending text: the trailing word that may still grow
+OPEN_WORD = re.compile(r'[\w-]*')
+
+NEVER_MATCHES = re.compile(r'(?!x)x')
+
+
+def load_rules(path):
+    """Rules from a text file: one word or phrase per line, blank lines and # comments ignored"""
+    rules = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            rule = ' '.join(line.split('#', 1)[0].split()).lower()
+            if rule:
+                rules.append(rule)
+    return rules
+
+
+def compile_rules(rules):
+    """One regex for the whole rule set, plus the longest text it can match
+
+    The pattern is matched against lowercased text: lowercasing once and
+    matching case-sensitively is faster than re.IGNORECASE.
+    """
+    phrases = sorted({tuple(rule.split()) for rule in rules if rule.strip()}, key=lambda words: -len(' '.join(words)))
+    if not phrases:
+        return NEVER_MATCHES, 0
+    alternatives = [(r'\s{0,%d}' % PHRASE_GAP).join(re.escape(word) for word in words) for words in phrases]
+    max_length = max(sum(len(word) for word in words) + PHRASE_GAP * (len(words) - 1) for words in phrases)
+    return re.compile(WORD_START + '(?:' + '|'.join(alternatives) + ')' + WORD_END), max_length
+
+
+class ContentFilter:
+    """Blocked-term matcher compiled once from a rule file and reloaded when the file changes
+
+    All rules are combined into a single regex so a check is one pass over
+    the text. The file's modification time is checked at most every
+    `reload_interval` seconds; a file that fails to load keeps the previous
+    rules in place.
+    """
+
+    def __init__(self, rules_path=DEFAULT_RULES_PATH, reload_interval=5.0):
+        self.rules_path = rules_path
+        self.reload_interval = reload_interval
+        self._compiled = (NEVER_MATCHES, 0)
+        self._rule_count = 0
+        self._mtime = None
+        self._checked_at = 0.0
+        self._reloads = 0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Load and compile the rule file; returns True when the rules changed"""
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+            rules = load_rules(self.rules_path)
+            compiled = compile_rules(rules)
+        except (OSError, re.error) as e:
+            print(f"WARNING: Could not load content filter rules from {self.rules_path}: {e}")
+            return False
+        with self._lock:
+            self._compiled = compiled
+            self._rule_count = len(rules)
+            self._mtime = mtime
+            self._reloads += 1
+        return True
+
+    def _current(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            try:
+                changed = os.path.getmtime(self.rules_path) != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+        return self._compiled
+
+    def check(self, text):
+        """True when text contains a blocked term"""
+        pattern, _ = self._current()
+        return pattern.search((text or '').lower()) is not None
+
+    def scanner(self):
+        """Incremental matcher for one streamed text, using the rules current at creation"""
+        pattern, max_length = self._current()
+        return StreamScanner(pattern, max_length)
+
+    def stats(self):
+        with self._lock:
+            return {'rules': self._rule_count, 'reloads': self._reloads, 'rules_path': self.rules_path}
+
+
+class StreamScanner:
+    """Applies a compiled rule set to text that arrives in chunks
+
+    Text is released only up to the start of the trailing word, so a blocked
+    term is never forwarded part-way through and a word split across chunks
+    ("hack" + "berry") is judged once complete. Each check scans only the
+    newly completed text plus the last `max_length` released characters, to
+    catch phrases spanning the boundary, so total work is linear in the
+    stream length. Once a match is found `flagged` is set and nothing more is
+    released.
+    """
+
+    def __init__(self, pattern, max_length):
+        self.pattern = pattern
+        self.max_length = max_length
+        self.parts = []
+        self.context = ''
+        self.pending = ''
+        self.flagged = False
+
+    @property
+    def text(self):
+        """Everything fed so far"""
+        return ''.join(self.parts) + self.pending
+
+    def feed(self, chunk):
+        """Add a chunk and return the newly releasable text"""
+        self.pending += chunk
+        open_word = OPEN_WORD.match(self.pending[::-1]).end()
+        return self._release(len(self.pending) - open_word)
+
+    def finish(self):
+        """Release whatever is left once the stream has ended"""
+        return self._release(len(self.pending))
+
+    def _release(self, end):
+        if self.flagged or end == 0:
+            return ''
+        released = self.pending[:end]
+        # Once the context is full its first character only serves the
+        # WORD_START lookbehind: a match starting there would lie entirely
+        # inside the context and so would already have been found
+        window = (self.context + released).lower()
+        if self.pattern.search(window, 1 if len(self.context) > self.max_length else 0):
+            self.flagged = True
+            return ''
+        self.parts.append(released)
+        self.pending = self.pending[end:]
+        self.context = (self.context + released)[-(self.max_length + 1):]
+        return released
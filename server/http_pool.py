@@ -0,0 +1,155 @@
+import os
+import atexit
+import threading
+import importlib.util
+import weakref
+
+import httpx
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv('HTTP_POOL_MAX_CONNECTIONS', 20))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv('HTTP_POOL_MAX_KEEPALIVE', 10))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_POOL_KEEPALIVE_EXPIRY', 30.0))
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'true').lower() == 'true' and importlib.util.find_spec('h2') is not None
+
+_pools = weakref.WeakSet()
+
+
+class PooledHTTPClient:
+    """Long-lived, thread-safe HTTP client that reuses keep-alive connections to one upstream
+
+    The underlying httpx.Client is created lazily and recreated in a forked
+    child (e.g. a gunicorn worker), so connections are never shared across
+    processes. Connection setup is tracked through httpcore trace events to
+    report how often requests reuse an existing connection.
+    """
+
+    def __init__(self, name, timeout=10.0, max_connections=None, max_keepalive_connections=None,
+                 keepalive_expiry=None, http2=None):
+        self.name = name
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections or HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=keepalive_expiry or HTTP_POOL_KEEPALIVE_EXPIRY
+        )
+        self.http2 = HTTP2_ENABLED if http2 is None else http2
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'new_connections': 0, 'tls_handshakes': 0}
+        _pools.add(self)
+
+    @property
+    def client(self):
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self._create_client()
+                self._pid = os.getpid()
+            return self._client
+
+    def _create_client(self):
+        return httpx.Client(timeout=self.timeout, limits=self.limits, http2=self.http2)
+
+    def _trace(self, event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            self._count('new_connections')
+        elif event_name == 'connection.start_tls.complete':
+            self._count('tls_handshakes')
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def request(self, method, url, **kwargs):
+        extensions = dict(kwargs.pop('extensions', None) or {})
+        extensions['trace'] = self._trace
+        self._count('requests')
+        return self.client.request(method, url, extensions=extensions, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+
+    def _forget_after_fork(self):
+        # The parent process still owns these sockets; just drop the reference
+        self._client = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'new_connections': 0, 'tls_handshakes': 0}
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['reused_connections'] = max(stats['requests'] - stats['new_connections'], 0)
+        stats['reuse_ratio'] = round(stats['reused_connections'] / stats['requests'], 3) if stats['requests'] else 0.0
+        stats['http2'] = self.http2
+        return stats
+
+
+class AsyncPooledHTTPClient(PooledHTTPClient):
+    """httpx.AsyncClient counterpart of PooledHTTPClient for the ASGI serving mode
+
+    Must only be used from one event loop per process, which is how the
+    uvicorn worker runs.
+    """
+
+    def _create_client(self):
+        return httpx.AsyncClient(timeout=self.timeout, limits=self.limits, http2=self.http2)
+
+    async def _async_trace(self, event_name, info):
+        self._trace(event_name, info)
+
+    async def request(self, method, url, **kwargs):
+        extensions = dict(kwargs.pop('extensions', None) or {})
+        extensions['trace'] = self._async_trace
+        self._count('requests')
+        return await self.client.request(method, url, extensions=extensions, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    def close(self):
+        # An AsyncClient can only be closed from its event loop; see aclose()
+        self._client = None
+
+    async def aclose(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+def http_pool_stats():
+    """Connection reuse statistics for every pooled client in this process"""
+    return {pool.name: pool.stats() for pool in list(_pools)}
+
+
+def close_all_pools():
+    for pool in list(_pools):
+        pool.close()
+
+
+def _reset_pools_after_fork():
+    for pool in list(_pools):
+        pool._forget_after_fork()
+
+
+atexit.register(close_all_pools)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
@@ -0,0 +1,138 @@
+import io
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+# gpt-4-vision fits images within 2048x2048 and then scales the short side to
+# 768px, so any pixels beyond that are uploaded and billed for nothing
+IMAGE_MAX_LONG_SIDE = int(os.getenv('IMAGE_MAX_LONG_SIDE', 2048))
+IMAGE_MAX_SHORT_SIDE = int(os.getenv('IMAGE_MAX_SHORT_SIDE', 768))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+
+
+class ImageProcessingError(Exception):
+    """Raised when an upload cannot be decoded as an image"""
+
+
+def target_size(width, height, max_long_side=IMAGE_MAX_LONG_SIDE, max_short_side=IMAGE_MAX_SHORT_SIDE):
+    """Largest size within both limits that keeps the aspect ratio; never upscales"""
+    scale = min(1.0, max_long_side / max(width, height), max_short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash: brightness gradients between horizontally adjacent pixels of a tiny greyscale copy"""
+    pixels = list(image.convert('L').resize((hash_size + 1, hash_size), LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def prepare_image(data, max_long_side=IMAGE_MAX_LONG_SIDE, max_short_side=IMAGE_MAX_SHORT_SIDE, quality=IMAGE_JPEG_QUALITY):
+    """Decode an upload, apply its EXIF orientation, drop all metadata, downscale and re-encode as JPEG.
+
+    Returns (jpeg_bytes, info) where info has width, height, original_bytes, bytes
+    and dhash, the perceptual hash of the prepared image as 16 hex digits.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            # Lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+            original.draft('RGB', target_size(*original.size, max_long_side, max_short_side))
+            image = ImageOps.exif_transpose(original)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            size = target_size(*image.size, max_long_side, max_short_side)
+            if size != image.size:
+                image = image.resize(size, LANCZOS, reducing_gap=3.0)
+
+            output = io.BytesIO()
+            # No exif/icc_profile arguments, so no metadata is written
+            image.save(output, 'JPEG', quality=quality, optimize=True)
+            phash = dhash(image)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageProcessingError(f"Invalid image: {e}")
+
+    encoded = output.getvalue()
+    return encoded, {'width': size[0], 'height': size[1], 'original_bytes': len(data), 'bytes': len(encoded), 'dhash': f"{phash:016x}"}
+
+
+class ImagePipeline:
+    """Bounded process pool for the CPU-bound image preparation behind /analyze
+
+    Uploads never touch the disk: request handlers pass the raw bytes in and
+    get the prepared JPEG back. The pool is created lazily per process using
+    the spawn start method, so it is safe to use from forked gunicorn workers.
+    """
+
+    def __init__(self, max_workers=IMAGE_PIPELINE_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {'processed': 0, 'failed': 0, 'original_bytes': 0, 'bytes': 0}
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _record(self, outcome):
+        with self._lock:
+            if outcome is None:
+                self._stats['failed'] += 1
+                return
+            _, info = outcome
+            self._stats['processed'] += 1
+            self._stats['original_bytes'] += info['original_bytes']
+            self._stats['bytes'] += info['bytes']
+
+    def process(self, data):
+        """Prepare an upload in the pool, blocking the calling thread until it is done"""
+        try:
+            outcome = self.executor.submit(prepare_image, data).result()
+        except ImageProcessingError:
+            self._record(None)
+            raise
+        self._record(outcome)
+        return outcome
+
+    async def async_process(self, data):
+        """Event-loop variant of process()"""
+        try:
+            outcome = await asyncio.wrap_future(self.executor.submit(prepare_image, data))
+        except ImageProcessingError:
+            self._record(None)
+            raise
+        self._record(outcome)
+        return outcome
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, workers=self.max_workers)
+        stats['size_ratio'] = round(stats['bytes'] / stats['original_bytes'], 3) if stats['original_bytes'] else 0.0
+        return stats
@@ -0,0 +1,105 @@
+import io
+import csv
+import zlib
+import json
+
+from prompt_compaction import UNIT_GRAMS
+
+# Unit names LighterPack writes in its CSV export
+LIGHTERPACK_UNITS = {'g': 'gram', 'kg': 'kilogram', 'oz': 'ounce', 'lb': 'pound'}
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'lighterpack': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson')
+}
+
+# Same columns as downloadInventory in src/lib/download.ts, so exports import back through /item/import/csv
+CSV_HEADER = ('name', 'manufacturer', 'product', 'category', 'weight', 'unit', 'price', 'consumable', 'product_url', 'notes')
+LIGHTERPACK_HEADER = ('Item Name', 'Category', 'desc', 'qty', 'weight', 'unit', 'url', 'price', 'worn', 'consumable')
+
+
+def display_weight(row):
+    """The stored weight in grams converted back to the item's own unit"""
+    if row['weight'] is None:
+        return None
+    return round(row['weight'] / UNIT_GRAMS.get(row['unit'], 1), 2)
+
+
+def csv_record(format, row):
+    pack_item = 'quantity' in row.keys()
+    if format == 'lighterpack':
+        return (
+            row['name'], row['category'] or '', row['notes'] or '', row['quantity'] if pack_item else 1,
+            display_weight(row) or 0, LIGHTERPACK_UNITS.get(row['unit'], 'gram'), row['product_url'] or '',
+            row['price'] or '', 'Worn' if pack_item and row['worn'] else '', 'Consumable' if row['consumable'] else ''
+        )
+    return (
+        row['name'], row['brand'] or '', row['product'] or '', row['category'] or '', display_weight(row) or '',
+        row['unit'], row['price'] or 0, 'true' if row['consumable'] else '', row['product_url'] or '', row['notes'] or ''
+    )
+
+
+def json_record(row):
+    record = {
+        'id': row['id'],
+        'name': row['name'],
+        'brand': row['brand'],
+        'product': row['product'],
+        'category': row['category'],
+        'weight': display_weight(row),
+        'unit': row['unit'],
+        'price': row['price'],
+        'consumable': bool(row['consumable']),
+        'product_url': row['product_url'],
+        'notes': row['notes'],
+        'sort_order': row['sort_order']
+    }
+    if 'quantity' in row.keys():
+        record.update(quantity=row['quantity'], worn=bool(row['worn']))
+    return record
+
+
+def export_chunks(rows, format, chunk_rows=500):
+    """Text of an export in chunks of `chunk_rows` rows
+
+    CSV headers are yielded on their own before any query runs, and the
+    first NDJSON record as soon as it is read, so the response starts at
+    once.
+    """
+    if format == 'ndjson':
+        chunk = []
+        for count, row in enumerate(rows):
+            chunk.append(json.dumps(json_record(row)) + '\n')
+            if count % chunk_rows == 0:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(LIGHTERPACK_HEADER if format == 'lighterpack' else CSV_HEADER)
+    yield buffer.getvalue()
+    count = 0
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(csv_record(format, row))
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compressed bytes of text chunks, flushed after every chunk so each reaches the client as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,175 @@
+import csv
+import math
+import codecs
+import hashlib
+
+from prompt_compaction import UNIT_GRAMS
+from recommendation_cache import content_hash
+
+UNIT_ALIASES = {
+    'g': 'g', 'gram': 'g', 'grams': 'g',
+    'kg': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb'
+}
+
+TRUE_VALUES = frozenset(('true', 'yes', 'y', '1', 'x', 'worn', 'consumable'))
+
+# Header (lowercased) -> item field for each supported export format
+FORMATS = {
+    # The inventory CSV template and export from src/lib/download.ts
+    'csv': {
+        'name': 'name', 'manufacturer': 'brand', 'brand': 'brand', 'product': 'product', 'category': 'category',
+        'weight': 'weight', 'unit': 'unit', 'price': 'price', 'consumable': 'consumable',
+        'product_url': 'product_url', 'notes': 'notes'
+    },
+    # LighterPack's list CSV export; qty and worn describe the list rather than the item, so they are not imported
+    'lighterpack': {
+        'item name': 'name', 'category': 'category', 'desc': 'notes', 'weight': 'weight', 'unit': 'unit',
+        'url': 'product_url', 'price': 'price', 'consumable': 'consumable'
+    }
+}
+
+
+def parse_number(value, field):
+    value = (value or '').strip().lstrip('$').replace(',', '')
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{field} '{value}' is not a number")
+    if number < 0 or not math.isfinite(number):
+        raise ValueError(f"{field} must be a positive number")
+    return number
+
+
+def clean_text(value):
+    return ' '.join((value or '').split()) or None
+
+
+def parse_row(values):
+    """Item fields from one row ({field: text}); raises ValueError describing the first problem"""
+    name = clean_text(values.get('name'))
+    if not name:
+        raise ValueError("Missing item name")
+    unit = (values.get('unit') or 'g').strip().lower()
+    if unit not in UNIT_ALIASES:
+        raise ValueError(f"Unknown weight unit '{unit}'")
+    unit = UNIT_ALIASES[unit]
+    weight = parse_number(values.get('weight'), 'Weight')
+    return {
+        'name': name,
+        'brand': clean_text(values.get('brand')),
+        'product': clean_text(values.get('product')),
+        'category': clean_text(values.get('category')),
+        'weight': None if weight is None else round(weight * UNIT_GRAMS[unit], 3),
+        'unit': unit,
+        'price': parse_number(values.get('price'), 'Price'),
+        'consumable': (values.get('consumable') or '').strip().lower() in TRUE_VALUES,
+        'product_url': (values.get('product_url') or '').strip() or None,
+        'notes': (values.get('notes') or '').strip() or None
+    }
+
+
+def import_key(item):
+    """Stable identity of an imported item: its name, brand and weight to the nearest 0.1 g"""
+    weight = '' if item['weight'] is None else f"{item['weight']:.1f}"
+    identity = '\x1f'.join((item['name'].lower(), (item['brand'] or '').lower(), weight))
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+class InventoryImport:
+    """Streams a CSV upload into Storage in batches
+
+    The upload is decoded and parsed row by row, so memory does not grow
+    with the file. Each batch of `batch_size` rows is matched against the
+    user's existing items by import_key() in one query and written in one
+    transaction. Rows already present with the same fields are skipped,
+    present rows with changed fields (category, price, notes, ...) are
+    updated, and the rest are added, which makes re-importing an updated
+    export apply only the difference. Rows repeated within the upload are
+    counted as duplicates and rows that fail to parse are reported with
+    their line number, up to `max_errors` of them.
+    """
+
+    def __init__(self, store, user_id, format, batch_size=500, max_errors=100):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown import format '{format}'")
+        self.store = store
+        self.user_id = user_id
+        self.columns = FORMATS[format]
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.summary = {
+            'success': False, 'count': 0, 'rows': 0, 'added': 0, 'updated': 0, 'unchanged': 0,
+            'duplicates': 0, 'error_count': 0, 'errors': []
+        }
+        self._seen = set()
+        self._sort_order = None
+
+    def run(self, stream):
+        """Import from a binary file-like object, yielding the summary after each committed batch"""
+        reader = csv.reader(codecs.iterdecode(stream, 'utf-8-sig', errors='replace'))
+        header = next(reader, None)
+        fields = [self.columns.get(' '.join(column.split()).lower()) for column in header or ()]
+        if 'name' not in fields:
+            raise ValueError(f"The file has no {'Item Name' if 'item name' in self.columns else 'name'} column")
+
+        batch = []
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            self.summary['rows'] += 1
+            try:
+                item = parse_row({field: value for field, value in zip(fields, row) if field})
+            except ValueError as e:
+                self._error(reader.line_num, str(e))
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._commit(batch)
+                batch = []
+                yield self.summary
+        if batch:
+            self._commit(batch)
+        self.summary['success'] = self.summary['error_count'] == 0
+        yield self.summary
+
+    def _error(self, line, message):
+        self.summary['error_count'] += 1
+        if len(self.summary['errors']) < self.max_errors:
+            self.summary['errors'].append({'line': line, 'error': message})
+
+    def _commit(self, batch):
+        unique = {}
+        for item in batch:
+            key = import_key(item)
+            if key in self._seen or key in unique:
+                self.summary['duplicates'] += 1
+                continue
+            item['import_key'] = key
+            item['import_digest'] = content_hash(item)
+            unique[key] = item
+        self._seen.update(unique)
+
+        existing = self.store.imported(self.user_id, unique)
+        category_ids = self.store.category_ids(self.user_id, {item['category'] for item in unique.values() if item['category']})
+        if self._sort_order is None:
+            self._sort_order = self.store.next_sort_order(self.user_id)
+        inserts, updates = [], []
+        for key, item in unique.items():
+            item['category_id'] = category_ids.get((item['category'] or '').lower())
+            if key not in existing:
+                item['sort_order'] = self._sort_order
+                self._sort_order += 1
+                inserts.append(item)
+            elif existing[key][1] != item['import_digest']:
+                item['id'] = existing[key][0]
+                updates.append(item)
+            else:
+                self.summary['unchanged'] += 1
+        self.store.write_imported(self.user_id, inserts, updates)
+        self.summary['added'] += len(inserts)
+        self.summary['updated'] += len(updates)
+        self.summary['count'] = self.summary['added'] + self.summary['updated']
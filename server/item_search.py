@@ -0,0 +1,421 @@
+import re
+import sys
+import json
+import heapq
+import bisect
+import threading
+import math
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import groupby
+
+# A prefix matching at least this many vocabulary words gets a precomputed list of its most popular documents
+HEAVY_PREFIX_WORDS = 32
+HEAVY_PREFIX_DOCS = 256
+
+# Candidates gathered in popularity order before ranking by match quality, per requested result
+POOL_FACTOR = 4
+
+# Cost of checking one document's words against a query word, relative to one set operation in C; used to
+# choose between filtering the rarest word's documents and intersecting every word's document set
+PREDICATE_COST = 4
+
+# Typo tolerance: query words of at least this length with no prefix match are matched by trigram similarity
+FUZZY_MIN_LENGTH = 3
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MAX_WORDS = 5
+FUZZY_CANDIDATES = 64
+
+# Match quality tiers, best first
+EXACT, PHRASE_PREFIX, WORD_PREFIX, FUZZY = range(4)
+
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercased text with accents folded to ASCII"""
+    return unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def words(text):
+    return WORD.findall(normalize(text))
+
+
+def entry_words(brand, name):
+    """(brand words, name words, indexed words) for an entry
+
+    The indexed words add hyphenated or dotted compounds joined up, so
+    "thermarest" finds "Therm-a-Rest".
+    """
+    brand, name = normalize(brand), normalize(name)
+    brand_words, name_words = WORD.findall(brand), WORD.findall(name)
+    indexed = brand_words + name_words
+    for chunk in brand.split() + name.split():
+        if not chunk.isalnum():
+            indexed.append(''.join(WORD.findall(chunk)))
+    return brand_words, name_words, tuple(word for word in dict.fromkeys(indexed) if word)
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def make_entry(raw):
+    """Validated catalogue entry: id and name are required, brand and popularity optional"""
+    if not isinstance(raw, dict) or raw.get('id') is None or not raw.get('name'):
+        raise ValueError("Catalogue entries need an id and a name")
+    popularity = raw.get('popularity', 0)
+    if isinstance(popularity, bool) or not isinstance(popularity, (int, float)):
+        raise ValueError("Catalogue entry popularity must be a number")
+    return {'id': raw['id'], 'name': str(raw['name']), 'brand': str(raw.get('brand') or ''), 'popularity': popularity}
+
+
+def load_catalogue(path):
+    """Entries from a catalogue file with one JSON object per line; invalid lines are skipped with a warning"""
+    entries = []
+    skipped = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entries.append(make_entry(json.loads(line)))
+            except ValueError:
+                skipped += 1
+    if skipped:
+        print(f"WARNING: Skipped {skipped} invalid entries in item catalogue {path}")
+    return entries
+
+
+def word_text(indexed_words):
+    """Indexed words as one string with a leading space, so a word prefix test is a substring search for ' ' + prefix"""
+    return ' ' + ' '.join(indexed_words)
+
+
+class QueryTerm:
+    """One query word: matched as a prefix of document words, or against the exact words of its fuzzy expansion"""
+
+    def __init__(self, prefix, fuzzy_words=None):
+        self.prefix = prefix
+        self.fuzzy_words = fuzzy_words
+        self.needle = ' ' + prefix
+
+    def prefix_matches(self, text):
+        return self.needle in text
+
+    def matches(self, text):
+        if self.needle in text:
+            return True
+        return self.fuzzy_words is not None and not self.fuzzy_words.keys().isdisjoint(text.split())
+
+
+def match_tier(query_words, name_words, all_words):
+    for candidate in (name_words, all_words):
+        if list(candidate) == query_words:
+            return EXACT
+        n = len(query_words)
+        if len(candidate) >= n and list(candidate[:n - 1]) == query_words[:-1] and candidate[n - 1].startswith(query_words[-1]):
+            return PHRASE_PREFIX
+    return WORD_PREFIX
+
+
+def ranking(query_words, terms, brand, name, text, popularity):
+    """Sort key for a matching entry: match tier, closeness of any typo-matched words, popularity, name"""
+    similarity = 1.0
+    for term in terms:
+        if term.fuzzy_words is not None and not term.prefix_matches(text):
+            similarity = min(similarity, max(term.fuzzy_words.get(word, 0.0) for word in text.split()))
+    if similarity < 1:
+        return (FUZZY, -similarity, -popularity, name)
+    name_words = words(name)
+    return (match_tier(query_words, name_words, words(brand) + name_words), -1.0, -popularity, name)
+
+
+class Segment:
+    """Immutable search index over a fixed set of catalogue entries
+
+    Documents are numbered in descending popularity, so every postings list
+    is already in popularity order and a search can stop as soon as it has
+    enough candidates. Vocabulary words are kept sorted, and a prefix is the
+    bisect range of words starting with it: a flattened trie. Prefixes that
+    cover many words (the upper levels of the trie) store their most popular
+    documents so short prefixes don't merge thousands of postings lists.
+    Trigrams of vocabulary words back typo-tolerant matching.
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: (-entry['popularity'], entry['name'], str(entry['id'])))
+        self.ids = [entry['id'] for entry in entries]
+        self.names = [entry['name'] for entry in entries]
+        brands = {}
+        self.brands = [brands.setdefault(entry['brand'], entry['brand']) for entry in entries]
+        self.popularity = array('d', (entry['popularity'] for entry in entries))
+
+        postings = {}
+        self.doc_texts = []
+        exact = set()
+        for doc, entry in enumerate(entries):
+            brand_words, name_words, all_words = entry_words(entry['brand'], entry['name'])
+            all_words = tuple(map(sys.intern, all_words))
+            self.doc_texts.append(word_text(all_words))
+            for word in all_words:
+                docs = postings.get(word)
+                if docs is None:
+                    docs = postings[word] = array('I')
+                docs.append(doc)
+            exact.add((hash(' '.join(name_words)), doc))
+            exact.add((hash(' '.join(brand_words + name_words)), doc))
+
+        # Exact-name lookup as sorted (hash, doc) arrays: far smaller than a dict of word tuples
+        exact = sorted(exact)
+        self.exact_hashes = array('q', (key for key, _ in exact))
+        self.exact_docs = array('I', (doc for _, doc in exact))
+        del exact
+
+        self.vocabulary = sorted(postings)
+        self.postings = [postings[word] for word in self.vocabulary]
+        self.cumulative = array('Q', [0])
+        for docs in self.postings:
+            self.cumulative.append(self.cumulative[-1] + len(docs))
+
+        grams = {}
+        for index, word in enumerate(self.vocabulary):
+            for gram in trigrams(word):
+                grams.setdefault(gram, array('I')).append(index)
+        self.trigrams = grams
+
+        self.heavy_prefixes = {}
+        depth = 1
+        while True:
+            heavy = 0
+            lo = 0
+            for prefix, group in groupby(self.vocabulary, key=lambda word: word[:depth]):
+                size = sum(1 for _ in group)
+                if size >= HEAVY_PREFIX_WORDS and len(prefix) == depth:
+                    heavy += 1
+                    self.heavy_prefixes[prefix] = array('I', heapq.nsmallest(
+                        HEAVY_PREFIX_DOCS, set().union(*self.postings[lo:lo + size])
+                    ))
+                lo += size
+            if not heavy:
+                break
+            depth += 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def word_range(self, prefix):
+        lo = bisect.bisect_left(self.vocabulary, prefix)
+        hi = bisect.bisect_left(self.vocabulary, prefix + '\uffff', lo)
+        return lo, hi
+
+    def fuzzy_words(self, word):
+        """Vocabulary words most similar to word, mapped to their trigram Dice coefficient"""
+        query = trigrams(word)
+        shared = Counter()
+        for gram in query:
+            shared.update(self.trigrams.get(gram, ()))
+        scored = []
+        for index, count in shared.most_common(FUZZY_CANDIDATES):
+            candidate = self.vocabulary[index]
+            similarity = 2 * count / (len(query) + len(candidate) + 1)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((-similarity, candidate))
+        return {candidate: -score for score, candidate in heapq.nsmallest(FUZZY_MAX_WORDS, scored)}
+
+    def terms(self, query_words):
+        """QueryTerms for query words, expanding words with no prefix match to similar words"""
+        terms = []
+        for word in query_words:
+            lo, hi = self.word_range(word)
+            if lo == hi and len(word) >= FUZZY_MIN_LENGTH:
+                terms.append(QueryTerm(word, self.fuzzy_words(word)))
+            else:
+                terms.append(QueryTerm(word))
+        return terms
+
+    def _term_size(self, term):
+        if term.fuzzy_words is not None:
+            return sum(len(self.postings[bisect.bisect_left(self.vocabulary, word)]) for word in term.fuzzy_words)
+        lo, hi = self.word_range(term.prefix)
+        return self.cumulative[hi] - self.cumulative[lo]
+
+    def _postings(self, term):
+        if term.fuzzy_words is not None:
+            return [self.postings[bisect.bisect_left(self.vocabulary, word)] for word in term.fuzzy_words]
+        lo, hi = self.word_range(term.prefix)
+        return self.postings[lo:hi]
+
+    def _stream(self, term):
+        """Documents matching term, most popular first, possibly with repeats"""
+        top = self.heavy_prefixes.get(term.prefix) if term.fuzzy_words is None else None
+        if top is None:
+            return heapq.merge(*self._postings(term))
+        # The precomputed head, then the full merge past it for filtered queries that need more
+        return _chain_after(top, lambda: heapq.merge(*self._postings(term)))
+
+    def candidates(self, terms, pool):
+        """Up to `pool` documents matching every term, most popular first"""
+        if any(term.fuzzy_words is not None and not term.fuzzy_words for term in terms):
+            return []
+        terms = sorted(terms, key=self._term_size)
+        sizes = [self._term_size(term) for term in terms]
+        driver, others = terms[0], terms[1:]
+        if others:
+            # Filtering stops after `pool` matches, so it wins when the other words match most documents
+            selectivity = math.prod(size / len(self) for size in sizes[1:])
+            filter_cost = PREDICATE_COST * min(sizes[0], pool / max(selectivity, 1e-9))
+            if sum(sizes) < filter_cost:
+                docs = set().union(*self._postings(driver))
+                for term, size in zip(others, sizes[1:]):
+                    if len(docs) * PREDICATE_COST < size:
+                        docs = {doc for doc in docs if term.matches(self.doc_texts[doc])}
+                    else:
+                        docs.intersection_update(set().union(*self._postings(term)))
+                return heapq.nsmallest(pool, docs)
+
+        found = []
+        seen = set()
+        for doc in self._stream(driver):
+            if doc in seen:
+                continue
+            seen.add(doc)
+            if all(term.matches(self.doc_texts[doc]) for term in others):
+                found.append(doc)
+                if len(found) >= pool:
+                    break
+        return found
+
+    def exact_matches(self, query_words, limit):
+        """Documents whose name, or brand and name, is exactly the query"""
+        key = hash(' '.join(query_words))
+        found = []
+        i = bisect.bisect_left(self.exact_hashes, key)
+        while i < len(self.exact_hashes) and self.exact_hashes[i] == key and len(found) < limit:
+            found.append(self.exact_docs[i])
+            i += 1
+        return found
+
+    def search(self, query_words, terms, limit):
+        """(sort key, result) pairs for the best matches"""
+        docs = self.candidates(terms, limit * POOL_FACTOR)
+        # Exact name matches rank first even when they are not among the most popular candidates
+        docs.extend(doc for doc in self.exact_matches(query_words, limit) if doc not in docs)
+        return [
+            (
+                ranking(query_words, terms, self.brands[doc], self.names[doc], self.doc_texts[doc], self.popularity[doc]),
+                {'id': self.ids[doc], 'name': self.names[doc], 'brand': self.brands[doc]}
+            )
+            for doc in docs
+        ]
+
+
+def _chain_after(head, rest):
+    yield from head
+    last = head[-1] if len(head) else -1
+    for doc in rest():
+        if doc > last:
+            yield doc
+
+
+class ItemSearchIndex:
+    """Autocomplete search over the brand and product catalogue
+
+    A query is split into words. The last word may be a partial word; every
+    query word must prefix-match a word of the entry's brand or name, or be
+    close to one by trigram similarity when nothing matches it as a prefix.
+    Results are ranked by match quality (exact name, name prefix, word
+    prefixes, fuzzy) and then by popularity.
+
+    insert() adds entries to a small unindexed delta that is scanned on
+    every search. Once it reaches `merge_threshold` entries a background
+    thread rebuilds the main segment with them, and searches keep using the
+    old segment until the new one is swapped in. Inserting an existing id
+    replaces that entry.
+    """
+
+    def __init__(self, entries=(), merge_threshold=2000):
+        self.merge_threshold = merge_threshold
+        self._segment = Segment([make_entry(entry) for entry in entries])
+        self._delta = {}
+        self._merging = False
+        self._merges = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_catalogue(cls, path, merge_threshold=2000):
+        """Index built from a catalogue file; a missing or unreadable file gives an empty index"""
+        index = cls(merge_threshold=merge_threshold)
+        try:
+            index._segment = Segment(load_catalogue(path))
+        except OSError as e:
+            print(f"WARNING: Could not load item catalogue from {path}: {e}")
+        return index
+
+    def __len__(self):
+        with self._lock:
+            return len(self._segment) + len(self._delta)
+
+    def insert(self, entry):
+        entry = make_entry(entry)
+        entry['text'] = word_text(entry_words(entry['brand'], entry['name'])[2])
+        with self._lock:
+            self._delta.pop(entry['id'], None)
+            self._delta[entry['id']] = entry
+            if len(self._delta) >= self.merge_threshold and not self._merging:
+                self._merging = True
+                threading.Thread(target=self._merge, name='item-search-merge', daemon=True).start()
+
+    def _merge(self):
+        try:
+            with self._lock:
+                segment, delta = self._segment, dict(self._delta)
+            entries = [
+                {'id': segment.ids[doc], 'name': segment.names[doc], 'brand': segment.brands[doc], 'popularity': segment.popularity[doc]}
+                for doc in range(len(segment)) if segment.ids[doc] not in delta
+            ]
+            merged = Segment(entries + list(delta.values()))
+            with self._lock:
+                self._segment = merged
+                # Entries inserted or replaced while the merge ran stay in the delta
+                for entry_id, entry in delta.items():
+                    if self._delta.get(entry_id) is entry:
+                        del self._delta[entry_id]
+                self._merges += 1
+        finally:
+            with self._lock:
+                self._merging = False
+
+    def search(self, query, limit=10):
+        query_words = words(query)
+        if not query_words:
+            return []
+        with self._lock:
+            segment, delta = self._segment, list(self._delta.values())
+
+        terms = segment.terms(query_words)
+        ranked = segment.search(query_words, terms, limit)
+        if delta:
+            # Newer entries win over the main segment's copy of the same id
+            replaced = {entry['id'] for entry in delta}
+            ranked = [row for row in ranked if row[1]['id'] not in replaced]
+            ranked.extend(
+                (
+                    ranking(query_words, terms, entry['brand'], entry['name'], entry['text'], entry['popularity']),
+                    {'id': entry['id'], 'name': entry['name'], 'brand': entry['brand']}
+                )
+                for entry in delta if all(term.matches(entry['text']) for term in terms)
+            )
+        ranked.sort(key=lambda row: row[0])
+        return [result for _, result in ranked[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._segment) + len(self._delta),
+                'vocabulary': len(self._segment.vocabulary),
+                'pending_inserts': len(self._delta),
+                'merges': self._merges
+            }
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'expired')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    result_status INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """Durable SQLite-backed queue for long-running AI calls
+
+    submit() stores a job and returns its ID immediately; worker threads claim
+    queued jobs, run the handler registered for the job's kind and store its
+    (body, status) result. Because state lives in the database, any process
+    sharing the file (e.g. every gunicorn worker) can report on a job, and
+    jobs left running by a crashed process are picked up again once
+    `run_timeout` has passed. Jobs still queued after `ttl` seconds expire
+    without running, and finished jobs are deleted after `retention` seconds.
+    """
+
+    def __init__(self, path, workers=4, ttl=600, retention=3600, run_timeout=300, max_attempts=2, poll_interval=1.0):
+        self.path = path
+        self.workers = workers
+        self.ttl = ttl
+        self.retention = retention
+        self.run_timeout = run_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wait_times = deque(maxlen=500)
+        self._run_times = deque(maxlen=500)
+        self._counts = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'expired': 0}
+
+    def register(self, kind, handler):
+        """Run handler(payload) -> (body, status) for jobs of this kind"""
+        self._handlers[kind] = handler
+
+    @property
+    def db(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_workers(self):
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._wakeup = threading.Condition()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+            self._started_pid = os.getpid()
+
+    def submit(self, kind, payload):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        self.db.execute(
+            'INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, kind, 'queued', json.dumps(payload), time.time())
+        )
+        with self._stats_lock:
+            self._counts['submitted'] += 1
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        """Public view of a job, or None once it is unknown or past retention"""
+        self._ensure_workers()
+        row = self.db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'job_id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'wait_ms': round((row['started_at'] - row['created_at']) * 1000, 1) if row['started_at'] else None,
+            'result': json.loads(row['result']) if row['result'] is not None else None,
+            'result_status': row['result_status'],
+            'error': row['error']
+        }
+
+    def _claim(self):
+        """Atomically move the oldest runnable job to running; returns its row or None"""
+        now = time.time()
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                "UPDATE jobs SET status = 'expired', finished_at = ?, error = 'Job expired before it could run' "
+                "WHERE status = 'queued' AND created_at < ?",
+                (now, now - self.ttl)
+            )
+            expired = db.execute('SELECT changes()').fetchone()[0]
+            row = db.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' OR (status = 'running' AND started_at < ?)) "
+                "AND attempts < ? ORDER BY created_at LIMIT 1",
+                (now - self.run_timeout, self.max_attempts)
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (now, row['id'])
+                )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        if expired:
+            with self._stats_lock:
+                self._counts['expired'] += expired
+        if row is not None:
+            with self._stats_lock:
+                self._wait_times.append(now - row['created_at'])
+        return row
+
+    def _finish(self, job_id, status, body=None, result_status=None, error=None):
+        self.db.execute(
+            'UPDATE jobs SET status = ?, result = ?, result_status = ?, error = ?, finished_at = ? WHERE id = ?',
+            (status, json.dumps(body) if body is not None else None, result_status, error, time.time(), job_id)
+        )
+
+    def _purge(self):
+        now = time.time()
+        self.db.execute(
+            'DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?',
+            TERMINAL_STATUSES + (now - self.retention,)
+        )
+        # Running jobs that used up their attempts were abandoned by crashed processes
+        self.db.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Job abandoned after too many attempts' "
+            "WHERE status = 'running' AND started_at < ? AND attempts >= ?",
+            (now, now - self.run_timeout, self.max_attempts)
+        )
+
+    def _work(self):
+        last_purge = 0
+        while True:
+            try:
+                if time.monotonic() - last_purge > 60:
+                    self._purge()
+                    last_purge = time.monotonic()
+                row = self._claim()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(row)
+
+    def _run(self, row):
+        started = time.monotonic()
+        try:
+            body, status = self._handlers[row['kind']](json.loads(row['payload']))
+            outcome = 'succeeded' if status < 400 else 'failed'
+            self._finish(row['id'], outcome, body, status)
+        except Exception as e:
+            outcome = 'failed'
+            self._finish(row['id'], outcome, error=str(e))
+        with self._stats_lock:
+            self._counts[outcome] += 1
+            self._run_times.append(time.monotonic() - started)
+
+    def stats(self):
+        depth = {'queued': 0, 'running': 0}
+        try:
+            for status, count in self.db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ):
+                depth[status] = count
+        except sqlite3.Error:
+            pass
+        with self._stats_lock:
+            wait_times = sorted(self._wait_times)
+            run_times = sorted(self._run_times)
+            stats = dict(self._counts)
+        stats['queue_depth'] = depth['queued']
+        stats['running'] = depth['running']
+        stats['workers'] = self.workers
+        stats['wait_ms'] = _summary(wait_times)
+        stats['run_ms'] = _summary(run_times)
+        return stats
+
+
+def _summary(samples):
+    if not samples:
+        return {'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'avg': round(sum(samples) / len(samples) * 1000, 1),
+        'p95': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 1),
+        'max': round(samples[-1] * 1000, 1)
+    }
@@ -0,0 +1,115 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+PRICE_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'with', 'of', 'in', 'on', 'to', 'by', 'or', 'at', 'from',
+    'new', 'pack', 'set', 'pcs', 'piece', 'pieces', 'men', 'mens', 'women', 'womens', 'unisex',
+    'outdoor', 'outdoors', 'camping', 'hiking', 'backpacking', 'travel', 'portable', 'lightweight',
+    'ultralight', 'black', 'blue', 'green', 'red', 'gray', 'grey', 'white', 'orange', 'yellow'
+}
+
+
+def tokenize(text):
+    """Split a product title into normalized tokens, dropping stopwords and punctuation noise"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        # "X-Mid" and "XMid" should compare equal
+        token = token.replace('-', '').replace('/', '')
+        if token in STOPWORDS or (len(token) == 1 and not token.isdigit()):
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def is_model_number(token):
+    """Tokens mixing letters and digits (e.g. 'ul2', 'ti650', 'gr4') usually identify a model"""
+    return any(c.isdigit() for c in token) and any(c.isalpha() for c in token)
+
+
+def price_amount(product):
+    """Numeric price of a retailer product whose price may be a dict or a display string"""
+    price = product.get('price')
+    if isinstance(price, dict):
+        price = price.get('amount')
+    if isinstance(price, (int, float)):
+        return float(price)
+    match = PRICE_PATTERN.search(price or '')
+    return float(match.group().replace(',', '')) if match else None
+
+
+class ProductMatcher:
+    """Matches products against a candidate list using TF-IDF cosine similarity over an inverted index
+
+    The index is built once over the candidate titles; each query only scores
+    candidates that share at least one informative token, so matching cost
+    grows with the number of overlapping tokens rather than with n*m.
+    Brand tokens and model numbers are weighted up because they distinguish
+    otherwise similar titles ("Nemo Hornet 2P" vs "Nemo Dagger 2P").
+    """
+
+    def __init__(self, candidates, threshold=0.35, brand_weight=2.0, model_weight=3.0):
+        self.candidates = candidates
+        self.threshold = threshold
+        self.brand_weight = brand_weight
+        self.model_weight = model_weight
+
+        candidate_tokens = [self._tokens(candidate) for candidate in candidates]
+        document_frequency = Counter()
+        for tokens in candidate_tokens:
+            document_frequency.update(set(tokens))
+        count = len(candidates)
+        self._idf = {token: math.log((count + 1) / (df + 1)) + 1.0 for token, df in document_frequency.items()}
+        self._default_idf = math.log(count + 1) + 1.0
+
+        self._postings = defaultdict(list)
+        self._norms = []
+        for index, tokens in enumerate(candidate_tokens):
+            vector = self._vector(tokens, candidates[index])
+            for token, weight in vector.items():
+                self._postings[token].append((index, weight))
+            self._norms.append(math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0)
+
+    def _tokens(self, product):
+        return tokenize(product.get('title'))
+
+    def _vector(self, tokens, product):
+        brand_tokens = set(tokenize(product.get('brand')))
+        vector = {}
+        for token, tf in Counter(tokens).items():
+            weight = (1.0 + math.log(tf)) * self._idf.get(token, self._default_idf)
+            if token in brand_tokens:
+                weight *= self.brand_weight
+            elif is_model_number(token):
+                weight *= self.model_weight
+            vector[token] = weight
+        return vector
+
+    def best_match(self, product):
+        """Return (candidate_index, score) for the most similar candidate above the threshold, or None"""
+        vector = self._vector(self._tokens(product), product)
+        if not vector:
+            return None
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+
+        scores = defaultdict(float)
+        for token, weight in vector.items():
+            for index, candidate_weight in self._postings.get(token, ()):
+                scores[index] += weight * candidate_weight
+        if not scores:
+            return None
+
+        # Rank by cosine, not raw dot product, so long titles repeating query tokens do not win on length
+        index, score = max(((index, dot / (norm * self._norms[index])) for index, dot in scores.items()), key=lambda item: item[1])
+        return (index, score) if score >= self.threshold else None
+
+    def match(self, products):
+        """Yield (product, candidate, score) with the best candidate for each matched product"""
+        for product in products:
+            best = self.best_match(product)
+            if best is not None:
+                index, score = best
+                yield product, self.candidates[index], score
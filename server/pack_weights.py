@@ -0,0 +1,138 @@
+import numpy as np
+
+from prompt_compaction import UNIT_GRAMS
+
+# Display unit for each user unit system, as getConversionUnit in src/lib/weight.ts
+UNIT_SYSTEMS = {'METRIC': 'kg', 'IMPERIAL': 'lb'}
+
+UNIT_CODES = {unit: code for code, unit in enumerate(UNIT_GRAMS)}
+UNIT_FACTORS = np.array(list(UNIT_GRAMS.values()))
+
+UNCATEGORIZED = 'Uncategorized'
+
+# Fields of a columnar pack payload: one list per field, one position per pack item
+COLUMNS = ('weight', 'unit', 'quantity', 'worn', 'consumable', 'category')
+
+
+def category_key(value):
+    """Hashable stand-in for a category value: its name, or the value itself when it is not a dict"""
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('category')
+        if isinstance(value, dict):
+            value = value.get('name')
+    return value
+
+
+def category_label(value):
+    """Category name from a string, {'name': ...} or an inventory ItemCategory ({'category': {'name': ...}})"""
+    while isinstance(value, dict):
+        value = value.get('name') or value.get('category')
+    return ' '.join(str(value).split()) if value else UNCATEGORIZED
+
+
+def pack_columns(entries):
+    """Pack items ({'item': ..., 'quantity', 'worn'}) or plain inventory items as one list per column"""
+    try:
+        rows = [
+            (
+                item.get('weight') or 0, item.get('unit'), entry.get('quantity', 1),
+                entry.get('worn'), item.get('consumable'), category_key(item.get('category'))
+            )
+            for entry in entries
+            for item in (entry['item'] if isinstance(entry.get('item'), dict) else entry,)
+        ]
+    except (AttributeError, TypeError):
+        raise ValueError("Pack items must be objects")
+    return dict(zip(COLUMNS, zip(*rows))) if rows else {'weight': []}
+
+
+def column_arrays(columns):
+    """(grams, quantity, worn, consumable, category codes, category names) for columns of equal length
+
+    Only weight is required: units default to grams, quantities to one,
+    flags to false and categories to Uncategorized. Units and categories are
+    resolved once per distinct value, everything else converts in bulk.
+    Unknown units and negative or non-numeric values raise ValueError.
+    """
+    if not all(isinstance(values, (list, tuple)) for values in columns.values()):
+        raise ValueError("Pack columns must be lists")
+    size = len(columns.get('weight') or ())
+    if any(len(values) != size for values in columns.values()):
+        raise ValueError("Pack columns must all have the same length")
+
+    def column(name, default, dtype):
+        values = columns.get(name)
+        return np.full(size, default, dtype=dtype) if values is None else np.array(values, dtype=dtype)
+
+    try:
+        weights = column('weight', 0, float)
+        quantity = column('quantity', 1, float)
+    except (TypeError, ValueError):
+        raise ValueError("Item weights and quantities must be numbers")
+    if not (np.isfinite(weights).all() and np.isfinite(quantity).all()) or (size and min(weights.min(), quantity.min()) < 0):
+        raise ValueError("Item weights and quantities must be non-negative numbers")
+
+    units = columns.get('unit') or ('g',) * size
+    try:
+        unit_codes = {unit: UNIT_CODES[str(unit or 'g').lower()] for unit in set(units)}
+    except KeyError as e:
+        raise ValueError(f"Unknown weight unit {e.args[0]!r}; expected one of {', '.join(UNIT_GRAMS)}")
+    except TypeError:
+        raise ValueError("Weight units must be strings")
+
+    # Categories are numbered in first-seen order; keys spelled differently but with the same label share a number
+    categories = columns.get('category') or (None,) * size
+    names = {}
+    try:
+        category_codes = {key: names.setdefault(category_label(key), len(names)) for key in dict.fromkeys(categories)}
+    except TypeError:
+        raise ValueError("Categories must be names")
+
+    return (
+        weights * UNIT_FACTORS[np.fromiter(map(unit_codes.__getitem__, units), dtype=np.intp, count=size)],
+        quantity,
+        column('worn', False, bool),
+        column('consumable', False, bool),
+        np.fromiter(map(category_codes.__getitem__, categories), dtype=np.intp, count=size),
+        list(names)
+    )
+
+
+def weight_breakdown(columns, unit='kg'):
+    """Base, worn, consumable and total weight of a pack given as columns, with per-category subtotals, in `unit`
+
+    Matches the WeightBreakdown container: worn items count one of their
+    quantity, consumables count every unit, and base weight is the total
+    less worn and consumable weight. Category subtotals are every unit of
+    the category's items, heaviest category first, with their share of the
+    total in percent.
+    """
+    grams, quantity, worn, consumable, categories, names = column_arrays(columns)
+    line_grams = grams * quantity
+    total = line_grams.sum()
+    worn_grams = grams[worn].sum()
+    consumable_grams = line_grams[consumable].sum()
+
+    subtotals = np.bincount(categories, weights=line_grams, minlength=len(names))
+    counts = np.bincount(categories, minlength=len(names))
+    percentages = subtotals * (100 / total) if total > 0 else np.zeros(len(names))
+    factor = UNIT_GRAMS[unit]
+    order = np.lexsort((np.arange(len(names)), -subtotals))
+
+    return {
+        'unit': unit,
+        'items': len(grams),
+        'base': round(float(total - worn_grams - consumable_grams) / factor, 3),
+        'worn': round(float(worn_grams) / factor, 3),
+        'consumable': round(float(consumable_grams) / factor, 3),
+        'total': round(float(total) / factor, 3),
+        'categories': [
+            {
+                'category': names[code],
+                'items': int(counts[code]),
+                'weight': round(float(subtotals[code]) / factor, 3),
+                'percentage': round(float(percentages[code]), 1)
+            }
+            for code in order
+        ]
+    }
@@ -0,0 +1,123 @@
+import json
+
+from recommendation_cache import category_name
+from tokens import count_tokens
+
+# Same factors as src/lib/weight.ts
+UNIT_GRAMS = {'g': 1, 'kg': 1000, 'oz': 28.3495, 'lb': 453.592}
+
+# Items listed per category, tried in turn until the summary fits the token budget (None lists every item)
+NOTABLE_ITEM_LIMITS = (None, 8, 4, 2, 1, 0)
+
+NO_INVENTORY = "No existing inventory provided"
+
+
+def item_grams(item):
+    weight = item.get('weight')
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+        return None
+    return weight * UNIT_GRAMS.get(str(item.get('unit') or 'g').lower(), 1)
+
+
+def format_grams(grams):
+    return f"{grams:.0f} g" if grams < 1000 else f"{grams / 1000:.2f} kg"
+
+
+def project_item(entry):
+    """The fields the model needs from an inventory item or pack item ({'item': ..., 'quantity', 'worn'})"""
+    item = entry['item'] if isinstance(entry.get('item'), dict) else entry
+    brand = item.get('brand')
+    if isinstance(brand, dict):
+        brand = brand.get('name')
+    quantity = entry.get('quantity')
+    return {
+        'name': ' '.join(str(item.get('name') or item.get('itemname') or 'Unnamed item').split()),
+        'brand': brand or None,
+        'category': category_name(item.get('category')),
+        'grams': item_grams(item),
+        'quantity': quantity if isinstance(quantity, int) and quantity > 1 else 1,
+        'consumable': bool(item.get('consumable')),
+        'worn': bool(entry.get('worn'))
+    }
+
+
+def format_item(item):
+    text = item['name']
+    if item['brand'] and item['brand'].lower() not in text.lower():
+        text += f" ({item['brand']})"
+    if item['grams'] is not None:
+        text += f" {format_grams(item['grams'])}"
+    if item['quantity'] > 1:
+        text += f" x{item['quantity']}"
+    if item['worn']:
+        text += " worn"
+    if item['consumable']:
+        text += " consumable"
+    return text
+
+
+def category_line(category, items, limit):
+    """One line per category: item count, weight range and total, then up to `limit` items, heaviest first"""
+    weights = [item['grams'] for item in items if item['grams'] is not None]
+    line = f"{category}: {len(items)} item{'s' if len(items) != 1 else ''}"
+    if weights:
+        if len(weights) > 1:
+            line += f", {format_grams(min(weights))}-{format_grams(max(weights))} each"
+        line += f", {format_grams(sum(item['grams'] * item['quantity'] for item in items if item['grams'] is not None))} total"
+    listed = items if limit is None else items[:limit]
+    if listed:
+        line += ". " + ("Items: " if limit is None else "Notable: ") + "; ".join(format_item(item) for item in listed)
+    if len(listed) < len(items) and listed:
+        line += f"; +{len(items) - len(listed)} more"
+    return line
+
+
+def compact_inventory(inventory, budget=1500, model='gpt-3.5-turbo'):
+    """Inventory summarized for an LLM prompt within `budget` tokens; returns (text, stats)
+
+    Items are projected to name, brand, weight, quantity and flags and
+    grouped by category. Categories are ordered by total weight and items by
+    weight, then name, so the same inventory always gives the same text.
+    Every item is listed when that fits; otherwise each category lists fewer
+    of its heaviest items, and as a last resort the lightest categories are
+    dropped and counted in a closing line.
+    """
+    entries = [entry for entry in inventory or [] if isinstance(entry, dict)]
+    if not entries:
+        return NO_INVENTORY, {'items': 0, 'categories': 0, 'tokens_before': 0, 'tokens_after': count_tokens(NO_INVENTORY, model)}
+
+    groups = {}
+    for item in map(project_item, entries):
+        groups.setdefault(item['category'], []).append(item)
+    for items in groups.values():
+        items.sort(key=lambda item: (-(item['grams'] or 0), item['name']))
+    categories = sorted(groups, key=lambda category: (-sum((item['grams'] or 0) * item['quantity'] for item in groups[category]), category))
+
+    for limit in NOTABLE_ITEM_LIMITS:
+        lines = [category_line(category, groups[category], limit) for category in categories]
+        text = "\n".join(lines)
+        tokens = count_tokens(text, model)
+        if tokens <= budget:
+            break
+    omitted = 0
+    if tokens > budget:
+        # Keep whole category lines, heaviest categories first, leaving room for the closing line
+        kept, used = [], count_tokens("+999 more categories (99999 items) omitted", model)
+        for line in lines:
+            used += count_tokens(line, model) + 1
+            if used > budget:
+                break
+            kept.append(line)
+        omitted = len(categories) - len(kept)
+        omitted_items = sum(len(groups[category]) for category in categories[len(kept):])
+        text = "\n".join(kept + [f"+{omitted} more categories ({omitted_items} items) omitted"])
+        tokens = count_tokens(text, model)
+
+    return text, {
+        'items': len(entries),
+        'categories': len(categories),
+        'items_per_category': limit,
+        'omitted_categories': omitted,
+        'tokens_before': count_tokens(json.dumps(inventory), model),
+        'tokens_after': tokens
+    }
@@ -0,0 +1,127 @@
+import json
+import hashlib
+import threading
+
+# Bookkeeping fields that change without changing what the user owns
+VOLATILE_ITEM_FIELDS = frozenset(('id', 'user_id', 'created_at', 'updated_at', 'sort_order'))
+
+UNCATEGORIZED = 'uncategorized'
+
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def content_hash(value):
+    return hashlib.sha256(canonical_json(value).encode('utf-8')).hexdigest()
+
+
+def category_name(value):
+    """Lowercased category name from a string, {'name': ...} or an inventory ItemCategory ({'category': {'name': ...}})"""
+    if isinstance(value, dict):
+        value = value.get('name') or category_name(value.get('category'))
+    return ' '.join(str(value).lower().split()) if value else UNCATEGORIZED
+
+
+def inventory_by_category(inventory):
+    """Inventory items grouped by category name, without volatile fields and in a stable order"""
+    groups = {}
+    for item in inventory or []:
+        if not isinstance(item, dict):
+            item = {'name': item}
+        # Pack items ({'item': ..., 'quantity', 'worn'}) carry the category on the wrapped item
+        source = item['item'] if isinstance(item.get('item'), dict) else item
+        groups.setdefault(category_name(source.get('category')), []).append(
+            {key: value for key, value in item.items() if key not in VOLATILE_ITEM_FIELDS}
+        )
+    return {category: sorted(items, key=canonical_json) for category, items in groups.items()}
+
+
+def merge_recommendations(previous, update, categories):
+    """Previous recommendations with every entry in `categories` replaced by those from update
+
+    Each list-valued section keeps the previous entries outside the given
+    categories and appends the update's entries. Entries are recommendations
+    with a `category` field or {'category', 'items'} groups; entries without
+    a category are kept from the previous result.
+    """
+    merged = dict(previous)
+    for section, entries in update.items():
+        kept = previous.get(section)
+        if not isinstance(entries, list) or not isinstance(kept, list):
+            merged.setdefault(section, entries)
+            continue
+        merged[section] = [
+            entry for entry in kept
+            if not (isinstance(entry, dict) and 'category' in entry and category_name(entry['category']) in categories)
+        ] + entries
+    return merged
+
+
+class RecommendationCache:
+    """/user-recommendations results keyed by a content hash of their inputs
+
+    The context (user profile, trip parameters and weather) and each
+    inventory category are hashed separately. A request whose hashes all
+    match a stored result is a hit. A request whose context matches the
+    latest result for that context, but whose inventory differs in at most
+    `max_partial_categories` categories, re-queries just those categories
+    and reuses the rest. invalidate() drops everything by bumping a
+    generation number that is part of every key, which works on any cache
+    backend. The generation is kept in `generations` (a Storage), not in
+    the cache, so eviction can never reset it and revive stale results.
+    """
+
+    def __init__(self, cache, generations, ttl=86400, max_partial_categories=3, key_prefix='recommendations:'):
+        self.cache = cache
+        self.generations = generations
+        self.ttl = ttl
+        self.max_partial_categories = max_partial_categories
+        self.key_prefix = key_prefix
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'partial_hits': 0, 'misses': 0}
+
+    def _key(self, generation, kind, digest):
+        return f"{self.key_prefix}{generation}:{kind}:{digest}"
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def lookup(self, context_hash, fingerprints):
+        """(recommendations, None) on a hit, (previous, changed categories) for a partial re-query, else (None, None)"""
+        generation = self.generations.generation(self.key_prefix)
+        recommendations = self.cache.get(self._key(generation, 'result', content_hash([context_hash, fingerprints])))
+        if recommendations is not None:
+            self._count('hits')
+            return recommendations, None
+
+        latest = self.cache.get(self._key(generation, 'context', context_hash))
+        if latest is not None:
+            previous = latest['fingerprints']
+            changed = {category for category in set(previous) | set(fingerprints) if previous.get(category) != fingerprints.get(category)}
+            if changed and len(changed) <= self.max_partial_categories:
+                self._count('partial_hits')
+                return latest['recommendations'], changed
+        self._count('misses')
+        return None, None
+
+    def store(self, context_hash, fingerprints, recommendations):
+        generation = self.generations.generation(self.key_prefix)
+        self.cache.set(self._key(generation, 'result', content_hash([context_hash, fingerprints])), recommendations, self.ttl)
+        self.cache.set(
+            self._key(generation, 'context', context_hash),
+            {'fingerprints': fingerprints, 'recommendations': recommendations},
+            self.ttl
+        )
+
+    def invalidate(self):
+        """Drop every cached result"""
+        self.generations.bump_generation(self.key_prefix)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total = sum(stats.values())
+        stats['hit_rate'] = round((stats['hits'] + stats['partial_hits']) / total, 3) if total else 0.0
+        return stats
@@ -0,0 +1,116 @@
+import time
+import json
+import asyncio
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class RetailerProvider:
+    """Base class for retailers that take part in multi-retailer searches such as /compare-prices
+
+    Subclasses set `name` (used as the key in combined responses) and implement
+    search_products(keywords, category, max_results), returning a dict with
+    'success' and 'products' keys.
+    """
+
+    name = None
+    default_category = None
+    # Fingerprint of credentials a user saved for this client; None for the server's shared client
+    credential_scope = None
+
+    def search_products(self, keywords, category=None, max_results=10):
+        raise NotImplementedError
+
+    async def async_search_products(self, keywords, category=None, max_results=10):
+        """Async search used by the ASGI mode; providers without a native async client run in a thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.search_products, keywords, category, max_results))
+
+
+def credential_fingerprint(*parts):
+    """Short stable hash identifying a set of (non-secret) credential parts, for cache and single-flight keys"""
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class RetailerRegistry:
+    """Registered retailer providers, keyed by provider name"""
+
+    def __init__(self):
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def register(self, provider):
+        """Add a provider, replacing any previously registered provider with the same name"""
+        with self._lock:
+            self._providers[provider.name] = provider
+
+    def providers(self):
+        with self._lock:
+            return list(self._providers.values())
+
+
+class RetailerFanOut:
+    """Queries several retailer providers concurrently under one overall deadline"""
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='retailer')
+
+    def _timed_call(self, search_fn, provider):
+        started = time.monotonic()
+        try:
+            return search_fn(provider), None, time.monotonic() - started
+        except Exception as e:
+            return None, str(e), time.monotonic() - started
+
+    def search(self, providers, search_fn, deadline):
+        """Run search_fn(provider) for every provider and wait at most `deadline` seconds.
+
+        Returns (results, status): results maps provider name to its product list
+        (empty when the provider failed or missed the deadline) and status maps
+        provider name to {'status': 'ok' | 'error' | 'timeout', 'duration_ms', ...}.
+        Providers that miss the deadline keep running in the background so their
+        results can still populate the response cache.
+        """
+        futures = {provider.name: self._executor.submit(self._timed_call, search_fn, provider) for provider in providers}
+        done, _ = wait(futures.values(), timeout=deadline)
+
+        outcomes = {name: future.result() if future in done else None for name, future in futures.items()}
+        return self._collect(outcomes, deadline)
+
+    async def async_search(self, providers, search_fn, deadline):
+        """Event-loop variant of search(): search_fn(provider) returns an awaitable"""
+        async def timed_call(provider):
+            started = time.monotonic()
+            try:
+                return await search_fn(provider), None, time.monotonic() - started
+            except Exception as e:
+                return None, str(e), time.monotonic() - started
+
+        tasks = {provider.name: asyncio.ensure_future(timed_call(provider)) for provider in providers}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=deadline)
+        outcomes = {name: task.result() if task.done() else None for name, task in tasks.items()}
+        return self._collect(outcomes, deadline)
+
+    def _collect(self, outcomes, deadline):
+        results = {}
+        status = {}
+        for name, outcome in outcomes.items():
+            results[name] = []
+            if outcome is None:
+                status[name] = {'status': 'timeout', 'duration_ms': round(deadline * 1000, 1)}
+                continue
+
+            provider_results, error, duration = outcome
+            duration_ms = round(duration * 1000, 1)
+            if error is not None:
+                status[name] = {'status': 'error', 'error': error, 'duration_ms': duration_ms}
+            elif not provider_results.get('success', False):
+                status[name] = {'status': 'error', 'error': provider_results.get('error'), 'duration_ms': duration_ms}
+            else:
+                results[name] = provider_results.get('products', [])
+                status[name] = {'status': 'ok', 'count': len(results[name]), 'duration_ms': duration_ms}
+
+        return results, status
@@ -0,0 +1,156 @@
+import re
+import time
+import zlib
+import threading
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+
+QUESTION_STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'with', 'of', 'in', 'on', 'to', 'by', 'or', 'at', 'from', 'about',
+    'what', 'which', 'how', 'why', 'when', 'where', 'who', 'is', 'are', 'was', 'be', 'do', 'does', 'did',
+    'can', 'could', 'should', 'would', 'will', 'i', 'me', 'my', 'we', 'our', 'you', 'your', 'it', 'its',
+    'this', 'that', 'these', 'those', 'there', 'any', 'some', 'please', 'thanks', 'tell', 'know', 'need',
+    'best', 'good', 'recommend', 'get', 'use', 'im', "i'm", 'so', 'if', 'than', 'then', 'much', 'many'
+}
+
+
+def question_tokens(text):
+    """Lowercased content words of a chat question, dropping stopwords and punctuation"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        token = token.replace("'", '')
+        if token not in QUESTION_STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+class HashedTfidfVectorizer:
+    """Offline text embedding: unigrams and bigrams hashed into a fixed number of dimensions
+
+    Term frequencies are log-scaled here; inverse document frequencies are
+    applied by the index from the questions it holds, so no vocabulary or
+    model has to be fitted or downloaded up front.
+    """
+
+    def __init__(self, dimensions=2048):
+        self.dimensions = dimensions
+
+    def transform(self, text):
+        tokens = question_tokens(text)
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            vector[zlib.crc32(feature.encode('utf-8')) % self.dimensions] += 1.0
+        return np.log1p(vector, out=vector)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of chat answers over an in-memory NumPy index
+
+    Questions are stored as hashed term-frequency rows in a preallocated
+    capacity x dimensions float32 matrix. A lookup weights the query and every
+    row by the current IDF, takes the cosine similarity against all live rows
+    in one matrix-vector product and returns the best answer at or above
+    `threshold`. Rows expire after `ttl` seconds; when full, the least
+    recently used row is replaced.
+    """
+
+    def __init__(self, threshold=0.85, capacity=1000, ttl=86400, vectorizer=None):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.vectorizer = vectorizer or HashedTfidfVectorizer()
+        dimensions = self.vectorizer.dimensions
+        self._tf = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._row_norms = None  # IDF-weighted row norms, recomputed after the index changes
+        self._document_frequency = np.zeros(dimensions, dtype=np.float32)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._live = np.zeros(capacity, dtype=bool)
+        self._answers = [None] * capacity
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        self._hit_similarity = 0.0
+
+    def _idf(self):
+        documents = int(self._live.sum())
+        return np.log((documents + 1) / (self._document_frequency + 1)).astype(np.float32) + 1.0
+
+    def _release(self, slot):
+        self._document_frequency -= self._tf[slot] > 0
+        self._tf[slot] = 0
+        self._row_norms = None
+        self._live[slot] = False
+        self._answers[slot] = None
+
+    def _expire(self, now):
+        expired = np.flatnonzero(self._live & (self._expires_at < now))
+        for slot in expired:
+            self._release(slot)
+        self._stats['expired'] += len(expired)
+
+    def get(self, question):
+        """Return (answer, similarity) for the closest cached question, or (None, similarity)"""
+        query = self.vectorizer.transform(question)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if not query.any() or not self._live.any():
+                self._stats['misses'] += 1
+                return None, 0.0
+
+            idf = self._idf()
+            weighted_query = query * idf
+            query_norm = float(np.linalg.norm(weighted_query))
+            if self._row_norms is None:
+                self._row_norms = np.sqrt(np.square(self._tf) @ (idf * idf))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                similarity = (self._tf @ (weighted_query * idf)) / (self._row_norms * query_norm)
+            similarity[~self._live] = -1.0
+
+            slot = int(np.argmax(similarity))
+            best = float(similarity[slot])
+            if best < self.threshold:
+                self._stats['misses'] += 1
+                return None, max(best, 0.0)
+
+            self._stats['hits'] += 1
+            self._hit_similarity += best
+            self._last_used[slot] = now
+            return self._answers[slot], best
+
+    def set(self, question, answer):
+        tf = self.vectorizer.transform(question)
+        if not tf.any():
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            free = np.flatnonzero(~self._live)
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._release(slot)
+                self._stats['evictions'] += 1
+            self._tf[slot] = tf
+            self._row_norms = None
+            self._document_frequency += tf > 0
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._live[slot] = True
+            self._answers[slot] = answer
+
+    def clear(self):
+        with self._lock:
+            for slot in np.flatnonzero(self._live):
+                self._release(slot)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=int(self._live.sum()), capacity=self.capacity, threshold=self.threshold)
+            stats['avg_hit_similarity'] = round(self._hit_similarity / stats['hits'], 3) if stats['hits'] else 0.0
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
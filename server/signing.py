@@ -0,0 +1,103 @@
+import hmac
+import base64
+import hashlib
+from collections import namedtuple
+
+Credentials = namedtuple('Credentials', ['key_id', 'secret'])
+
+
+class RequestSigner:
+    """Base class for request signers
+
+    Credentials are fixed for the signer's lifetime; they are kept together
+    with a cache of keys derived from the secret. Users with their own
+    credentials get their own client and signer.
+    """
+
+    def __init__(self, key_id=None, secret=None):
+        self._state = (Credentials(key_id, secret), {})
+
+    @property
+    def credentials(self):
+        return self._state[0]
+
+    @property
+    def configured(self):
+        credentials = self._state[0]
+        return bool(credentials.key_id and credentials.secret)
+
+
+class SigV4Signer(RequestSigner):
+    """AWS Signature Version 4 signer for one region/service, used by the Amazon PA-API client
+
+    The four-step HMAC chain that derives the signing key depends only on the
+    secret, the date, the region and the service, so it is computed once per
+    day rather than on every request. Canonical header lines for headers that
+    never change (content-encoding, host) are precomputed as well.
+    """
+
+    algorithm = 'AWS4-HMAC-SHA256'
+
+    def __init__(self, key_id, secret, region, service, static_headers=None):
+        super().__init__(key_id, secret)
+        self.region = region
+        self.service = service
+        self._static_lines = {name.lower(): f"{name.lower()}:{str(value).strip()}\n" for name, value in (static_headers or {}).items()}
+
+    def _signing_key(self, derived_keys, secret, date):
+        key = derived_keys.get(date)
+        if key is None:
+            k_date = hmac.new(f'AWS4{secret}'.encode('utf-8'), date.encode('utf-8'), hashlib.sha256).digest()
+            k_region = hmac.new(k_date, self.region.encode('utf-8'), hashlib.sha256).digest()
+            k_service = hmac.new(k_region, self.service.encode('utf-8'), hashlib.sha256).digest()
+            key = hmac.new(k_service, b'aws4_request', hashlib.sha256).digest()
+            # Only today's (and around midnight, yesterday's) key is ever needed
+            if len(derived_keys) >= 2:
+                derived_keys.clear()
+            derived_keys[date] = key
+        return key
+
+    def sign(self, method, path, timestamp, payload=b'', headers=None, query=''):
+        """Return the Authorization header value for a request.
+
+        `headers` holds the per-request headers to sign (e.g. x-amz-date and
+        x-amz-target) in addition to the static headers given at construction.
+        """
+        credentials, derived_keys = self._state
+        date = timestamp[:8]
+
+        lines = dict(self._static_lines)
+        for name, value in (headers or {}).items():
+            name = name.lower()
+            lines[name] = f"{name}:{str(value).strip()}\n"
+        names = sorted(lines)
+        canonical_headers = ''.join([lines[name] for name in names])
+        signed_headers = ';'.join(names)
+
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        canonical_request = f"{method}\n{path}\n{query}\n{canonical_headers}\n{signed_headers}\n{payload_hash}"
+
+        credential_scope = f"{date}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = f"{self.algorithm}\n{timestamp}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+
+        signing_key = self._signing_key(derived_keys, credentials.secret, date)
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        return f"{self.algorithm} Credential={credentials.key_id}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
+
+
+class HmacSigner(RequestSigner):
+    """HMAC-SHA256 signer for the Walmart affiliate API's consumer id + timestamp scheme
+
+    The encoded secret is cached with the credentials and each signature is a
+    single one-shot hmac.digest() call.
+    """
+
+    def sign(self, timestamp):
+        """Return (consumer_id, base64 signature) for a request made at `timestamp`"""
+        credentials, derived = self._state
+        key = derived.get('key')
+        if key is None:
+            key = derived['key'] = credentials.secret.encode('utf-8')
+        digest = hmac.digest(key, f"{credentials.key_id}\n{timestamp}\n".encode('utf-8'), 'sha256')
+        return credentials.key_id, base64.b64encode(digest).decode()
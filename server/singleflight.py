@@ -0,0 +1,97 @@
+import json
+import asyncio
+import hashlib
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one execution
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive with the same key while it is in flight wait for it and receive
+    the same result or exception. Nothing is kept once the call finishes, so
+    this complements rather than replaces the response cache.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def do(self, namespace, key, fn):
+        key = (namespace, key)
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {'calls': 0, 'executions': 0, 'coalesced': 0})
+            counters['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                counters['executions'] += 1
+            else:
+                counters['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                namespace: dict(counters, coalescing_ratio=round(counters['coalesced'] / counters['calls'], 3) if counters['calls'] else 0.0)
+                for namespace, counters in self._stats.items()
+            }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Event-loop variant of SingleFlight for the ASGI serving mode; fn() returns an awaitable"""
+
+    async def do(self, namespace, key, fn):
+        key = (namespace, key)
+        counters = self._stats.setdefault(namespace, {'calls': 0, 'executions': 0, 'coalesced': 0})
+        counters['calls'] += 1
+        future = self._calls.get(key)
+        if future is not None:
+            counters['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        counters['executions'] += 1
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._calls[key]
+
+
+def flight_key(*parts):
+    """Stable digest of JSON-serializable call arguments"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
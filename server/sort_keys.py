@@ -0,0 +1,61 @@
+import bisect
+
+
+def increasing_run(keys):
+    """Positions of a longest strictly increasing subsequence of keys; None keys are never part of it"""
+    tails, tail_positions, previous = [], [], [None] * len(keys)
+    for position, key in enumerate(keys):
+        if key is None:
+            continue
+        i = bisect.bisect_left(tails, key)
+        if i == len(tails):
+            tails.append(key)
+            tail_positions.append(position)
+        else:
+            tails[i] = key
+            tail_positions[i] = position
+        previous[position] = tail_positions[i - 1] if i else None
+    run = []
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        run.append(position)
+        position = previous[position]
+    return run[::-1]
+
+
+def normal_key(key):
+    return int(key) if key == int(key) else key
+
+
+def sort_key_changes(ids, keys):
+    """{id: new sort key} for the fewest rows that put `ids` in list order, given their current `keys`
+
+    The longest run of ids whose keys already increase keeps its keys;
+    every other id gets a fractional key spaced between its kept
+    neighbours, so moving one row rewrites only that row. Repeatedly
+    splitting the same gap eventually runs out of float precision, and
+    then the whole list is renumbered from its lowest key.
+    """
+    kept = increasing_run(keys)
+    new = list(keys)
+    bounds = [-1, *kept, len(ids)]
+    for start, end in zip(bounds, bounds[1:]):
+        count = end - start - 1
+        if not count:
+            continue
+        low = keys[start] if start >= 0 else None
+        high = keys[end] if end < len(ids) else None
+        if low is None and high is None:
+            low, high = -1, count
+        elif low is None:
+            low = high - count - 1
+        elif high is None:
+            high = low + count + 1
+        step = (high - low) / (count + 1)
+        for offset in range(1, count + 1):
+            new[start + offset] = normal_key(low + step * offset)
+
+    if any(key >= following for key, following in zip(new, new[1:])):
+        base = min((key for key in keys if key is not None), default=0)
+        new = [normal_key(base + position) for position in range(len(ids))]
+    return {id: key for id, key, old in zip(ids, new, keys) if key != old}
@@ -0,0 +1,487 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import secrets
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from sort_keys import sort_key_changes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL COLLATE NOCASE UNIQUE,
+    email TEXT NOT NULL COLLATE NOCASE UNIQUE,
+    password_hash TEXT NOT NULL,
+    settings TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS auth_tokens (
+    token_hash TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trips (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    location TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    notes TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    sort_order INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (user_id, name_key)
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER REFERENCES categories (id),
+    name TEXT NOT NULL,
+    brand TEXT,
+    product TEXT,
+    weight REAL,
+    unit TEXT NOT NULL DEFAULT 'g',
+    price REAL,
+    consumable INTEGER NOT NULL DEFAULT 0,
+    product_url TEXT,
+    notes TEXT,
+    sort_order INTEGER,
+    import_key TEXT,
+    import_digest TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS packs (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    trip_id INTEGER REFERENCES trips (id) ON DELETE SET NULL,
+    title TEXT NOT NULL,
+    sort_order INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pack_items (
+    id INTEGER PRIMARY KEY,
+    pack_id INTEGER NOT NULL REFERENCES packs (id) ON DELETE CASCADE,
+    item_id INTEGER NOT NULL REFERENCES items (id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    worn INTEGER NOT NULL DEFAULT 0,
+    checked INTEGER NOT NULL DEFAULT 0,
+    sort_order INTEGER
+);
+CREATE TABLE IF NOT EXISTS generations (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS auth_tokens_user ON auth_tokens (user_id);
+CREATE INDEX IF NOT EXISTS trips_user_start ON trips (user_id, start_date);
+CREATE INDEX IF NOT EXISTS items_user_category_sort ON items (user_id, category_id, sort_order);
+CREATE INDEX IF NOT EXISTS items_user_sort ON items (user_id, sort_order);
+CREATE UNIQUE INDEX IF NOT EXISTS items_user_import_key ON items (user_id, import_key) WHERE import_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS packs_user_trip ON packs (user_id, trip_id, sort_order);
+CREATE INDEX IF NOT EXISTS pack_items_pack_sort ON pack_items (pack_id, sort_order);
+CREATE INDEX IF NOT EXISTS pack_items_item ON pack_items (item_id);
+"""
+
+# Per-user settings stored as JSON, with the values new users start with
+USER_SETTINGS = (
+    'unit_weight', 'unit_distance', 'currency', 'openai_api_key', 'amazon_access_key', 'amazon_secret_key',
+    'amazon_associate_tag', 'walmart_client_id', 'walmart_client_secret'
+)
+DEFAULT_SETTINGS = {'unit_weight': 'METRIC', 'unit_distance': 'KILOMETERS', 'currency': 'USD'}
+
+PASSWORD_ITERATIONS = 260000
+
+# Item and trip fields that callers write, in column order
+ITEM_FIELDS = ('category_id', 'name', 'brand', 'product', 'weight', 'unit', 'price', 'consumable', 'product_url', 'notes')
+ITEM_DEFAULTS = {'unit': 'g', 'consumable': False}
+TRIP_FIELDS = ('title', 'location', 'start_date', 'end_date', 'notes')
+
+# Columns streamed by iter_export(); pack exports add quantity and worn
+EXPORT_COLUMNS = (
+    'i.id, i.name, i.brand, i.product, c.name AS category, i.weight, i.unit, i.price, '
+    'i.consumable, i.product_url, i.notes, i.sort_order'
+)
+
+# SQLite's default limit on bound parameters is 999
+MAX_QUERY_PARAMETERS = 900
+
+# Statements are kept as constants so each connection's prepared statement cache keeps hitting them
+INSERT_ITEM = (
+    f"INSERT INTO items (user_id, {', '.join(ITEM_FIELDS)}, sort_order, import_key, import_digest, created_at, updated_at) "
+    f"VALUES ({', '.join('?' * (len(ITEM_FIELDS) + 6))})"
+)
+SELECT_ITEMS = (
+    "SELECT i.id, i.user_id, i.category_id, c.name AS category, i.name, i.brand, i.product, i.weight, i.unit, i.price, "
+    "i.consumable, i.product_url, i.notes, i.sort_order, i.created_at, i.updated_at "
+    "FROM items i LEFT JOIN categories c ON c.id = i.category_id"
+)
+SELECT_TOKEN_USER = 'SELECT user_id FROM auth_tokens WHERE token_hash = ?'
+# Sortable table -> (name in errors, statement writing one row's sort key)
+SORTABLE = {
+    'items': ('item', 'UPDATE items SET sort_order = :sort_order, updated_at = :now WHERE id = :id'),
+    'categories': ('category', 'UPDATE categories SET sort_order = :sort_order WHERE id = :id')
+}
+
+
+def chunked(values, size=MAX_QUERY_PARAMETERS):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def hash_password(password, iterations=PASSWORD_ITERATIONS):
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('ascii'), iterations).hex()
+    return f"pbkdf2_sha256${iterations}${salt}${digest}"
+
+
+def check_password(password, stored):
+    try:
+        _, iterations, salt, digest = stored.split('$')
+        candidate = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('ascii'), int(iterations)).hex()
+    except ValueError:
+        return False
+    return hmac.compare_digest(candidate, digest)
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class Storage:
+    """Users, trips, inventory items, categories and packs in a local SQLite database
+
+    Every thread keeps its own connection, opened on first use and reused
+    for the life of the thread (and reopened after a fork), so request
+    threads never share or wait for a connection. Connections run in WAL
+    mode, so readers do not block the single writer, and keep a cache of
+    prepared statements. Writes go through transaction(), which takes the
+    write lock up front with BEGIN IMMEDIATE; bulk paths write a whole
+    batch in one transaction with executemany.
+
+    Weights are stored in grams; `unit` keeps the unit the item was entered
+    in for display. Imported items carry an `import_key` (see
+    inventory_import.import_key) and a digest of their imported fields, so
+    a re-import can tell new, changed and unchanged rows apart with one
+    indexed lookup per batch. Auth tokens are stored as SHA-256 hashes.
+    """
+
+    def __init__(self, path, cache_size_kb=8192, statement_cache=256, password_iterations=PASSWORD_ITERATIONS):
+        self.path = path
+        self.password_iterations = password_iterations
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = 0
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False, cached_statements=self.statement_cache
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.executescript(SCHEMA)
+        with self._lock:
+            self._connections += 1
+        return conn
+
+    @property
+    def db(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self.connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def stats(self):
+        with self._lock:
+            return {'connections_opened': self._connections}
+
+    # Cache generations
+
+    def generation(self, name):
+        """Current value of a named generation counter (0 until first bumped)"""
+        row = self.db.execute('SELECT value FROM generations WHERE name = ?', (name,)).fetchone()
+        return row['value'] if row else 0
+
+    def bump_generation(self, name):
+        """Increment a named generation counter; returns the new value"""
+        with self.transaction() as db:
+            db.execute(
+                'INSERT INTO generations (name, value) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET value = value + 1', (name,)
+            )
+            return db.execute('SELECT value FROM generations WHERE name = ?', (name,)).fetchone()['value']
+
+    # Users
+
+    def create_user(self, username, email, password):
+        """The new user, or ValueError when the username or email is taken"""
+        now = time.time()
+        try:
+            with self.transaction() as db:
+                user_id = db.execute(
+                    'INSERT INTO users (username, email, password_hash, settings, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (username, email, hash_password(password, self.password_iterations), json.dumps(DEFAULT_SETTINGS), now, now)
+                ).lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError("Username or email already registered")
+        return self.get_user(user_id)
+
+    def authenticate(self, login, password):
+        """The user with this username or email and password, or None"""
+        row = self.db.execute('SELECT id, password_hash FROM users WHERE username = ? OR email = ?', (login, login)).fetchone()
+        if row is None or not check_password(password, row['password_hash']):
+            return None
+        return self.get_user(row['id'])
+
+    def create_token(self, user_id):
+        token = secrets.token_urlsafe(32)
+        self.db.execute('INSERT INTO auth_tokens (token_hash, user_id, created_at) VALUES (?, ?, ?)', (token_hash(token), user_id, time.time()))
+        return token
+
+    def user_id_for_token(self, token):
+        row = self.db.execute(SELECT_TOKEN_USER, (token_hash(token),)).fetchone()
+        return row['user_id'] if row else None
+
+    def get_user(self, user_id):
+        """User fields and settings, without the password hash, or None"""
+        row = self.db.execute('SELECT id, username, email, settings, created_at, updated_at FROM users WHERE id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = dict(DEFAULT_SETTINGS, **json.loads(row['settings']))
+        user.update(id=row['id'], username=row['username'], email=row['email'], created_at=row['created_at'], updated_at=row['updated_at'])
+        return user
+
+    def update_settings(self, user_id, settings):
+        """Merge the USER_SETTINGS keys of `settings` into the user's settings; returns the updated user"""
+        with self.transaction() as db:
+            row = db.execute('SELECT settings FROM users WHERE id = ?', (user_id,)).fetchone()
+            if row is None:
+                return None
+            merged = json.loads(row['settings'])
+            merged.update((key, value) for key, value in settings.items() if key in USER_SETTINGS)
+            db.execute('UPDATE users SET settings = ?, updated_at = ? WHERE id = ?', (json.dumps(merged), time.time(), user_id))
+        return self.get_user(user_id)
+
+    # Trips
+
+    def create_trip(self, user_id, trip):
+        now = time.time()
+        return self.db.execute(
+            f"INSERT INTO trips (user_id, {', '.join(TRIP_FIELDS)}, created_at, updated_at) VALUES ({', '.join('?' * (len(TRIP_FIELDS) + 3))})",
+            (user_id, *(trip.get(field) for field in TRIP_FIELDS), now, now)
+        ).lastrowid
+
+    def list_trips(self, user_id):
+        rows = self.db.execute('SELECT * FROM trips WHERE user_id = ? ORDER BY start_date, id', (user_id,))
+        return [dict(row) for row in rows]
+
+    # Categories and items
+
+    def category_ids(self, user_id, names):
+        """Category IDs by lowercased name for the given names, creating categories that do not exist yet"""
+        names = {' '.join(name.split()).lower(): ' '.join(name.split()) for name in names if name and name.strip()}
+        if not names:
+            return {}
+        ids = {}
+        with self.transaction() as db:
+            db.executemany(
+                'INSERT OR IGNORE INTO categories (user_id, name, name_key, sort_order) '
+                'VALUES (?, ?, ?, (SELECT COALESCE(MAX(sort_order), -1) + 1 FROM categories WHERE user_id = ?))',
+                [(user_id, name, key, user_id) for key, name in names.items()]
+            )
+            for keys in chunked(names):
+                rows = db.execute(
+                    f"SELECT id, name_key FROM categories WHERE user_id = ? AND name_key IN ({','.join('?' * len(keys))})",
+                    [user_id, *keys]
+                )
+                ids.update((row['name_key'], row['id']) for row in rows)
+        return ids
+
+    def create_items(self, user_id, items):
+        """Insert items (dicts with any of ITEM_FIELDS) in one transaction, appended in order; returns their IDs"""
+        now = time.time()
+        with self.transaction() as db:
+            sort_order = self.next_sort_order(user_id)
+            last_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM items').fetchone()[0]
+            db.executemany(INSERT_ITEM, [
+                (user_id, *(item.get(field, ITEM_DEFAULTS.get(field)) for field in ITEM_FIELDS), sort_order + i, None, None, now, now)
+                for i, item in enumerate(items)
+            ])
+            # Inside the write transaction new rows take the IDs after the previous maximum
+            return [row[0] for row in db.execute('SELECT id FROM items WHERE id > ? ORDER BY id', (last_id,))]
+
+    def update_items(self, user_id, updates):
+        """Apply {'id': ..., field: value} updates in one transaction; updates setting the same fields share one statement"""
+        now = time.time()
+        groups = {}
+        for update in updates:
+            fields = tuple(field for field in ITEM_FIELDS if field in update)
+            groups.setdefault(fields, []).append((*(update[field] for field in fields), now, update['id'], user_id))
+        changed = 0
+        with self.transaction() as db:
+            for fields, rows in groups.items():
+                assignments = ''.join(f'{field} = ?, ' for field in fields)
+                changed += db.executemany(f"UPDATE items SET {assignments}updated_at = ? WHERE id = ? AND user_id = ?", rows).rowcount
+        return changed
+
+    def list_items(self, user_id, category_id=None):
+        """A user's items, by category then sort order (straight off the (user_id, category_id, sort_order) index)"""
+        if category_id is None:
+            rows = self.db.execute(f"{SELECT_ITEMS} WHERE i.user_id = ? ORDER BY i.category_id, i.sort_order", (user_id,))
+        else:
+            rows = self.db.execute(f"{SELECT_ITEMS} WHERE i.user_id = ? AND i.category_id = ? ORDER BY i.sort_order", (user_id, category_id))
+        return [dict(row) for row in rows]
+
+    def get_item(self, user_id, item_id):
+        row = self.db.execute(f"{SELECT_ITEMS} WHERE i.id = ? AND i.user_id = ?", (item_id, user_id)).fetchone()
+        return dict(row) if row else None
+
+    def imported(self, user_id, keys):
+        """{import_key: (item id, import digest)} for the keys this user already has"""
+        found = {}
+        for chunk in chunked(keys):
+            rows = self.db.execute(
+                f"SELECT id, import_key, import_digest FROM items WHERE user_id = ? AND import_key IN ({','.join('?' * len(chunk))})",
+                [user_id, *chunk]
+            )
+            found.update((row['import_key'], (row['id'], row['import_digest'])) for row in rows)
+        return found
+
+    def next_sort_order(self, user_id):
+        row = self.db.execute('SELECT COALESCE(MAX(sort_order), -1) + 1 FROM items WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0]
+
+    def write_imported(self, user_id, inserts, updates):
+        """Insert and update imported items in one transaction
+
+        inserts are item dicts with ITEM_FIELDS plus sort_order, import_key
+        and import_digest; updates are the same with the item `id` instead
+        of a sort order.
+        """
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(INSERT_ITEM, [
+                (user_id, *(item[field] for field in ITEM_FIELDS), item['sort_order'], item['import_key'], item['import_digest'], now, now)
+                for item in inserts
+            ])
+            db.executemany(
+                f"UPDATE items SET {', '.join(f'{field} = ?' for field in ITEM_FIELDS)}, import_digest = ?, updated_at = ? "
+                "WHERE id = ? AND user_id = ?",
+                [(*(item[field] for field in ITEM_FIELDS), item['import_digest'], now, item['id'], user_id) for item in updates]
+            )
+
+    def count(self, user_id):
+        return self.db.execute('SELECT COUNT(*) FROM items WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+    def reorder_items(self, user_id, ids):
+        """Put a user's items in the order of `ids`; returns [{'id', 'sort_order'}] for the rows that changed"""
+        return self._reorder('items', user_id, ids)
+
+    def reorder_categories(self, user_id, ids):
+        """Put a user's categories in the order of `ids`; returns [{'id', 'sort_order'}] for the rows that changed"""
+        return self._reorder('categories', user_id, ids)
+
+    def _reorder(self, table, user_id, ids):
+        # A full or partial ordering: only the listed rows' order relative to each other is set
+        if len(set(ids)) != len(ids):
+            raise ValueError("Each ID may appear only once")
+        name, statement = SORTABLE[table]
+        now = time.time()
+        with self.transaction() as db:
+            current = {}
+            for chunk in chunked(ids):
+                rows = db.execute(
+                    f"SELECT id, sort_order FROM {table} WHERE user_id = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [user_id, *chunk]
+                )
+                current.update((row['id'], row['sort_order']) for row in rows)
+            missing = [id for id in ids if id not in current]
+            if missing:
+                raise ValueError(f"Unknown {name} IDs: {', '.join(map(str, missing[:20]))}")
+            changes = sort_key_changes(ids, [current[id] for id in ids])
+            db.executemany(statement, [{'sort_order': key, 'now': now, 'id': id} for id, key in changes.items()])
+        return [{'id': id, 'sort_order': key} for id, key in changes.items()]
+
+    # Packs
+
+    def create_pack(self, user_id, title, trip_id=None, items=()):
+        """A new pack with its items ({'item_id', 'quantity', 'worn'}) in list order; returns its ID"""
+        now = time.time()
+        with self.transaction() as db:
+            pack_id = db.execute(
+                'INSERT INTO packs (user_id, trip_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (user_id, trip_id, title, now, now)
+            ).lastrowid
+            db.executemany(
+                'INSERT INTO pack_items (pack_id, item_id, quantity, worn, sort_order) '
+                'SELECT ?, id, ?, ?, ? FROM items WHERE id = ? AND user_id = ?',
+                [(pack_id, item.get('quantity', 1), bool(item.get('worn')), i, item['item_id'], user_id) for i, item in enumerate(items)]
+            )
+        return pack_id
+
+    def pack_exists(self, user_id, pack_id):
+        return self.db.execute('SELECT 1 FROM packs WHERE id = ? AND user_id = ?', (pack_id, user_id)).fetchone() is not None
+
+    def iter_export(self, user_id, pack_id=None, batch_size=500):
+        """Rows of a user's inventory, or of one of their packs, in sort order, fetched `batch_size` at a time
+
+        Uses its own connection, so an export that is streamed slowly or
+        abandoned never holds a statement open on the thread's shared
+        connection. Ordering follows the (user_id, sort_order) and
+        (pack_id, sort_order) indexes, so rows arrive without a sort step.
+        """
+        conn = self.connect()
+        try:
+            if pack_id is None:
+                cursor = conn.execute(
+                    f"SELECT {EXPORT_COLUMNS} FROM items i LEFT JOIN categories c ON c.id = i.category_id "
+                    "WHERE i.user_id = ? ORDER BY i.sort_order, i.id",
+                    (user_id,)
+                )
+            else:
+                cursor = conn.execute(
+                    f"SELECT {EXPORT_COLUMNS}, pi.quantity, pi.worn FROM pack_items pi "
+                    "JOIN packs p ON p.id = pi.pack_id JOIN items i ON i.id = pi.item_id "
+                    "LEFT JOIN categories c ON c.id = i.category_id "
+                    "WHERE pi.pack_id = ? AND p.user_id = ? ORDER BY pi.sort_order, pi.id",
+                    (pack_id, user_id)
+                )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            conn.close()
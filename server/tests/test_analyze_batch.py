@@ -0,0 +1,54 @@
+import io
+import os
+import json
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('flask')
+
+directory = tempfile.mkdtemp()
+for name, filename in (('STORAGE_DB_PATH', 'packstack.db'), ('JOBS_DB_PATH', 'jobs.db'), ('CHAT_SESSION_DB_PATH', 'chat_sessions.db')):
+    os.environ.setdefault(name, os.path.join(directory, filename))
+
+import app as server
+
+
+class RecordingOpenAI:
+    """Stands in for the OpenAI client, recording the key each completion was made with"""
+
+    keys = []
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        RecordingOpenAI.keys.append(self.api_key)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='{}'))])
+
+
+def test_batch_uses_the_signed_in_users_openai_key(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'server-key')
+    monkeypatch.setattr(server, 'OpenAI', RecordingOpenAI)
+    monkeypatch.setattr(server.image_pipeline, 'process', lambda data: (data, {'dhash': data.hex()}))
+    monkeypatch.setattr(server.analysis_cache, 'get', lambda dhash, variant: (None, None))
+    monkeypatch.setattr(server, 'parse_analysis_response', lambda content, batch_mode, detect_barcodes: {'success': True})
+    server._credential_clients.clear()
+    RecordingOpenAI.keys = []
+
+    user = server.storage.create_user('batcher', 'batcher@example.com', 'password')
+    server.storage.update_settings(user['id'], {'openai_api_key': 'user-key'})
+    token = server.storage.create_token(user['id'])
+
+    response = server.app.test_client().post(
+        '/analyze/batch',
+        data={'images': [(io.BytesIO(b'first'), 'first.jpg'), (io.BytesIO(b'second'), 'second.jpg')]},
+        headers={'Authorization': f"Bearer {token}"},
+        content_type='multipart/form-data'
+    )
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[-1]['succeeded'] == 2
+    assert RecordingOpenAI.keys == ['user-key', 'user-key']
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+from chat_sessions import ChatSessionStore, compact_session, make_turn
+
+
+def failing_summarize(previous_summary, turns):
+    raise RuntimeError("summary request failed")
+
+
+def test_failed_summary_keeps_every_turn():
+    store = ChatSessionStore(os.path.join(tempfile.mkdtemp(), 'chat_sessions.db'))
+    session_id = store.create()
+    turns = [make_turn('user' if n % 2 == 0 else 'assistant', f"message {n} " + 'word ' * 40) for n in range(6)]
+    store.add_turns(session_id, turns)
+    session = store.get(session_id)
+
+    compacted = compact_session(session, 50, failing_summarize)
+
+    assert compacted is session
+    store.compact(session_id, session, compacted)
+    stored = store.get(session_id)
+    assert stored['summarized_turns'] == 0
+    assert [turn['content'] for turn in stored['turns']] == [turn['content'] for turn in turns]
+
+
+def test_summary_folds_oldest_turns():
+    store = ChatSessionStore(os.path.join(tempfile.mkdtemp(), 'chat_sessions.db'))
+    session_id = store.create()
+    turns = [make_turn('user' if n % 2 == 0 else 'assistant', f"message {n} " + 'word ' * 40) for n in range(6)]
+    store.add_turns(session_id, turns)
+    session = store.get(session_id)
+
+    compacted = compact_session(session, 50, lambda previous_summary, folded: f"{len(folded)} turns")
+
+    store.compact(session_id, session, compacted)
+    stored = store.get(session_id)
+    assert stored['summarized_turns'] == 4
+    assert stored['summary'] == "4 turns"
+    assert [turn['content'] for turn in stored['turns']] == [turn['content'] for turn in turns[4:]]
@@ -0,0 +1,25 @@
+from matching import ProductMatcher
+
+
+def test_best_match_ranks_by_cosine_not_dot_product():
+    candidates = [
+        {'title': 'Nemo Hornet', 'brand': 'Nemo'},
+        {'title': 'Nemo Hornet ' + 'tent ' * 12 + 'stakes guylines footprint poles', 'brand': 'Nemo'},
+        {'title': 'Zpacks Duplex tent', 'brand': 'Zpacks'},
+        {'title': 'Big Agnes Copper Spur tent', 'brand': 'Big Agnes'}
+    ]
+    matcher = ProductMatcher(candidates, threshold=0)
+    product = {'title': 'Nemo Hornet tent', 'brand': 'Nemo'}
+
+    vector = matcher._vector(matcher._tokens(product), product)
+    dots = [
+        sum(weight * dict(matcher._postings[token]).get(index, 0) for token, weight in vector.items())
+        for index in range(len(candidates))
+    ]
+    # The padded title has the larger dot product but the lower cosine
+    assert dots[1] > dots[0]
+
+    index, score = matcher.best_match(product)
+    assert index == 0
+    norm = sum(weight * weight for weight in vector.values()) ** 0.5
+    assert score == max(dot / (norm * matcher._norms[i]) for i, dot in enumerate(dots))
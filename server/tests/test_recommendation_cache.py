@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+from cache import SimpleCache
+from recommendation_cache import RecommendationCache
+from storage import Storage
+
+
+def test_invalidation_survives_cache_eviction():
+    cache = SimpleCache(threshold=4)
+    storage = Storage(os.path.join(tempfile.mkdtemp(), 'packstack.db'), password_iterations=1000)
+    recommendations = RecommendationCache(cache, storage)
+    fingerprints = {'shelter': 'a'}
+
+    recommendations.store('context', fingerprints, {'recommendations': ['tent']})
+    assert recommendations.lookup('context', fingerprints)[0] == {'recommendations': ['tent']}
+
+    recommendations.invalidate()
+    # Fill the LRU so everything written before invalidate() is evicted
+    for n in range(cache.threshold):
+        cache.set(f"other:{n}", n)
+
+    assert recommendations.lookup('context', fingerprints) == (None, None)
+    assert storage.generation(recommendations.key_prefix) == 1
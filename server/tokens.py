@@ -0,0 +1,31 @@
+try:
+    import tiktoken
+except ImportError:  # Optional; without it token counts are estimated
+    tiktoken = None
+
+_encodings = {}
+
+
+def _encoding(model):
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('cl100k_base')
+        _encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """Number of tokens in text; about 4 characters per token when tiktoken is not installed"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model='gpt-3.5-turbo'):
+    """Prompt tokens for a chat completion request, including the per-message framing overhead"""
+    return sum(4 + count_tokens(message.get('content') or '', model) for message in messages) + 3
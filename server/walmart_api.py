@@ -1,13 +1,13 @@
 import os
-import requests
 import time
 import json
-import hmac
-import hashlib
-import base64
+import httpx
 from datetime import datetime
 from urllib.parse import quote
 from dotenv import load_dotenv
+from retailers import RetailerProvider, credential_fingerprint
+from http_pool import PooledHTTPClient, AsyncPooledHTTPClient
+from signing import HmacSigner
 
 load_dotenv()
 
@@ -16,46 +16,60 @@ WALMART_CLIENT_ID = os.getenv('WALMART_CLIENT_ID')
 WALMART_CLIENT_SECRET = os.getenv('WALMART_CLIENT_SECRET')
 WALMART_API_BASE_URL = "https://developer.api.walmart.com/api-proxy/service"
 
-class WalmartAPI:
+# Shared by every WalmartAPI instance so per-user clients reuse the warm connections
+walmart_http = PooledHTTPClient('walmart', timeout=10.0)
+walmart_async_http = AsyncPooledHTTPClient('walmart_async', timeout=10.0)
+
+def status_error(error):
+    """Response body for a request the Walmart API answered with an error status"""
+    return {
+        'success': False,
+        'error': f"Error {error.response.status_code}: {error.response.text}"
+    }
+
+class WalmartAPI(RetailerProvider):
     """Client for interacting with the Walmart Affiliate API"""
+
+    name = 'walmart'
     
-    def __init__(self):
+    def __init__(self, client_id=None, client_secret=None):
         """Initialize the Walmart API client with credentials from environment variables"""
-        self.client_id = WALMART_CLIENT_ID
-        self.client_secret = WALMART_CLIENT_SECRET
+        self.signer = HmacSigner(client_id or WALMART_CLIENT_ID, client_secret or WALMART_CLIENT_SECRET)
         self.api_base_url = WALMART_API_BASE_URL
+        # Results are only shared between requests made with the same consumer id
+        if client_id or client_secret:
+            self.credential_scope = credential_fingerprint(self.signer.credentials.key_id)
         
-        if not self.client_id or not self.client_secret:
+        if not self.signer.configured:
             print("WARNING: Walmart API credentials not found in environment variables")
     
-    def _get_auth_signature(self, timestamp):
-        """Generate the authentication signature required for Walmart API"""
-        message = f"{self.client_id}\n{timestamp}\n"
-        digest = hmac.new(
-            self.client_secret.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(digest).decode()
-    
     def _get_headers(self):
         """Generate the headers required for Walmart API requests"""
         timestamp = str(int(time.time() * 1000))
-        signature = self._get_auth_signature(timestamp)
+        client_id, signature = self.signer.sign(timestamp)
         
         return {
             "WM_SEC.KEY_VERSION": "1",
-            "WM_CONSUMER.ID": self.client_id,
+            "WM_CONSUMER.ID": client_id,
             "WM_CONSUMER.INTIMESTAMP": timestamp,
             "WM_SEC.AUTH_SIGNATURE": signature,
             "Accept": "application/json",
             "Content-Type": "application/json"
         }
     
-    def search_products(self, query, category=None, limit=10):
-        """Search for products on Walmart by query and optionally filter by category"""
-        endpoint = f"{self.api_base_url}/affil/product/v2/search"
-        
+    def _get(self, endpoint, params=None):
+        """Signed GET; error statuses raise httpx.HTTPStatusError"""
+        response = walmart_http.get(endpoint, params=params, headers=self._get_headers())
+        response.raise_for_status()
+        return response
+    
+    async def _async_get(self, endpoint, params=None):
+        """Async variant of _get for the ASGI serving mode"""
+        response = await walmart_async_http.get(endpoint, params=params, headers=self._get_headers())
+        response.raise_for_status()
+        return response
+    
+    def _search_params(self, query, category, limit):
         params = {
             "query": query,
             "numItems": limit
@@ -63,50 +77,64 @@ class WalmartAPI:
         
         if category:
             params["categoryId"] = category
+        return params
+    
+    def _parse_search_response(self, response):
+        """Format a search response into our product list structure"""
+        data = response.json()
+        # Format the response to be consistent with our Amazon API
+        formatted_results = []
         
-        try:
-            response = requests.get(
-                endpoint,
-                params=params,
-                headers=self._get_headers()
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                # Format the response to be consistent with our Amazon API
-                formatted_results = []
-                
-                if 'items' in data:
-                    for item in data['items']:
-                        product = {
-                            'asin': item.get('itemId'),
-                            'title': item.get('name'),
-                            'url': item.get('productUrl'),
-                            'image': item.get('largeImage'),
-                            'price': {
-                                'amount': item.get('salePrice', 0),
-                                'currency': 'USD',
-                                'formatted': f"${item.get('salePrice', 0)}"
-                            },
-                            'rating': item.get('customerRating', 0),
-                            'totalReviews': item.get('numReviews', 0),
-                            'category': item.get('categoryPath'),
-                            'source': 'walmart'
-                        }
-                        formatted_results.append(product)
-                
-                return {
-                    'success': True,
-                    'products': formatted_results,
-                    'total': len(formatted_results)
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f"Error {response.status_code}: {response.text}",
-                    'products': []
+        if 'items' in data:
+            for item in data['items']:
+                product = {
+                    'asin': item.get('itemId'),
+                    'title': item.get('name'),
+                    'url': item.get('productUrl'),
+                    'image': item.get('largeImage'),
+                    'price': {
+                        'amount': item.get('salePrice', 0),
+                        'currency': 'USD',
+                        'formatted': f"${item.get('salePrice', 0)}"
+                    },
+                    'rating': item.get('customerRating', 0),
+                    'totalReviews': item.get('numReviews', 0),
+                    'category': item.get('categoryPath'),
+                    'source': 'walmart'
                 }
-                
+                formatted_results.append(product)
+        
+        return {
+            'success': True,
+            'products': formatted_results,
+            'total': len(formatted_results)
+        }
+    
+    def search_products(self, query, category=None, limit=10):
+        """Search for products on Walmart by query and optionally filter by category"""
+        endpoint = f"{self.api_base_url}/affil/product/v2/search"
+        
+        try:
+            response = self._get(endpoint, self._search_params(query, category, limit))
+            return self._parse_search_response(response)
+        except httpx.HTTPStatusError as e:
+            return dict(status_error(e), products=[])
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'products': []
+            }
+    
+    async def async_search_products(self, query, category=None, limit=10):
+        """Search for products on Walmart without blocking the event loop"""
+        endpoint = f"{self.api_base_url}/affil/product/v2/search"
+        
+        try:
+            response = await self._async_get(endpoint, self._search_params(query, category, limit))
+            return self._parse_search_response(response)
+        except httpx.HTTPStatusError as e:
+            return dict(status_error(e), products=[])
         except Exception as e:
             return {
                 'success': False,
@@ -119,59 +147,49 @@ class WalmartAPI:
         endpoint = f"{self.api_base_url}/affil/product/v2/items/{item_id}"
         
         try:
-            response = requests.get(
-                endpoint,
-                headers=self._get_headers()
-            )
+            response = self._get(endpoint)
+            data = response.json()
+            item = data.get('item', {})
             
-            if response.status_code == 200:
-                data = response.json()
-                item = data.get('item', {})
-                
-                # Format the response to be consistent with our Amazon API
-                product_details = {
-                    'success': True,
-                    'product': {
-                        'asin': item.get('itemId'),
-                        'title': item.get('name'),
-                        'description': item.get('longDescription', ''),
-                        'url': item.get('productUrl'),
-                        'images': [item.get('largeImage')] if item.get('largeImage') else [],
-                        'price': {
-                            'amount': item.get('salePrice', 0),
-                            'currency': 'USD',
-                            'formatted': f"${item.get('salePrice', 0)}"
-                        },
-                        'rating': item.get('customerRating', 0),
-                        'totalReviews': item.get('numReviews', 0),
-                        'availability': 'In Stock' if item.get('stock', '') == 'Available' else 'Out of Stock',
-                        'features': [],  # Walmart API doesn't provide a dedicated features list
-                        'category': item.get('categoryPath', ''),
-                        'brand': item.get('brandName', ''),
-                        'specifications': [],  # Will parse from the item attributes
-                        'source': 'walmart',
-                        'storePickupAvailable': item.get('pickupToday', False),
-                        'storePickupLocations': item.get('pickupStores', [])
-                    }
-                }
-                
-                # Extract product specifications if available
-                if 'attributes' in item:
-                    for attr in item['attributes']:
-                        spec = {
-                            'name': attr.get('name', ''),
-                            'value': attr.get('value', '')
-                        }
-                        product_details['product']['specifications'].append(spec)
-                
-                return product_details
-                
-            else:
-                return {
-                    'success': False,
-                    'error': f"Error {response.status_code}: {response.text}"
+            # Format the response to be consistent with our Amazon API
+            product_details = {
+                'success': True,
+                'product': {
+                    'asin': item.get('itemId'),
+                    'title': item.get('name'),
+                    'description': item.get('longDescription', ''),
+                    'url': item.get('productUrl'),
+                    'images': [item.get('largeImage')] if item.get('largeImage') else [],
+                    'price': {
+                        'amount': item.get('salePrice', 0),
+                        'currency': 'USD',
+                        'formatted': f"${item.get('salePrice', 0)}"
+                    },
+                    'rating': item.get('customerRating', 0),
+                    'totalReviews': item.get('numReviews', 0),
+                    'availability': 'In Stock' if item.get('stock', '') == 'Available' else 'Out of Stock',
+                    'features': [],  # Walmart API doesn't provide a dedicated features list
+                    'category': item.get('categoryPath', ''),
+                    'brand': item.get('brandName', ''),
+                    'specifications': [],  # Will parse from the item attributes
+                    'source': 'walmart',
+                    'storePickupAvailable': item.get('pickupToday', False),
+                    'storePickupLocations': item.get('pickupStores', [])
                 }
-                
+            }
+            
+            # Extract product specifications if available
+            if 'attributes' in item:
+                for attr in item['attributes']:
+                    spec = {
+                        'name': attr.get('name', ''),
+                        'value': attr.get('value', '')
+                    }
+                    product_details['product']['specifications'].append(spec)
+            
+            return product_details
+        except httpx.HTTPStatusError as e:
+            return status_error(e)
         except Exception as e:
             return {
                 'success': False,
@@ -187,24 +205,13 @@ class WalmartAPI:
         }
         
         try:
-            response = requests.get(
-                endpoint,
-                params=params,
-                headers=self._get_headers()
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'success': True,
-                    'storeAvailability': data
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f"Error {response.status_code}: {response.text}"
-                }
-                
+            response = self._get(endpoint, params)
+            return {
+                'success': True,
+                'storeAvailability': response.json()
+            }
+        except httpx.HTTPStatusError as e:
+            return status_error(e)
         except Exception as e:
             return {
                 'success': False,
@@ -0,0 +1,142 @@
+import os
+import json
+
+import httpx
+
+from http_pool import PooledHTTPClient
+
+DEFAULT_FORECASTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_forecasts.json')
+
+SEASONS = ('spring', 'summer', 'fall', 'winter')
+DEFAULT_SEASON = 'summer'
+DEFAULT_LOCATION = 'mountains'
+FORECAST_FIELDS = ('avg_temp', 'precipitation', 'conditions', 'alerts')
+
+# Meteorological seasons (northern hemisphere) for forecasts requested by date
+MONTH_SEASONS = {
+    12: 'winter', 1: 'winter', 2: 'winter',
+    3: 'spring', 4: 'spring', 5: 'spring',
+    6: 'summer', 7: 'summer', 8: 'summer',
+    9: 'fall', 10: 'fall', 11: 'fall'
+}
+
+weather_http = PooledHTTPClient('weather', timeout=5.0)
+
+
+class WeatherProviderError(Exception):
+    pass
+
+
+def normalize_season(season, date=None):
+    """The season for a forecast: derived from date when given, else season defaulting to summer"""
+    if date is not None:
+        return MONTH_SEASONS[date.month]
+    season = (season or DEFAULT_SEASON).lower()
+    return season if season in SEASONS else DEFAULT_SEASON
+
+
+def forecast_cache_key(provider, location, season, date=None):
+    return f"weather:{provider}:{' '.join(location.lower().split())}:{season}:{date.isoformat() if date else ''}"
+
+
+class WeatherProvider:
+    """Base class for forecast sources used by WeatherService
+
+    forecast() returns a dict with avg_temp, precipitation, conditions and
+    alerts, and raises WeatherProviderError when no forecast is available.
+    """
+
+    name = None
+
+    def forecast(self, location, season, date=None):
+        raise NotImplementedError
+
+
+class StaticWeatherProvider(WeatherProvider):
+    """Typical seasonal conditions by location type, from a table loaded once at startup"""
+
+    name = 'static'
+
+    def __init__(self, path=DEFAULT_FORECASTS_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            self.table = json.load(f)
+
+    def forecast(self, location, season, date=None):
+        # Default to mountains if location not found
+        return self.table.get(location.lower(), self.table[DEFAULT_LOCATION])[season]
+
+
+class HTTPWeatherProvider(WeatherProvider):
+    """Forecasts from a weather API over HTTP
+
+    Calls GET {base_url}/forecast?location=&season=[&date=], which must
+    answer with a JSON forecast dict. Point WEATHER_API_URL at a local stub
+    to develop against it without the real service.
+    """
+
+    name = 'http'
+
+    def __init__(self, base_url, api_key=None, http=weather_http):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.http = http
+
+    def forecast(self, location, season, date=None):
+        params = {'location': location, 'season': season}
+        if date is not None:
+            params['date'] = date.isoformat()
+        headers = {'Authorization': f"Bearer {self.api_key}"} if self.api_key else {}
+        try:
+            response = self.http.get(f"{self.base_url}/forecast", params=params, headers=headers)
+            response.raise_for_status()
+            forecast = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise WeatherProviderError(f"Weather API request failed: {str(e)}")
+        if not isinstance(forecast, dict) or any(field not in forecast for field in FORECAST_FIELDS):
+            raise WeatherProviderError("Weather API returned an incomplete forecast")
+        return {field: forecast[field] for field in FORECAST_FIELDS}
+
+
+def create_weather_provider(config, static_provider):
+    """Build the provider named by config['WEATHER_PROVIDER']"""
+    provider = config.get('WEATHER_PROVIDER', 'static')
+    if provider == 'http':
+        if config.get('WEATHER_API_URL'):
+            return HTTPWeatherProvider(config['WEATHER_API_URL'], config.get('WEATHER_API_KEY'))
+        print("WARNING: WEATHER_PROVIDER is 'http' but WEATHER_API_URL is not set. Using static forecasts.")
+    elif provider != 'static':
+        print(f"WARNING: Unknown WEATHER_PROVIDER '{provider}'. Using static forecasts.")
+    return static_provider
+
+
+class WeatherService:
+    """Forecast lookups through a provider, cached per (location, season, date)
+
+    When the provider fails and a fallback provider is given, the fallback's
+    forecast is returned uncached so the next lookup tries the provider again.
+    """
+
+    def __init__(self, provider, cache, ttl=3600, fallback=None):
+        self.provider = provider
+        self.cache = cache
+        self.ttl = ttl
+        self.fallback = fallback if fallback is not provider else None
+
+    def forecast(self, location, season=None, date=None):
+        season = normalize_season(season, date)
+        try:
+            forecast = self.cache.cached(
+                'weather',
+                forecast_cache_key(self.provider.name, location, season, date),
+                lambda: self.provider.forecast(location, season, date),
+                timeout=self.ttl
+            )
+        except WeatherProviderError:
+            if self.fallback is None:
+                raise
+            forecast = self.fallback.forecast(location, season, date)
+
+        result = {'location': location, 'season': season, 'forecast': forecast}
+        if date is not None:
+            result['date'] = date.isoformat()
+        return result
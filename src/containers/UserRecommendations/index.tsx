@@ -53,6 +53,8 @@ interface RecommendationResponse {
     new_items: Recommendation[]
     specialized_gear: Recommendation[]
   }
+  cached?: boolean
+  requeried_categories?: string[]
   error?: string
 }
 